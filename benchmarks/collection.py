@@ -0,0 +1,128 @@
+"""Benchmark collection cycles against mock LCD servers.
+
+Usage: PYTHONPATH=src python benchmarks/collection.py [--chains 1,10,50] [--wallets 5] [--validators 10] ...
+
+For every chain count, that many mock LCDs (benchmarks/mock_lcd.py) are started
+in a separate process, so their CPU time and memory are not measured, and
+fetch_metrics collects them for a number of cycles. The cache is cleared before
+every cycle so each one fetches every metric group, while the pooled clients
+and connections are kept like in the running exporter. The first cycle also
+connects the nodes and is reported separately. With --cached the cache is kept,
+measuring the cycles whose groups are all served from it.
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import resource
+import statistics
+import time
+
+from prometheus_client import REGISTRY
+
+from orbit_metrics import exporter
+from orbit_metrics.api_client import clear_clients
+from orbit_metrics.exporter import cache, fetch_metrics
+
+from mock_lcd import MockLCD
+
+
+def serve_chains(count, lcd_options, urls, stop):
+    lcds = [MockLCD(f'chain{index}', **lcd_options).start() for index in range(count)]
+    urls.put([lcd.url for lcd in lcds])
+    stop.wait()
+    for lcd in lcds:
+        lcd.stop()
+
+
+def benchmark_config(urls, args):
+    nodes = []
+    for index, url in enumerate(urls):
+        nodes.append({
+            'name': f'chain{index}',
+            'api_url': url,
+            'main_denom': 'ustake',
+            'wallets': [{'address': f'cosmos1{index:04d}{wallet:034d}', 'type': 'benchmark'}
+                        for wallet in range(args.wallets)],
+            'validators': [{'validator_id': f'cosmosvaloper1chain{index}{validator:020d}'}
+                           for validator in range(args.validators)],
+        })
+        if args.balance_denoms:
+            nodes[-1]['balance_denoms'] = 'all'
+    return {'nodes': nodes, 'exporter': {'engine': args.engine}}
+
+
+def requests_sent():
+    return sum(sample.value for metric in REGISTRY.collect() if metric.name == 'orbit_metrics_http_requests'
+               for sample in metric.samples if sample.name == 'orbit_metrics_http_requests_total')
+
+
+def rss_mib():
+    """Return the current resident set size, or the peak one where /proc is not available."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10
+
+
+def run_cycle(config, cached=False):
+    if not cached:
+        cache.clear()
+    requests_before = requests_sent()
+    started, cpu_started = time.monotonic(), time.process_time()
+    fetch_metrics(config)
+    return time.monotonic() - started, time.process_time() - cpu_started, requests_sent() - requests_before
+
+
+def benchmark(chains, args):
+    lcd_options = {'latency': args.latency, 'error_rate': args.error_rate, 'denoms': args.denoms,
+                   'validators': max(args.validators, args.validator_set)}
+    urls, stop = multiprocessing.Queue(), multiprocessing.Event()
+    server = multiprocessing.Process(target=serve_chains, args=(chains, lcd_options, urls, stop), daemon=True)
+    server.start()
+    try:
+        config = benchmark_config(urls.get(timeout=60), args)
+        clear_clients()
+        first_cycle = run_cycle(config)
+        cycles = [run_cycle(config, args.cached) for _ in range(args.cycles)]
+    finally:
+        stop.set()
+        server.join()
+        if exporter.async_pool is not None:
+            exporter.async_pool.close()
+            exporter.async_pool = None
+
+    cycle_time = statistics.median(cycle[0] for cycle in cycles)
+    cpu_time = statistics.median(cycle[1] for cycle in cycles)
+    requests = statistics.median(cycle[2] for cycle in cycles)
+    print(f'{chains:>6} {first_cycle[0]:>10.3f} {cycle_time:>10.3f} {requests:>9.0f} {requests / cycle_time:>9.0f} '
+          f'{cpu_time:>9.3f} {rss_mib():>8.1f}')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark collection cycles against mock LCD servers.')
+    parser.add_argument('--chains', default='1,10,50', help='Comma-separated chain counts')
+    parser.add_argument('--wallets', type=int, default=5, help='Wallets per chain')
+    parser.add_argument('--validators', type=int, default=2, help='Configured validators per chain')
+    parser.add_argument('--validator-set', type=int, default=100, help='Validator set size of every chain')
+    parser.add_argument('--denoms', type=int, default=0, help='Extra IBC denoms held by every wallet')
+    parser.add_argument('--balance-denoms', action='store_true', help='Export the balances in every denom')
+    parser.add_argument('--latency', type=float, default=0.02, help='Response latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of 503 responses')
+    parser.add_argument('--cycles', type=int, default=5, help='Measured cycles per chain count')
+    parser.add_argument('--engine', choices=['threads', 'async'], default='threads')
+    parser.add_argument('--cached', action='store_true', help='Keep the cache between the measured cycles')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=logging.CRITICAL)  # Injected errors would flood the output
+    print(f"{'chains':>6} {'first s':>10} {'cycle s':>10} {'requests':>9} {'req/s':>9} {'cpu s':>9} {'rss MiB':>8}")
+    for chains in (int(count) for count in args.chains.split(',')):
+        benchmark(chains, args)
+
+
+if __name__ == '__main__':
+    main()
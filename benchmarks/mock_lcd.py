@@ -0,0 +1,208 @@
+"""Stand-in Cosmos SDK LCD server for benchmarks.
+
+Serves every endpoint used by APIClient for any wallet or validator address,
+with a configurable latency, error rate and payload size. Only the standard
+library is used, so the server adds no dependency to the benchmarks.
+"""
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from orbit_metrics.uptime import consensus_address, valcons_address
+
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # Clients closing keep-alive connections at exit
+
+
+class MockLCD:
+    """A mock LCD of one chain, listening on its own port of 127.0.0.1.
+
+    latency: seconds every response is delayed by
+    error_rate: share of requests answered with 503 Service Unavailable
+    denoms: IBC denoms held by every wallet besides the main denom, to grow balance payloads
+    validators: size of the validator set
+    block_time: seconds between two blocks, the height grows with the wall clock
+    missed_every: every validator misses one block out of missed_every, 0 to sign every block
+    delegators: delegations to every validator
+    """
+
+    def __init__(self, chain_id, main_denom='ustake', latency=0.0, error_rate=0.0, denoms=0, validators=100,
+                 block_time=6.0, missed_every=10, delegators=1000):
+        self.chain_id = chain_id
+        self.main_denom = main_denom
+        self.latency = latency
+        self.error_rate = error_rate
+        self.denoms = [f'ibc/{index:064X}' for index in range(denoms)]
+        self.validators = [self._validator(f'cosmosvaloper1{chain_id}{index:020d}', index)
+                           for index in range(validators)]
+        self.block_time = block_time
+        self.missed_every = missed_every
+        self.delegators = delegators
+        self.started = time.time()
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.server = QuietHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._thread = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def height(self):
+        if not self.block_time:
+            return 1000000 + self.requests
+        return 1000000 + int((time.time() - self.started) / self.block_time)
+
+    def _validator(self, address, index):
+        key = base64.b64encode(hashlib.sha256(address.encode()).digest()).decode()
+        return {
+            'operator_address': address,
+            'consensus_pubkey': {'@type': '/cosmos.crypto.ed25519.PubKey', 'key': key},
+            'jailed': False,
+            'status': 'BOND_STATUS_BONDED',
+            'tokens': str(1000000000 + index),
+            'delegator_shares': f'{1000000000 + index}.000000000000000000',
+            'description': {'moniker': f'validator-{index}', 'details': ''},
+            'commission': {'commission_rates': {'rate': '0.050000000000000000'}},
+        }
+
+    def _balances(self):
+        balances = [{'denom': denom, 'amount': '1000'} for denom in self.denoms]
+        balances.append({'denom': self.main_denom, 'amount': '123456789'})
+        return balances
+
+    def _block(self, height):
+        signatures = []
+        for index, validator in enumerate(self.validators):
+            address = consensus_address(validator['consensus_pubkey'])
+            absent = self.missed_every and (height + index) % self.missed_every == 0
+            signatures.append({'block_id_flag': 'BLOCK_ID_FLAG_ABSENT' if absent else 'BLOCK_ID_FLAG_COMMIT',
+                               'validator_address': '' if absent else base64.b64encode(address).decode()})
+        produced = self.started + (height - 1000000) * self.block_time if self.block_time else time.time()
+        header_time = datetime.fromtimestamp(produced, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+        return {'block': {'header': {'height': str(height), 'chain_id': self.chain_id, 'time': header_time},
+                          'last_commit': {'height': str(height - 1), 'signatures': signatures}}}
+
+    def _signing_info(self, validator):
+        address = valcons_address(validator['operator_address'], consensus_address(validator['consensus_pubkey']))
+        missed = 10000 // self.missed_every if self.missed_every else 0
+        return {'address': address, 'start_height': '1', 'index_offset': str(self.height()),
+                'jailed_until': '1970-01-01T00:00:00Z', 'tombstoned': False, 'missed_blocks_counter': str(missed)}
+
+    def _delegations(self, validator, offset, limit):
+        # Generated page by page, the amounts are a permutation so the largest ones are spread over the pages
+        return [{'delegation': {'delegator_address': f'cosmos1delegator{index:020d}', 'validator_address': validator,
+                                'shares': f'{(index * 7919) % self.delegators + 1}000000.000000000000000000'},
+                 'balance': {'denom': self.main_denom, 'amount': f'{(index * 7919) % self.delegators + 1}000000'}}
+                for index in range(offset, min(offset + limit, self.delegators))]
+
+    def _page(self, items, query):
+        limit = int(query.get('pagination.limit', ['100'])[0])
+        key = query.get('pagination.key', [None])[0]
+        offset = int(base64.b64decode(key)) if key else 0
+        next_offset = offset + limit
+        next_key = base64.b64encode(str(next_offset).encode()).decode() if next_offset < len(items) else None
+        return items[offset:next_offset], {'next_key': next_key, 'total': str(len(items))}
+
+    def respond(self, path, query):
+        """Return the (status, body) of a GET request."""
+        parts = path.strip('/').split('/')
+        if path == '/cosmos/base/tendermint/v1beta1/node_info':
+            return 200, {'default_node_info': {'moniker': f'{self.chain_id}-node', 'network': self.chain_id}}
+        if path == '/cosmos/base/tendermint/v1beta1/blocks/latest':
+            return 200, self._block(self.height())
+        if parts[:5] == ['cosmos', 'base', 'tendermint', 'v1beta1', 'blocks'] and len(parts) == 6:
+            return 200, self._block(int(parts[5]))
+        if path == '/cosmos/slashing/v1beta1/signing_infos':
+            infos, pagination = self._page([self._signing_info(validator) for validator in self.validators], query)
+            return 200, {'info': infos, 'pagination': pagination}
+        if parts[:4] == ['cosmos', 'bank', 'v1beta1', 'balances'] and len(parts) == 5:
+            balances, pagination = self._page(self._balances(), query)
+            return 200, {'balances': balances, 'pagination': pagination}
+        if parts[:4] == ['cosmos', 'bank', 'v1beta1', 'balances'] and parts[5:] == ['by_denom']:
+            denom = query.get('denom', [self.main_denom])[0]
+            amount = {balance['denom']: balance['amount'] for balance in self._balances()}.get(denom, '0')
+            return 200, {'balance': {'denom': denom, 'amount': amount}}
+        if path == '/cosmos/staking/v1beta1/validators':
+            validators, pagination = self._page(self.validators, query)
+            return 200, {'validators': validators, 'pagination': pagination}
+        if parts[:4] == ['cosmos', 'staking', 'v1beta1', 'validators'] and parts[5:] == ['delegations']:
+            limit = int(query.get('pagination.limit', ['100'])[0])
+            key = query.get('pagination.key', [None])[0]
+            offset = int(base64.b64decode(key)) if key else 0
+            next_key = base64.b64encode(str(offset + limit).encode()).decode() if offset + limit < self.delegators else None
+            return 200, {'delegation_responses': self._delegations(parts[4], offset, limit),
+                         'pagination': {'next_key': next_key, 'total': str(self.delegators)}}
+        if parts[:4] == ['cosmos', 'distribution', 'v1beta1', 'validators'] and parts[5:] == ['outstanding_rewards']:
+            return 200, {'rewards': {'rewards': [{'denom': self.main_denom, 'amount': '123456789.000000000000000000'}]}}
+        if parts[:4] == ['cosmos', 'distribution', 'v1beta1', 'validators'] and parts[5:] == ['commission']:
+            return 200, {'commission': {'commission': [{'denom': self.main_denom, 'amount': '98765.430000000000000000'}]}}
+        if parts[:4] == ['cosmos', 'staking', 'v1beta1', 'validators'] and len(parts) == 5:
+            return 200, {'validator': self._validator(parts[4], 0)}
+        if path == '/cosmos/distribution/v1beta1/params':
+            return 200, {'params': {'community_tax': '0.020000000000000000',
+                                    'base_proposer_reward': '0.010000000000000000',
+                                    'bonus_proposer_reward': '0.040000000000000000',
+                                    'withdraw_addr_enabled': True}}
+        if path == '/cosmos/mint/v1beta1/params':
+            return 200, {'params': {'mint_denom': self.main_denom, 'inflation_rate_change': '0.130000000000000000',
+                                    'inflation_max': '0.200000000000000000', 'inflation_min': '0.070000000000000000',
+                                    'goal_bonded': '0.670000000000000000', 'blocks_per_year': '6311520'}}
+        if path == '/cosmos/slashing/v1beta1/params':
+            return 200, {'params': {'signed_blocks_window': '10000', 'min_signed_per_window': '0.050000000000000000',
+                                    'downtime_jail_duration': '600s', 'slash_fraction_double_sign': '0.050000000000000000',
+                                    'slash_fraction_downtime': '0.000100000000000000'}}
+        if path == '/cosmos/staking/v1beta1/params':
+            return 200, {'params': {'unbonding_time': '1814400s', 'max_validators': 100, 'max_entries': 7,
+                                    'historical_entries': 10000, 'bond_denom': self.main_denom}}
+        if path == '/cosmos/staking/v1beta1/pool':
+            return 200, {'pool': {'not_bonded_tokens': '10968485993366', 'bonded_tokens': '74343129493578'}}
+        return 404, {'code': 5, 'message': 'Not Implemented'}
+
+    def _handler_class(self):
+        lcd = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like a real LCD behind a proxy
+            disable_nagle_algorithm = True  # Headers and body are written separately
+
+            def do_GET(self):
+                with lcd._lock:
+                    lcd.requests += 1
+                if lcd.latency:
+                    time.sleep(lcd.latency)
+                url = urlparse(self.path)
+                if random.random() < lcd.error_rate:
+                    status, data = 503, {'code': 14, 'message': 'unavailable'}
+                else:
+                    status, data = lcd.respond(url.path, parse_qs(url.query))
+                body = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,84 @@
+"""Compare parse time and peak memory of the JSON backends on large LCD responses.
+
+Usage: python benchmarks/parse_json.py [RECORDED_RESPONSE.json ...]
+
+Without arguments, a balance list with many IBC denoms and a page of the
+validator set are generated, shaped like the responses of a Cosmos SDK LCD.
+Record real responses with e.g.
+curl -o validators.json 'https://lcd.example.org/cosmos/staking/v1beta1/validators?pagination.limit=500'
+"""
+import json
+import sys
+import timeit
+import tracemalloc
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def balances_response(denoms=800):
+    balances = [{"denom": f"ibc/{index:064X}", "amount": str(index * 1000003)} for index in range(denoms)]
+    balances.append({"denom": "ubtsg", "amount": "123456789"})
+    return {"balances": balances, "pagination": {"next_key": None, "total": str(len(balances))}}
+
+
+def validators_response(validators=500):
+    return {
+        "validators": [{
+            "operator_address": f"bitsongvaloper1{index:038d}",
+            "consensus_pubkey": {"@type": "/cosmos.crypto.ed25519.PubKey", "key": "A" * 44},
+            "jailed": index % 50 == 0,
+            "status": "BOND_STATUS_BONDED",
+            "tokens": str(index * 1000000007),
+            "delegator_shares": f"{index * 1000000007}.000000000000000000",
+            "description": {"moniker": f"validator-{index}", "identity": "", "website": "https://example.org",
+                            "security_contact": "", "details": "Validator " * 20},
+            "unbonding_height": "0",
+            "unbonding_time": "1970-01-01T00:00:00Z",
+            "commission": {"commission_rates": {"rate": "0.050000000000000000", "max_rate": "0.200000000000000000",
+                                                "max_change_rate": "0.010000000000000000"},
+                           "update_time": "2023-01-01T00:00:00Z"},
+            "min_self_delegation": "1",
+        } for index in range(validators)],
+        "pagination": {"next_key": None, "total": str(validators)},
+    }
+
+
+def backends():
+    # requests' Response.json() decodes the body to a str before calling json.loads
+    yield 'json', lambda body: json.loads(body.decode('utf-8'))
+    if orjson is not None:
+        yield 'orjson', orjson.loads
+
+
+def peak_memory(parse, body):
+    tracemalloc.start()
+    try:
+        parse(body)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main(paths):
+    if paths:
+        bodies = [(path, open(path, 'rb').read()) for path in paths]
+    else:
+        bodies = [('balances (800 denoms)', json.dumps(balances_response()).encode()),
+                  ('validators (500)', json.dumps(validators_response()).encode())]
+    if orjson is None:
+        print('orjson is not installed, only the standard library is measured')
+
+    print(f"{'response':<24} {'size':>10} {'backend':<8} {'parse ms':>10} {'peak MiB':>10}")
+    for name, body in bodies:
+        for backend, parse in backends():
+            runs = timeit.repeat(lambda: parse(body), number=5, repeat=5)
+            milliseconds = min(runs) / 5 * 1000
+            peak = peak_memory(parse, body) / 2 ** 20
+            print(f'{name:<24} {len(body):>10} {backend:<8} {milliseconds:>10.2f} {peak:>10.2f}')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,92 @@
+"""Measure the startup time and import profile of the exporter.
+
+Usage: PYTHONPATH=src python benchmarks/startup.py [--runs 10] [--budget 250] [--top 15]
+
+Every scenario runs in a fresh interpreter: an empty one as the baseline,
+--help, --check-config of a generated configuration and the imports of a
+running exporter. The median wall time of each is reported, followed by the
+slowest imports of the running exporter according to python -X importtime.
+The exit status is 1 when --check-config takes longer than the budget in
+milliseconds, so the benchmark can guard the startup time in CI.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+CONFIG = """nodes:
+  - name: BitSong
+    api_url: https://lcd.explorebitsong.com
+    main_denom: ubtsg
+    wallets:
+      - address: bitsong1wallet
+"""
+
+
+def scenarios(config_path):
+    python = [sys.executable]
+    return [
+        ('interpreter', python + ['-c', 'pass']),
+        ('--help', python + ['-m', 'orbit_metrics', '--help']),
+        ('--check-config', python + ['-m', 'orbit_metrics', '--config', config_path, '--check-config']),
+        ('exporter imports', python + ['-c', 'import orbit_metrics.runner']),
+    ]
+
+
+def wall_time(command, runs):
+    durations = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        durations.append(time.perf_counter() - started)
+    return statistics.median(durations) * 1000
+
+
+def import_profile(command):
+    """Return the (self, cumulative, module) import times in microseconds of a command, slowest first."""
+    output = subprocess.run([command[0], '-X', 'importtime'] + command[1:], check=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True).stderr
+    profile = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, module = line[len('import time:'):].split('|')
+        profile.append((int(own), int(cumulative), module.strip()))
+    return sorted(profile, reverse=True)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Measure the startup time and import profile of the exporter.')
+    parser.add_argument('--runs', type=int, default=10, help='Runs of every scenario')
+    parser.add_argument('--budget', type=float, default=250, help='Milliseconds allowed for --check-config')
+    parser.add_argument('--top', type=int, default=15, help='Slowest imports to list')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    with tempfile.NamedTemporaryFile('w', suffix='.yml', delete=False) as file:
+        file.write(CONFIG)
+    try:
+        print(f'{"scenario":>18} {"median ms":>10}')
+        durations = {}
+        for name, command in scenarios(file.name):
+            durations[name] = wall_time(command, args.runs)
+            print(f'{name:>18} {durations[name]:>10.1f}')
+
+        print(f'\nSlowest imports of the running exporter (ms):\n{"self":>8} {"cumulative":>11}  module')
+        for own, cumulative, module in import_profile(scenarios(file.name)[-1][1])[:args.top]:
+            print(f'{own / 1000:>8.1f} {cumulative / 1000:>11.1f}  {module}')
+    finally:
+        os.unlink(file.name)
+
+    if durations['--check-config'] > args.budget:
+        print(f'\n--check-config took {durations["--check-config"]:.1f} ms, over the budget of {args.budget} ms')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
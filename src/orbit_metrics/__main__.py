@@ -1,19 +1,35 @@
 import logging
-import time
 
-from prometheus_client import start_http_server
+import yaml
 
+# Only the modules needed to parse the arguments and validate the configuration are imported here, the HTTP
+# stack (requests, prometheus_client and aiohttp) is imported by orbit_metrics.runner once the exporter starts.
 from orbit_metrics.cli import parse_args
-from orbit_metrics.config import load_config
-from orbit_metrics.exporter import fetch_metrics
+from orbit_metrics.config import ConfigError, get_settings, load_config, validate_config
 from orbit_metrics.logger import get_log_level, setup_logging
 
 
 logger = logging.getLogger(__name__)
 
 
+def check_config(config_path, log_level):
+    # Logs to the console only, the log file may belong to a running exporter
+    setup_logging(log_file=None, log_level=log_level)
+    try:
+        config = load_config(config_path)
+        validate_config(config)
+    except (OSError, yaml.YAMLError, ConfigError) as e:
+        logger.error(f'Invalid configuration {config_path}: {e}')
+        raise SystemExit(1)
+    logger.info(f"Configuration {config_path} is valid, {len(config['nodes'])} chains")
+
+
 def main():
     args = parse_args()
+    if args.check_config:
+        check_config(args.config, get_log_level(args.log_level))
+        return
+
     config = load_config(args.config)
 
     log_level = get_log_level(args.log_level)
@@ -22,11 +38,29 @@ def main():
     logger.info(f"Initializing application.")
     logger.debug(f'Command line arguments: {args}')
 
-    start_http_server(8000)
-    while True:
-        fetch_metrics(config)
-        time.sleep(60)  # Fetch metrics every 60 seconds
+    try:
+        validate_config(config)
+    except ConfigError as e:
+        logger.error(f'Invalid configuration {args.config}: {e}')
+        raise SystemExit(1)
+
+    from orbit_metrics.runner import run_exporter, run_shard_workers
+
+    sharding_settings = get_settings(config, 'sharding')
+    shards = int(args.shards or sharding_settings['shards'])
+    if args.shard is not None:
+        if not 0 <= args.shard < shards:
+            logger.error(f'Shard {args.shard} is not one of the {shards} shards')
+            raise SystemExit(1)
+        run_exporter(args.config, config, args.shard, shards)
+    elif shards > 1 and sharding_settings['workers']:
+        run_shard_workers(args, config, shards)
+    elif shards > 1:
+        logger.error(f'{shards} shards are configured: run every replica with --shard or enable sharding.workers')
+        raise SystemExit(1)
+    else:
+        run_exporter(args.config, config)
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -1,30 +1,349 @@
+import collections
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from urllib.parse import urlparse
+
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from orbit_metrics.config import DEFAULTS
+from orbit_metrics.delegations import DelegationStats
+from orbit_metrics.endpoints import EndpointPool
+from orbit_metrics.instrumentation import RequestTimer
+from orbit_metrics.metrics import http_connections_opened_counter, http_requests_counter, http_retries_counter
+from orbit_metrics.parsing import loads, log_payload
+from orbit_metrics.resilience import CircuitOpenError, backoff_delay, retry_budget
 
 logger = logging.getLogger(__name__)
 
 
+class CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        http_connections_opened_counter.labels(host=self.host).inc()
+        return super()._new_conn()
+
+
+class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        http_connections_opened_counter.labels(host=self.host).inc()
+        return super()._new_conn()
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter counting requests and newly opened connections per host.
+
+    Connection reuse is the difference between both counters.
+    """
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': CountingHTTPConnectionPool,
+            'https': CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, **kwargs):
+        http_requests_counter.labels(host=urlparse(request.url).hostname).inc()
+        return super().send(request, **kwargs)
+
+
+def build_session(http_settings=None):
+    """Create a requests Session with a pooled, keep-alive connection adapter."""
+    settings = dict(DEFAULTS['http'])
+    settings.update(http_settings or {})
+
+    session = requests.Session()
+    adapter = CountingHTTPAdapter(pool_connections=settings['pool_connections'],
+                                  pool_maxsize=settings['pool_maxsize'],
+                                  pool_block=settings['pool_block'])
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if not settings['keep_alive']:
+        session.headers['Connection'] = 'close'
+    return session
+
+
+def build_transport(grpc_url, http_settings=None, endpoint_settings=None):
+    """Create the GrpcTransport of a node's grpc_url, with a circuit breaker of its own."""
+    from orbit_metrics.grpc_transport import GrpcTransport  # grpcio is only imported when used
+    settings = dict(DEFAULTS['http'])
+    settings.update(http_settings or {})
+    return GrpcTransport(grpc_url, timeout=settings['connect_timeout'] + settings['read_timeout'],
+                         endpoints=EndpointPool([grpc_url], **(endpoint_settings or {})))
+
+
+class ETagCache:
+    """Bodies of the latest responses that carried an ETag, by (url, params).
+
+    Beyond max_entries, the least recently used bodies are dropped, so the
+    cache stays bounded whatever the number of wallets and params queried.
+    """
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()  # (url, params) -> (etag, data)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, etag, data):
+        with self._lock:
+            self._entries[key] = (etag, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._entries))
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+# Runs the concurrent requests of hedged requests
+_hedge_executor = ThreadPoolExecutor(max_workers=8)
+
+
+def get_client(api_urls, http_settings=None, endpoint_settings=None, chain=None, grpc_url=None):
+    """Return the long-lived APIClient of a node's API endpoints, creating it on first use.
+
+    With a grpc_url, the queries that have a gRPC method are sent to it instead.
+    The client is created without any request, its node info is fetched by the
+    first cycle, so concurrent first calls share a single client.
+    """
+    if isinstance(api_urls, str):
+        api_urls = [api_urls]
+    key = tuple(api_urls)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                transport = build_transport(grpc_url, http_settings, endpoint_settings) if grpc_url else None
+                client = _clients[key] = APIClient(api_urls[0],
+                                                   session=build_session(http_settings),
+                                                   endpoints=EndpointPool(api_urls, **(endpoint_settings or {})),
+                                                   http_settings=http_settings,
+                                                   chain=chain,
+                                                   transport=transport)
+    return client
+
+
+class EndpointsUnavailableError(requests.exceptions.ConnectionError, CircuitOpenError):
+    """Raised when no endpoint of a node is left to try, as the circuit breaker of every one of them is open.
+
+    Callers handle it like any unreachable node, and request() raises it at once instead of retrying.
+    """
+
+
+def is_endpoint_error(error):
+    """Return whether a request error is caused by the endpoint rather than by the request itself."""
+    response = getattr(error, 'response', None)
+    return not (isinstance(error, requests.exceptions.HTTPError) and response is not None and response.status_code < 500)
+
+
+def drop_client(api_urls):
+    """Remove the client of a node's API endpoints from the registry and close its session."""
+    if isinstance(api_urls, str):
+        api_urls = [api_urls]
+    with _clients_lock:
+        client = _clients.pop(tuple(api_urls), None)
+    if client is not None:
+        client.close()
+
+
+def clear_clients():
+    """Drop all registered clients and close their sessions."""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+
 class APIClient:
-    def __init__(self, api_url):
+    # Configured validators from which the paginated validator set is listed instead
+    BULK_VALIDATORS_THRESHOLD = 5
+    VALIDATORS_PAGE_LIMIT = 500
+    BALANCES_PAGE_LIMIT = 500
+    DELEGATIONS_PAGE_LIMIT = 1000
+
+    def __init__(self, api_url, session=None, endpoints=None, http_settings=None, chain=None, transport=None):
         self.api_url = api_url
+        self.chain = chain or api_url  # Label of the request metrics
+        self.session = session or requests.Session()
+        self.endpoints = endpoints or EndpointPool([api_url])
+        self.http_settings = dict(DEFAULTS['http'])
+        self.http_settings.update(http_settings or {})
+        self.timeout = (self.http_settings['connect_timeout'], self.http_settings['read_timeout'])
         self.moniker = None
         self.chain_id = None
         self.latest_block_data = None
-        self.fetch_node_info()
+        self._etags = ETagCache()
+        self.transport = transport  # Serves the queries it has a route for instead of the REST endpoints
+
+    def close(self):
+        self.session.close()
+        if self.transport is not None:
+            self.transport.close()
+
+    def get_json(self, path, params=None, revalidate=True):
+        """GET path from the best endpoint of the node and return its JSON body.
+
+        Without revalidate, the body is not kept to be revalidated with its ETag,
+        for the pages of a listing that is only streamed through.
+        """
+        return self.request(path, params, revalidate)[1]
+
+    def request(self, path, params=None, revalidate=True):
+        """GET path and return (endpoint, JSON body).
+
+        Endpoints are tried from best to worst until one answers. With hedging
+        enabled, the second best endpoint is also requested once the best one
+        is slower than its usual latency, and the first answer wins. When every
+        endpoint failed, the request is retried with jittered exponential backoff
+        as long as the retry budget of the cycle allows it. Queries the
+        transport of the client has a route for are sent to it instead, with
+        the same retries, unless the circuit breaker of the transport is open:
+        they then fall back to the REST endpoints until it is half-open again.
+        """
+        route = self.transport.route(path) if self.transport is not None else None
+        attempt = 0
+        while True:
+            try:
+                if route is not None and self.transport.endpoints.available():
+                    return self._transport_request(path, params)
+                return self._request_endpoints(path, params, revalidate)
+            except requests.exceptions.RequestException as e:
+                if not is_endpoint_error(e) or isinstance(e, CircuitOpenError):
+                    raise
+                attempt += 1
+                if attempt > self.http_settings['retries'] or not retry_budget.acquire():
+                    raise
+            http_retries_counter.labels(host=urlparse(self.api_url).hostname).inc()
+            time.sleep(backoff_delay(attempt, self.http_settings['backoff_base'], self.http_settings['backoff_max']))
+
+    def _transport_request(self, path, params):
+        """Send path to the transport, recording the latency or failure of its endpoint like _request."""
+        started = time.monotonic()
+        try:
+            with RequestTimer(self.chain, path) as timer:
+                data = self.transport.get_json(path, params, timer)
+        except requests.exceptions.RequestException as e:
+            if is_endpoint_error(e):
+                self.transport.endpoints.record_failure(self.transport.url)
+            raise
+        self.transport.endpoints.record_success(self.transport.url, time.monotonic() - started)
+        return self.transport.url, data
+
+    def _request_endpoints(self, path, params, revalidate=True):
+        candidates = self.endpoints.available()
+        if not candidates:
+            raise EndpointsUnavailableError(f'Circuit breaker open for every endpoint of {self.api_url}')
+
+        error = None
+        if self.endpoints.hedge and len(candidates) > 1:
+            try:
+                return self._hedged_request(candidates[0], candidates[1], path, params, revalidate)
+            except requests.exceptions.RequestException as e:
+                if not is_endpoint_error(e):
+                    raise
+                error = e
+            candidates = candidates[2:]
+
+        for base_url in candidates:
+            try:
+                return self._request(base_url, path, params, revalidate)
+            except requests.exceptions.RequestException as e:
+                if not is_endpoint_error(e):
+                    raise
+                logger.warning(f'Request to {base_url}{path} failed: {e}')
+                error = e
+        raise error
+
+    def _hedged_request(self, primary_url, secondary_url, path, params, revalidate=True):
+        delay = self.endpoints.hedge_delay(primary_url)
+        primary = _hedge_executor.submit(self._request, primary_url, path, params, revalidate)
+        done, _ = wait([primary], timeout=delay)
+        if done and (primary.exception() is None or not is_endpoint_error(primary.exception())):
+            return primary.result()
+
+        logger.debug(f'Hedging request to {primary_url}{path} with {secondary_url}')
+        secondary = _hedge_executor.submit(self._request, secondary_url, path, params, revalidate)
+        if done:  # The primary endpoint failed, the secondary one is simply the next to try
+            return secondary.result()
+
+        error = None
+        for future in as_completed([primary, secondary]):
+            try:
+                return future.result()
+            except requests.exceptions.RequestException as e:
+                error = e
+        raise error
+
+    def _request(self, base_url, path, params, revalidate=True):
+        """GET path from base_url, recording the latency or failure of the endpoint."""
+        started = time.monotonic()
+        try:
+            with RequestTimer(self.chain, path) as timer:
+                data = self._get_json_from(f"{base_url}{path}", params, timer, revalidate)
+        except requests.exceptions.RequestException as e:
+            if is_endpoint_error(e):
+                self.endpoints.record_failure(base_url)
+            raise
+        self.endpoints.record_success(base_url, time.monotonic() - started)
+        return base_url, data
+
+    def _get_json_from(self, url, params, timer, revalidate=True):
+        """GET url and return its JSON body.
+
+        When the API sent an ETag for the same request, the cached body is
+        revalidated with If-None-Match and reused on 304 Not Modified.
+        """
+        key = (url, tuple(sorted((params or {}).items())))
+        cached = self._etags.get(key) if revalidate else None
+        headers = {'If-None-Match': cached[0]} if cached else None
+
+        response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+        timer.record_response(response.status_code, len(response.content))
+        if cached and response.status_code == 304:
+            logger.debug(f'Not modified since last request: {url}')
+            return cached[1]
+        response.raise_for_status()  # Raises an HTTPError for bad responses
+        try:
+            data = loads(response.content)
+        except ValueError as e:
+            raise requests.exceptions.InvalidJSONError(f'Invalid JSON in response from {url}: {e}', response=response)
+
+        etag = response.headers.get('ETag')
+        if etag and revalidate:
+            self._etags.put(key, etag, data)
+        return data
 
     def fetch_node_info(self):
         """Fetch node information from the API, trying multiple endpoints."""
         endpoints = [
-            f"{self.api_url}/node_info",
-            f"{self.api_url}/cosmos/base/tendermint/v1beta1/node_info"
+            "/node_info",
+            "/cosmos/base/tendermint/v1beta1/node_info"
         ]
 
         for endpoint in endpoints:
             try:
-                response = requests.get(endpoint)
-                response.raise_for_status()
-                data = response.json()
-                logger.debug(f'Node info data retrieved from {endpoint}: {data}')
+                data = self.get_json(endpoint)
+                log_payload(logger, f'Node info data retrieved from {endpoint}', data)
 
                 # Check for the appropriate key based on the endpoint
                 node_info_key = 'node_info' if 'node_info' in data else 'default_node_info'
@@ -36,7 +355,7 @@ class APIClient:
                 return  # Exit if successful
             except requests.exceptions.RequestException as e:
                 logger.error(f'Error fetching node info from {endpoint}: {e}')
-            except (KeyError, ValueError) as e:
+            except (KeyError, ValueError, TypeError) as e:
                 logger.error(f'Error parsing node info data from {endpoint}: {e}')
 
         logger.error("Failed to fetch node info from all endpoints.")
@@ -44,13 +363,20 @@ class APIClient:
     def fetch_latest_block_data(self):
         """Fetch the latest block data once."""
         try:
-            response = requests.get(f"{self.api_url}/cosmos/base/tendermint/v1beta1/blocks/latest")
-            response.raise_for_status()
-            self.latest_block_data = response.json()
-            logger.debug(f'Latest block data block: {self.latest_block_data}')
+            endpoint, self.latest_block_data = self.request("/cosmos/base/tendermint/v1beta1/blocks/latest")
+            log_payload(logger, 'Latest block data block', self.latest_block_data)
         except requests.exceptions.RequestException as e:
             logger.error(f'Error fetching latest block data: {e}')
             self.latest_block_data = None
+            return
+
+        if endpoint not in self.endpoints.stats:  # The endpoint of the transport, not ranked by height
+            return
+        try:
+            height = int(self.latest_block_data['block']['header']['height'])
+        except (KeyError, ValueError, TypeError):
+            return  # Reported by fetch_chain_height
+        self.endpoints.record_height(endpoint, height)
 
     def fetch_chain_height(self):
         """Return the chain height from cached data."""
@@ -59,7 +385,7 @@ class APIClient:
         if self.latest_block_data:
             try:
                 return int(self.latest_block_data['block']['header']['height'])  # Extract height
-            except (KeyError, ValueError) as e:
+            except (KeyError, ValueError, TypeError) as e:
                 logger.error(f'Error parsing chain height data: {e}')
                 return None
 
@@ -70,118 +396,240 @@ class APIClient:
         if self.latest_block_data:
             try:
                 return self.latest_block_data['block']['header']['chain_id']  # Extract chain_id
-            except (KeyError, ValueError) as e:
+            except (KeyError, ValueError, TypeError) as e:
                 logger.error(f'Error parsing chain ID data: {e}')
                 return None
 
     def fetch_wallet_balance(self, wallet_address, main_denom):
+        """Fetch the balance of a wallet in a single denom."""
         try:
-            response = requests.get(f"{self.api_url}/cosmos/bank/v1beta1/balances/{wallet_address}")
-            response.raise_for_status()
-            data = response.json()
-            logger.debug(f'Wallet balance data retrieved: {data}')
-
-            # Find the balance for the specified main_denom
-            for balance in data['balances']:
-                if balance['denom'] == main_denom:
-                    return float(balance['amount'])
-
-            logger.warning(f'No balance found for denom: {main_denom} in wallet: {wallet_address}')
-            return 0.0
+            data = self.get_json(f"/cosmos/bank/v1beta1/balances/{wallet_address}/by_denom",
+                                 params={'denom': main_denom})
+            log_payload(logger, 'Wallet balance data retrieved', data)
+            return float(data['balance']['amount'])
         except requests.exceptions.RequestException as e:
             logger.error(f'Error fetching wallet balance for {wallet_address}: {e}')
             return None
-        except (KeyError, ValueError) as e:
+        except (KeyError, ValueError, TypeError) as e:
             logger.error(f'Error parsing wallet balance data: {e}')
             return None
 
-    def fetch_validator_stake(self, validator_address):
+    def fetch_wallet_balances(self, wallet_address):
+        """Fetch the balances of a wallet in every denom as a dict, following pagination."""
+        balances = {}
+        params = {'pagination.limit': self.BALANCES_PAGE_LIMIT}
         try:
-            response = requests.get(f"{self.api_url}/cosmos/staking/v1beta1/validators/{validator_address}")
-            response.raise_for_status()  # Raises an HTTPError for bad responses
-            data = response.json()
-            logger.debug(f'Validator stake data retrieved: {data}')
+            while True:
+                data = self.get_json(f"/cosmos/bank/v1beta1/balances/{wallet_address}", params=params)
+                for balance in data['balances']:
+                    balances[balance['denom']] = float(balance['amount'])
 
-            # Extract the tokens (stake) from the response
-            return float(data['validator']['tokens'])
+                next_key = (data.get('pagination') or {}).get('next_key')
+                if not next_key:
+                    break
+                params['pagination.key'] = next_key
+            logger.debug(f'Wallet balances retrieved for {wallet_address}: {len(balances)} denoms')
+            return balances
+        except requests.exceptions.RequestException as e:
+            logger.error(f'Error fetching wallet balances for {wallet_address}: {e}')
+            return None
+        except (KeyError, ValueError, TypeError) as e:
+            logger.error(f'Error parsing wallet balances data: {e}')
+            return None
+
+    def fetch_validator(self, validator_address):
+        """Fetch a single validator from the API."""
+        try:
+            data = self.get_json(f"/cosmos/staking/v1beta1/validators/{validator_address}")
+            log_payload(logger, 'Validator data retrieved', data)
+            return data['validator']
         except requests.exceptions.RequestException as e:
-            logger.error(f'Error fetching validator stake for {validator_address}: {e}')
+            logger.error(f'Error fetching validator {validator_address}: {e}')
             return None
-        except (KeyError, ValueError) as e:
+        except (KeyError, ValueError, TypeError) as e:
+            logger.error(f'Error parsing validator data: {e}')
+            return None
+
+    def fetch_validator_stake(self, validator_address):
+        validator = self.fetch_validator(validator_address)
+        if validator is None:
+            return None
+        try:
+            # Extract the tokens (stake) from the response
+            return float(validator['tokens'])
+        except (KeyError, ValueError, TypeError) as e:
             logger.error(f'Error parsing validator stake data: {e}')
             return None
 
+    def fetch_validator_delegations(self, validator_address, top_n):
+        """Aggregate the delegations of a validator page by page.
+
+        Return the number of delegators, the delegated tokens and the top_n
+        largest delegations, without holding more than a page in memory.
+        """
+        stats = DelegationStats(top_n)
+        params = {'pagination.limit': self.DELEGATIONS_PAGE_LIMIT}
+        try:
+            while True:
+                data = self.get_json(f"/cosmos/staking/v1beta1/validators/{validator_address}/delegations",
+                                     params=params, revalidate=False)
+                for response in data['delegation_responses']:
+                    stats.add(response['delegation']['delegator_address'], float(response['balance']['amount']))
+
+                next_key = (data.get('pagination') or {}).get('next_key')
+                if not next_key:
+                    break
+                params['pagination.key'] = next_key
+            logger.debug(f'Delegations of {validator_address} aggregated: {stats.delegators} delegators')
+            return stats.as_dict()
+        except requests.exceptions.RequestException as e:
+            logger.error(f'Error fetching delegations of {validator_address}: {e}')
+            return None
+        except (KeyError, ValueError, TypeError) as e:
+            logger.error(f'Error parsing delegations data: {e}')
+            return None
+
+    def fetch_validator_rewards(self, validator_address):
+        """Fetch the outstanding rewards and the commission of a validator as dicts of amounts by denom."""
+        try:
+            rewards = self.get_json(f"/cosmos/distribution/v1beta1/validators/{validator_address}/outstanding_rewards")
+            commission = self.get_json(f"/cosmos/distribution/v1beta1/validators/{validator_address}/commission")
+            log_payload(logger, 'Validator rewards data retrieved', rewards)
+            return {
+                'outstanding_rewards': {coin['denom']: float(coin['amount'])
+                                        for coin in rewards['rewards']['rewards']},
+                'commission': {coin['denom']: float(coin['amount'])
+                               for coin in commission['commission']['commission']},
+            }
+        except requests.exceptions.RequestException as e:
+            logger.error(f'Error fetching rewards of {validator_address}: {e}')
+            return None
+        except (KeyError, ValueError, TypeError) as e:
+            logger.error(f'Error parsing validator rewards data: {e}')
+            return None
+
+    def fetch_validators(self):
+        """Fetch the full validator set from the API, following pagination."""
+        validators = []
+        params = {'pagination.limit': self.VALIDATORS_PAGE_LIMIT}
+        try:
+            while True:
+                data = self.get_json("/cosmos/staking/v1beta1/validators", params=params, revalidate=False)
+                validators.extend(data['validators'])
+
+                next_key = (data.get('pagination') or {}).get('next_key')
+                if not next_key:
+                    break
+                params['pagination.key'] = next_key
+            logger.debug(f'Validator set retrieved: {len(validators)} validators')
+            return validators
+        except requests.exceptions.RequestException as e:
+            logger.error(f'Error fetching validator set: {e}')
+            return None
+        except (KeyError, ValueError, TypeError) as e:
+            logger.error(f'Error parsing validator set data: {e}')
+            return None
+
+    def fetch_signing_infos(self):
+        """Fetch the signing infos of every validator from the API, following pagination."""
+        infos = []
+        params = {'pagination.limit': self.VALIDATORS_PAGE_LIMIT}
+        try:
+            while True:
+                data = self.get_json("/cosmos/slashing/v1beta1/signing_infos", params=params, revalidate=False)
+                infos.extend(data['info'])
+
+                next_key = (data.get('pagination') or {}).get('next_key')
+                if not next_key:
+                    break
+                params['pagination.key'] = next_key
+            logger.debug(f'Signing infos retrieved: {len(infos)} validators')
+            return infos
+        except requests.exceptions.RequestException as e:
+            logger.error(f'Error fetching signing infos: {e}')
+            return None
+        except (KeyError, ValueError, TypeError) as e:
+            logger.error(f'Error parsing signing infos data: {e}')
+            return None
+
+    def fetch_blocks(self, heights):
+        """Fetch the blocks at heights, stopping at the first error so a gap is never skipped silently."""
+        blocks = []
+        for height in heights:
+            try:
+                # Blocks never change, their bodies are not kept for revalidation
+                blocks.append(self.get_json(f"/cosmos/base/tendermint/v1beta1/blocks/{height}", revalidate=False))
+            except requests.exceptions.RequestException as e:
+                logger.error(f'Error fetching block {height}: {e}')
+                break
+        return blocks
+
+    @classmethod
+    def prefers_validator_set(cls, validator_count):
+        """Return whether listing the validator set is cheaper than fetching validator_count validators."""
+        return validator_count >= cls.BULK_VALIDATORS_THRESHOLD
+
     def fetch_distribution_params(self):
         """Fetch distribution parameters from the API."""
         try:
-            response = requests.get(f"{self.api_url}/cosmos/distribution/v1beta1/params")
-            response.raise_for_status()  # Raises an HTTPError for bad responses
-            data = response.json()
-            logger.debug(f'Distribution params data retrieved: {data}')
+            data = self.get_json("/cosmos/distribution/v1beta1/params")
+            log_payload(logger, 'Distribution params data retrieved', data)
             return data['params']
         except requests.exceptions.RequestException as e:
             logger.error(f'Error fetching distribution parameters: {e}')
             return None
-        except (KeyError, ValueError) as e:
+        except (KeyError, ValueError, TypeError) as e:
             logger.error(f'Error parsing distribution parameters data: {e}')
             return None
 
     def fetch_mint_params(self):
         """Fetch mint parameters from the API."""
         try:
-            response = requests.get(f"{self.api_url}/cosmos/mint/v1beta1/params")
-            response.raise_for_status()  # Raises an HTTPError for bad responses
-            data = response.json()
-            logger.debug(f'Mint params data retrieved: {data}')
+            data = self.get_json("/cosmos/mint/v1beta1/params")
+            log_payload(logger, 'Mint params data retrieved', data)
             return data['params']
         except requests.exceptions.RequestException as e:
             logger.error(f'Error fetching mint parameters: {e}')
             return None
-        except (KeyError, ValueError) as e:
+        except (KeyError, ValueError, TypeError) as e:
             logger.error(f'Error parsing mint parameters data: {e}')
             return None
 
     def fetch_slashing_params(self):
         """Fetch slashing parameters from the API."""
         try:
-            response = requests.get(f"{self.api_url}/cosmos/slashing/v1beta1/params")
-            response.raise_for_status()  # Raises an HTTPError for bad responses
-            data = response.json()
-            logger.debug(f'Slashing params data retrieved: {data}')
+            data = self.get_json("/cosmos/slashing/v1beta1/params")
+            log_payload(logger, 'Slashing params data retrieved', data)
             return data['params']
         except requests.exceptions.RequestException as e:
             logger.error(f'Error fetching slashing parameters: {e}')
             return None
-        except (KeyError, ValueError) as e:
+        except (KeyError, ValueError, TypeError) as e:
             logger.error(f'Error parsing slashing parameters data: {e}')
             return None
 
     def fetch_staking_params(self):
         """Fetch staking parameters from the API."""
         try:
-            response = requests.get(f"{self.api_url}/cosmos/staking/v1beta1/params")
-            response.raise_for_status()  # Raises an HTTPError for bad responses
-            data = response.json()
-            logger.debug(f'Staking params data retrieved: {data}')
+            data = self.get_json("/cosmos/staking/v1beta1/params")
+            log_payload(logger, 'Staking params data retrieved', data)
             return data['params']
         except requests.exceptions.RequestException as e:
             logger.error(f'Error fetching staking parameters: {e}')
             return None
-        except (KeyError, ValueError) as e:
+        except (KeyError, ValueError, TypeError) as e:
             logger.error(f'Error parsing staking parameters data: {e}')
             return None
 
     def fetch_staking_pool(self):
         """Fetch staking pool data from the API."""
         try:
-            response = requests.get(f"{self.api_url}/cosmos/staking/v1beta1/pool")
-            response.raise_for_status()  # Raises an HTTPError for bad responses
-            data = response.json()
-            logger.debug(f'Staking pool data retrieved: {data}')
+            data = self.get_json("/cosmos/staking/v1beta1/pool")
+            log_payload(logger, 'Staking pool data retrieved', data)
             return data['pool']
         except requests.exceptions.RequestException as e:
             logger.error(f'Error fetching staking pool data: {e}')
             return None
-        except (KeyError, ValueError) as e:
+        except (KeyError, ValueError, TypeError) as e:
             logger.error(f'Error parsing staking pool data: {e}')
             return None
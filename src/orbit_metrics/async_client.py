@@ -0,0 +1,496 @@
+import asyncio
+import logging
+import time
+from urllib.parse import urlparse
+
+try:
+    import aiohttp
+except ImportError:  # Optional dependency, only needed by the async engine
+    aiohttp = None
+
+import requests
+
+from orbit_metrics.api_client import APIClient, ETagCache, build_transport
+from orbit_metrics.api_client import is_endpoint_error as is_request_endpoint_error
+from orbit_metrics.config import DEFAULTS
+from orbit_metrics.endpoints import EndpointPool
+from orbit_metrics.instrumentation import RequestTimer
+from orbit_metrics.metrics import http_connections_opened_counter, http_requests_counter, http_retries_counter
+from orbit_metrics.parsing import loads, log_payload
+from orbit_metrics.resilience import CircuitOpenError, backoff_delay, retry_budget
+
+logger = logging.getLogger(__name__)
+
+# Errors of a request, which the fetch methods log before returning None. The gRPC transport raises the
+# requests exceptions of the REST API it stands in for.
+REQUEST_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, CircuitOpenError, requests.exceptions.RequestException) \
+    if aiohttp else (CircuitOpenError, requests.exceptions.RequestException)
+
+
+class AsyncAPIClient:
+    """Coroutine counterpart of APIClient, sharing one pooled aiohttp session.
+
+    The fetch methods have the same names, arguments and return values as the
+    ones of APIClient, but must be awaited. Queries with a gRPC method go to
+    the transport of the client, whose blocking calls run in the default
+    executor of the event loop. There is no fetch_validator_delegations: the
+    delegations are refetched by the background runner with the synchronous
+    client of the node, outside of the cycles that run the event loop.
+    """
+
+    BULK_VALIDATORS_THRESHOLD = APIClient.BULK_VALIDATORS_THRESHOLD
+    VALIDATORS_PAGE_LIMIT = APIClient.VALIDATORS_PAGE_LIMIT
+    BALANCES_PAGE_LIMIT = APIClient.BALANCES_PAGE_LIMIT
+
+    prefers_validator_set = APIClient.prefers_validator_set
+
+    def __init__(self, api_url, session, endpoints=None, http_settings=None, chain=None, transport=None):
+        self.api_url = api_url
+        self.chain = chain or api_url  # Label of the request metrics
+        self.session = session
+        self.endpoints = endpoints or EndpointPool([api_url])
+        self.http_settings = dict(DEFAULTS['http'])
+        self.http_settings.update(http_settings or {})
+        self.moniker = None
+        self.chain_id = None
+        self.latest_block_data = None
+        self._etags = ETagCache()
+        self.transport = transport  # Serves the queries it has a route for instead of the REST endpoints
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+    async def get_json(self, path, params=None, revalidate=True):
+        """GET path from the best endpoint of the node and return its JSON body, see APIClient.get_json."""
+        return (await self.request(path, params, revalidate))[1]
+
+    async def request(self, path, params=None, revalidate=True):
+        """GET path and return (endpoint, JSON body), failing over, hedging and retrying like APIClient.request."""
+        route = self.transport.route(path) if self.transport is not None else None
+        attempt = 0
+        while True:
+            try:
+                if route is not None and self.transport.endpoints.available():
+                    return await self._transport_request(path, params)
+                return await self._request_endpoints(path, params, revalidate)
+            except REQUEST_ERRORS as e:
+                if not is_endpoint_error(e) or isinstance(e, CircuitOpenError):
+                    raise
+                attempt += 1
+                if attempt > self.http_settings['retries'] or not retry_budget.acquire():
+                    raise
+            http_retries_counter.labels(host=urlparse(self.api_url).hostname).inc()
+            await asyncio.sleep(backoff_delay(attempt, self.http_settings['backoff_base'], self.http_settings['backoff_max']))
+
+    async def _transport_request(self, path, params):
+        """Send path to the transport from an executor thread, recording the latency or failure like _request."""
+        started = time.monotonic()
+        try:
+            with RequestTimer(self.chain, path) as timer:
+                data = await asyncio.get_event_loop().run_in_executor(None, self.transport.get_json, path, params,
+                                                                      timer)
+        except requests.exceptions.RequestException as e:
+            if is_endpoint_error(e):
+                self.transport.endpoints.record_failure(self.transport.url)
+            raise
+        self.transport.endpoints.record_success(self.transport.url, time.monotonic() - started)
+        return self.transport.url, data
+
+    async def _request_endpoints(self, path, params, revalidate=True):
+        candidates = self.endpoints.available()
+        if not candidates:
+            raise CircuitOpenError(f'Circuit breaker open for every endpoint of {self.api_url}')
+
+        error = None
+        if self.endpoints.hedge and len(candidates) > 1:
+            try:
+                return await self._hedged_request(candidates[0], candidates[1], path, params, revalidate)
+            except REQUEST_ERRORS as e:
+                if not is_endpoint_error(e):
+                    raise
+                error = e
+            candidates = candidates[2:]
+
+        for base_url in candidates:
+            try:
+                return await self._request(base_url, path, params, revalidate)
+            except REQUEST_ERRORS as e:
+                if not is_endpoint_error(e):
+                    raise
+                logger.warning(f'Request to {base_url}{path} failed: {e}')
+                error = e
+        raise error
+
+    async def _hedged_request(self, primary_url, secondary_url, path, params, revalidate=True):
+        delay = self.endpoints.hedge_delay(primary_url)
+        primary = asyncio.ensure_future(self._request(primary_url, path, params, revalidate))
+        done, _ = await asyncio.wait([primary], timeout=delay)
+        if done and (primary.exception() is None or not is_endpoint_error(primary.exception())):
+            return primary.result()
+
+        logger.debug(f'Hedging request to {primary_url}{path} with {secondary_url}')
+        secondary = asyncio.ensure_future(self._request(secondary_url, path, params, revalidate))
+        if done:  # The primary endpoint failed, the secondary one is simply the next to try
+            return await secondary
+
+        pending = {primary, secondary}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    async def _request(self, base_url, path, params, revalidate=True):
+        """GET path from base_url, recording the latency or failure of the endpoint."""
+        started = time.monotonic()
+        try:
+            with RequestTimer(self.chain, path) as timer:
+                data = await self._get_json_from(f"{base_url}{path}", params, timer, revalidate)
+        except REQUEST_ERRORS as e:
+            if is_endpoint_error(e):
+                self.endpoints.record_failure(base_url)
+            raise
+        self.endpoints.record_success(base_url, time.monotonic() - started)
+        return base_url, data
+
+    async def _get_json_from(self, url, params, timer, revalidate=True):
+        """GET url and return its JSON body, revalidating it with If-None-Match like APIClient."""
+        key = (url, tuple(sorted((params or {}).items())))
+        cached = self._etags.get(key) if revalidate else None
+        headers = {'If-None-Match': cached[0]} if cached else None
+
+        async with self.session.get(url, params=params, headers=headers) as response:
+            timer.record_response(response.status)
+            if cached and response.status == 304:
+                logger.debug(f'Not modified since last request: {url}')
+                return cached[1]
+            response.raise_for_status()  # Raises a ClientResponseError for bad responses
+            body = await response.read()
+            timer.record_response(response.status, len(body))
+            try:
+                data = loads(body)
+            except ValueError as e:
+                raise aiohttp.ClientPayloadError(f'Invalid JSON in response from {url}: {e}')
+
+            etag = response.headers.get('ETag')
+            if etag and revalidate:
+                self._etags.put(key, etag, data)
+            return data
+
+    async def _fetch_field(self, path, field, description, params=None):
+        """Fetch path and return its field, logging and returning None on errors."""
+        try:
+            data = await self.get_json(path, params=params)
+            log_payload(logger, f'{description.capitalize()} data retrieved', data)
+            return data[field]
+        except REQUEST_ERRORS as e:
+            logger.error(f'Error fetching {description}: {e}')
+            return None
+        except (KeyError, ValueError, TypeError) as e:
+            logger.error(f'Error parsing {description} data: {e}')
+            return None
+
+    async def fetch_node_info(self):
+        """Fetch node information from the API, trying multiple endpoints."""
+        endpoints = [
+            "/node_info",
+            "/cosmos/base/tendermint/v1beta1/node_info"
+        ]
+
+        for endpoint in endpoints:
+            try:
+                data = await self.get_json(endpoint)
+                log_payload(logger, f'Node info data retrieved from {endpoint}', data)
+
+                node_info_key = 'node_info' if 'node_info' in data else 'default_node_info'
+                self.moniker = data[node_info_key]['moniker']
+                self.chain_id = data[node_info_key]['network']
+                return
+            except REQUEST_ERRORS as e:
+                logger.error(f'Error fetching node info from {endpoint}: {e}')
+            except (KeyError, ValueError, TypeError) as e:
+                logger.error(f'Error parsing node info data from {endpoint}: {e}')
+
+        logger.error("Failed to fetch node info from all endpoints.")
+
+    async def fetch_latest_block_data(self):
+        """Fetch the latest block data once."""
+        try:
+            endpoint, self.latest_block_data = await self.request("/cosmos/base/tendermint/v1beta1/blocks/latest")
+            log_payload(logger, 'Latest block data block', self.latest_block_data)
+        except REQUEST_ERRORS as e:
+            logger.error(f'Error fetching latest block data: {e}')
+            self.latest_block_data = None
+            return
+
+        if endpoint not in self.endpoints.stats:  # The endpoint of the transport, not ranked by height
+            return
+        try:
+            height = int(self.latest_block_data['block']['header']['height'])
+        except (KeyError, ValueError, TypeError):
+            return  # Reported by fetch_chain_height
+        self.endpoints.record_height(endpoint, height)
+
+    async def fetch_chain_height(self):
+        """Return the chain height from cached data."""
+        if self.latest_block_data is None:
+            await self.fetch_latest_block_data()
+        if self.latest_block_data:
+            try:
+                return int(self.latest_block_data['block']['header']['height'])
+            except (KeyError, ValueError, TypeError) as e:
+                logger.error(f'Error parsing chain height data: {e}')
+                return None
+
+    async def fetch_chain_id(self):
+        """Return the chain ID from cached data."""
+        if self.latest_block_data is None:
+            await self.fetch_latest_block_data()
+        if self.latest_block_data:
+            try:
+                return self.latest_block_data['block']['header']['chain_id']
+            except (KeyError, ValueError, TypeError) as e:
+                logger.error(f'Error parsing chain ID data: {e}')
+                return None
+
+    async def fetch_wallet_balance(self, wallet_address, main_denom):
+        """Fetch the balance of a wallet in a single denom."""
+        balance = await self._fetch_field(f'/cosmos/bank/v1beta1/balances/{wallet_address}/by_denom',
+                                          'balance', f'wallet balance for {wallet_address}',
+                                          params={'denom': main_denom})
+        if balance is None:
+            return None
+        try:
+            return float(balance['amount'])
+        except (KeyError, ValueError, TypeError) as e:
+            logger.error(f'Error parsing wallet balance data: {e}')
+            return None
+
+    async def fetch_wallet_balances(self, wallet_address):
+        """Fetch the balances of a wallet in every denom as a dict, following pagination."""
+        balances = {}
+        params = {'pagination.limit': self.BALANCES_PAGE_LIMIT}
+        try:
+            while True:
+                data = await self.get_json(f"/cosmos/bank/v1beta1/balances/{wallet_address}", params=params)
+                for balance in data['balances']:
+                    balances[balance['denom']] = float(balance['amount'])
+
+                next_key = (data.get('pagination') or {}).get('next_key')
+                if not next_key:
+                    break
+                params['pagination.key'] = next_key
+            logger.debug(f'Wallet balances retrieved for {wallet_address}: {len(balances)} denoms')
+            return balances
+        except REQUEST_ERRORS as e:
+            logger.error(f'Error fetching wallet balances for {wallet_address}: {e}')
+            return None
+        except (KeyError, ValueError, TypeError) as e:
+            logger.error(f'Error parsing wallet balances data: {e}')
+            return None
+
+    async def fetch_validator(self, validator_address):
+        """Fetch a single validator from the API."""
+        return await self._fetch_field(f'/cosmos/staking/v1beta1/validators/{validator_address}',
+                                       'validator', f'validator {validator_address}')
+
+    async def fetch_validator_stake(self, validator_address):
+        validator = await self.fetch_validator(validator_address)
+        if validator is None:
+            return None
+        try:
+            return float(validator['tokens'])
+        except (KeyError, ValueError, TypeError) as e:
+            logger.error(f'Error parsing validator stake data: {e}')
+            return None
+
+    async def fetch_validator_rewards(self, validator_address):
+        """Fetch the outstanding rewards and the commission of a validator concurrently, see APIClient."""
+        path = f'/cosmos/distribution/v1beta1/validators/{validator_address}'
+        try:
+            rewards, commission = await asyncio.gather(self.get_json(f'{path}/outstanding_rewards'),
+                                                       self.get_json(f'{path}/commission'))
+            log_payload(logger, 'Validator rewards data retrieved', rewards)
+            return {
+                'outstanding_rewards': {coin['denom']: float(coin['amount'])
+                                        for coin in rewards['rewards']['rewards']},
+                'commission': {coin['denom']: float(coin['amount'])
+                               for coin in commission['commission']['commission']},
+            }
+        except REQUEST_ERRORS as e:
+            logger.error(f'Error fetching rewards of {validator_address}: {e}')
+            return None
+        except (KeyError, ValueError, TypeError) as e:
+            logger.error(f'Error parsing validator rewards data: {e}')
+            return None
+
+    async def fetch_validators(self):
+        """Fetch the full validator set from the API, following pagination."""
+        validators = []
+        params = {'pagination.limit': self.VALIDATORS_PAGE_LIMIT}
+        try:
+            while True:
+                data = await self.get_json("/cosmos/staking/v1beta1/validators", params=params, revalidate=False)
+                validators.extend(data['validators'])
+
+                next_key = (data.get('pagination') or {}).get('next_key')
+                if not next_key:
+                    break
+                params['pagination.key'] = next_key
+            logger.debug(f'Validator set retrieved: {len(validators)} validators')
+            return validators
+        except REQUEST_ERRORS as e:
+            logger.error(f'Error fetching validator set: {e}')
+            return None
+        except (KeyError, ValueError, TypeError) as e:
+            logger.error(f'Error parsing validator set data: {e}')
+            return None
+
+    async def fetch_signing_infos(self):
+        """Fetch the signing infos of every validator from the API, following pagination."""
+        infos = []
+        params = {'pagination.limit': self.VALIDATORS_PAGE_LIMIT}
+        try:
+            while True:
+                data = await self.get_json("/cosmos/slashing/v1beta1/signing_infos", params=params,
+                                           revalidate=False)
+                infos.extend(data['info'])
+
+                next_key = (data.get('pagination') or {}).get('next_key')
+                if not next_key:
+                    break
+                params['pagination.key'] = next_key
+            logger.debug(f'Signing infos retrieved: {len(infos)} validators')
+            return infos
+        except REQUEST_ERRORS as e:
+            logger.error(f'Error fetching signing infos: {e}')
+            return None
+        except (KeyError, ValueError, TypeError) as e:
+            logger.error(f'Error parsing signing infos data: {e}')
+            return None
+
+    async def fetch_blocks(self, heights):
+        """Fetch the blocks at heights concurrently, keeping those fetched before the first error."""
+        # Blocks never change, their bodies are not kept for revalidation
+        results = await asyncio.gather(*(self.get_json(f"/cosmos/base/tendermint/v1beta1/blocks/{height}",
+                                                       revalidate=False)
+                                         for height in heights), return_exceptions=True)
+        blocks = []
+        for height, result in zip(heights, results):
+            if isinstance(result, Exception):
+                logger.error(f'Error fetching block {height}: {result}')
+                break
+            blocks.append(result)
+        return blocks
+
+    async def fetch_distribution_params(self):
+        """Fetch distribution parameters from the API."""
+        return await self._fetch_field('/cosmos/distribution/v1beta1/params', 'params', 'distribution parameters')
+
+    async def fetch_mint_params(self):
+        """Fetch mint parameters from the API."""
+        return await self._fetch_field('/cosmos/mint/v1beta1/params', 'params', 'mint parameters')
+
+    async def fetch_slashing_params(self):
+        """Fetch slashing parameters from the API."""
+        return await self._fetch_field('/cosmos/slashing/v1beta1/params', 'params', 'slashing parameters')
+
+    async def fetch_staking_params(self):
+        """Fetch staking parameters from the API."""
+        return await self._fetch_field('/cosmos/staking/v1beta1/params', 'params', 'staking parameters')
+
+    async def fetch_staking_pool(self):
+        """Fetch staking pool data from the API."""
+        return await self._fetch_field('/cosmos/staking/v1beta1/pool', 'pool', 'staking pool')
+
+
+def is_endpoint_error(error):
+    """Return whether a request error is caused by the endpoint rather than by the request itself."""
+    if isinstance(error, requests.exceptions.RequestException):  # Raised by the gRPC transport
+        return is_request_endpoint_error(error)
+    return not (isinstance(error, aiohttp.ClientResponseError) and error.status < 500)
+
+
+async def _on_request_start(session, context, params):
+    context.host = urlparse(str(params.url)).hostname
+    http_requests_counter.labels(host=context.host).inc()
+
+
+async def _on_connection_create_end(session, context, params):
+    http_connections_opened_counter.labels(host=context.host).inc()
+
+
+class AsyncClientPool:
+    """Event loop, pooled aiohttp session and AsyncAPIClients keyed by api_url.
+
+    The global and per-host concurrency limits are enforced by the connector of
+    the shared session, so thousands of requests can be in flight on one loop.
+    """
+
+    def __init__(self, concurrency_settings, http_settings, endpoint_settings=None):
+        if aiohttp is None:
+            raise RuntimeError("The async engine requires aiohttp, install it with 'pip install orbit_metrics[async]'")
+        self.concurrency_settings = concurrency_settings
+        self.http_settings = dict(DEFAULTS['http'])
+        self.http_settings.update(http_settings)
+        self.endpoint_settings = endpoint_settings or {}
+        self.loop = asyncio.new_event_loop()
+        self.session = None
+        self.clients = {}
+
+    def _create_session(self):
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(_on_request_start)
+        trace_config.on_connection_create_end.append(_on_connection_create_end)
+
+        connector = aiohttp.TCPConnector(limit=self.concurrency_settings['max_workers'],
+                                         limit_per_host=self.concurrency_settings['max_per_host'],
+                                         force_close=not self.http_settings['keep_alive'])
+        timeout = aiohttp.ClientTimeout(sock_connect=self.http_settings['connect_timeout'],
+                                        sock_read=self.http_settings['read_timeout'])
+        return aiohttp.ClientSession(connector=connector, timeout=timeout, trace_configs=[trace_config])
+
+    def run(self, coroutine):
+        """Run coroutine to completion on the event loop of the pool."""
+        return self.loop.run_until_complete(coroutine)
+
+    def get_client(self, api_urls, chain=None, grpc_url=None):
+        """Return the AsyncAPIClient of a node's API endpoints, must be called from the event loop of the pool.
+
+        With a grpc_url, the queries that have a gRPC method are sent to it instead.
+        """
+        if isinstance(api_urls, str):
+            api_urls = [api_urls]
+        if self.session is None:
+            self.session = self._create_session()
+        key = tuple(api_urls)
+        client = self.clients.get(key)
+        if client is None:
+            transport = build_transport(grpc_url, self.http_settings, self.endpoint_settings) if grpc_url else None
+            client = self.clients[key] = AsyncAPIClient(api_urls[0], self.session,
+                                                        EndpointPool(api_urls, **self.endpoint_settings),
+                                                        self.http_settings, chain, transport)
+        return client
+
+    def drop_client(self, api_urls):
+        """Forget the client of a node's API endpoints, the shared session stays open."""
+        if isinstance(api_urls, str):
+            api_urls = [api_urls]
+        client = self.clients.pop(tuple(api_urls), None)
+        if client is not None:
+            client.close()
+
+    def close(self):
+        if self.session is not None:
+            self.run(self.session.close())
+            self.session = None
+        for client in self.clients.values():
+            client.close()
+        self.clients.clear()
+        self.loop.close()
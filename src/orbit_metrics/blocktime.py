@@ -0,0 +1,74 @@
+import calendar
+import threading
+import time
+from array import array
+
+
+def header_time(text):
+    """Return the Unix time of an RFC 3339 block header time in UTC, such as 2024-05-01T12:00:00.123456789Z."""
+    date, _, fraction = text.rstrip('Z').partition('.')
+    seconds = calendar.timegm(time.strptime(date, '%Y-%m-%dT%H:%M:%S'))
+    return seconds + float(f'0.{fraction}') if fraction else float(seconds)
+
+
+def block_header(block_data):
+    """Return the height and Unix time of a block."""
+    header = block_data['block']['header']
+    return int(header['height']), header_time(header['time'])
+
+
+class HeaderWindow:
+    """Ring buffer of the heights and times of the last size blocks of a chain.
+
+    Heights and times are stored in typed arrays, 16 bytes per block instead of
+    a dict per header, and only grow forward: heights at or below the last
+    recorded one are ignored, so a block is never recorded twice.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.heights = array('q', [0]) * size
+        self.times = array('d', [0.0]) * size
+        self.count = 0  # Recorded blocks, at most size
+        self.position = 0  # Index of the next block to record
+        self._lock = threading.Lock()
+
+    @property
+    def last_height(self):
+        return self.heights[self.position - 1] if self.count else None
+
+    @property
+    def last_time(self):
+        return self.times[self.position - 1] if self.count else None
+
+    def record(self, height, timestamp):
+        with self._lock:
+            if self.count and height <= self.heights[self.position - 1]:
+                return
+            self.heights[self.position] = height
+            self.times[self.position] = timestamp
+            self.position = (self.position + 1) % self.size
+            self.count = min(self.count + 1, self.size)
+
+    def missing_blocks(self, latest_height, max_backfill):
+        """Return the heights of the blocks between the last recorded one and the latest block, at most max_backfill.
+
+        The latest block itself is recorded from the latest block data and is not included.
+        """
+        if self.last_height is None:
+            return []
+        return list(range(max(self.last_height + 1, latest_height - max_backfill), latest_height))
+
+    def block_time(self):
+        """Return the average seconds between two blocks over the window, None until two blocks are recorded.
+
+        Computed from the oldest and newest blocks only, so blocks that could not
+        be backfilled do not bias the average.
+        """
+        with self._lock:
+            if self.count < 2:
+                return None
+            oldest, newest = (self.position - self.count) % self.size, self.position - 1
+            heights = self.heights[newest] - self.heights[oldest]
+            seconds = self.times[newest] - self.times[oldest]
+        return seconds / heights if seconds > 0 else None
@@ -14,6 +14,10 @@ def parse_args():
                         action='store',
                         dest='config',
                         help='Path to the configuration file.')
+    parser.add_argument('--check-config',
+                        action='store_true',
+                        dest='check_config',
+                        help='Validate the configuration file and exit, without starting the exporter.')
     parser.add_argument('--log-file',
                         action='store',
                         dest='log_file',
@@ -25,6 +29,16 @@ def parse_args():
                         default='INFO',
                         choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
                         help='Set the logging level.')
+    parser.add_argument('--shard',
+                        type=int,
+                        action='store',
+                        dest='shard',
+                        help='Only collect the chains of this shard, numbered from 0, to run the shards as replicas.')
+    parser.add_argument('--shards',
+                        type=int,
+                        action='store',
+                        dest='shards',
+                        help='Number of shards, overrides sharding.shards of the configuration.')
 
     args = parser.parse_args()
     logger.debug(f'Command line parameters: {args}')
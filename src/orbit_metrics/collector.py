@@ -0,0 +1,64 @@
+import logging
+import threading
+import time
+
+from prometheus_client import REGISTRY
+
+from orbit_metrics.exporter import fetch_metrics
+from orbit_metrics.metrics import exported_metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class ScrapeCollector:
+    """Collector that refreshes the exporter metrics when Prometheus scrapes.
+
+    A collection is reused by every scrape arriving within min_age seconds, and
+    scrapes arriving while a collection is in flight wait for it instead of
+    starting their own, so HA Prometheus pairs trigger a single upstream fetch.
+    """
+
+    def __init__(self, config, min_age, metrics=None, clock=time.monotonic, reloader=None):
+        self.config = config
+        self.reloader = reloader
+        self.min_age = min_age
+        self.metrics = metrics if metrics is not None else exported_metrics()
+        self.clock = clock
+        self.last_collected = None
+        self._lock = threading.Lock()
+
+    def _is_fresh(self):
+        return self.last_collected is not None and self.clock() - self.last_collected < self.min_age
+
+    def refresh(self):
+        if self._is_fresh():
+            return
+        with self._lock:
+            if self._is_fresh():  # Another scrape collected while we were waiting
+                return
+            if self.reloader is not None:
+                self.config = self.reloader.poll()
+            try:
+                fetch_metrics(self.config)
+            except Exception as e:
+                logger.error(f'Failed to collect metrics on scrape: {e}')
+            self.last_collected = self.clock()
+
+    def describe(self):
+        for metric in self.metrics:
+            yield from metric.describe()
+
+    def collect(self):
+        self.refresh()
+        for metric in self.metrics:
+            yield from metric.collect()
+
+
+def register_scrape_collector(config, min_age, registry=REGISTRY, reloader=None):
+    """Replace the exporter metrics in registry with a ScrapeCollector serving them."""
+    collector = ScrapeCollector(config, min_age, reloader=reloader)
+    for metric in collector.metrics:
+        registry.unregister(metric)
+    registry.register(collector)
+    return collector
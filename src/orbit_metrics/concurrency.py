@@ -0,0 +1,102 @@
+import collections
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlparse
+
+
+logger = logging.getLogger(__name__)
+
+
+class HostLimiter:
+    """Submit tasks to an executor with a bound on the in-flight tasks per upstream host.
+
+    A task whose host is at its limit waits in a queue of the host rather than
+    in a worker of the executor, and is submitted once a task of the same host
+    completes. The workers are never held by a slow host, so the tasks of the
+    other hosts keep running.
+    """
+
+    def __init__(self, executor, max_per_host):
+        self.executor = executor
+        self.max_per_host = max_per_host
+        self._in_flight = collections.Counter()  # host -> submitted tasks
+        self._queues = collections.defaultdict(collections.deque)  # host -> (future, func, args) waiting for a slot
+        self._lock = threading.Lock()
+
+    def submit(self, url, func, *args):
+        """Run func(*args) once a slot for the host of url is available and return its Future."""
+        host = urlparse(url).netloc or url
+        future = Future()
+        with self._lock:
+            if self._in_flight[host] >= self.max_per_host:
+                self._queues[host].append((future, func, args))
+                return future
+            self._in_flight[host] += 1
+        self.executor.submit(self._run, host, future, func, args)
+        return future
+
+    def _run(self, host, future, func, args):
+        if not future.set_running_or_notify_cancel():
+            self._release(host)
+            return
+        try:
+            result = func(*args)
+        except BaseException as e:
+            self._release(host)
+            future.set_exception(e)
+        else:
+            self._release(host)
+            future.set_result(result)
+
+    def _release(self, host):
+        # Hands the slot over to the next task of the host, if any
+        with self._lock:
+            queue = self._queues.get(host)
+            if not queue:
+                self._in_flight[host] -= 1
+                return
+            future, func, args = queue.popleft()
+        self.executor.submit(self._run, host, future, func, args)
+
+
+class BackgroundRunner:
+    """Run slow jobs on a small pool of their own, without waiting for them.
+
+    A job is identified by a key and is not submitted again while it runs, so
+    a job slower than the collection cycle is never queued twice.
+    """
+
+    def __init__(self, max_workers):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='background')
+        self._running = set()
+        self._lock = threading.Lock()
+
+    def submit(self, key, func, *args):
+        """Run func(*args) in the background and return True, or False if the job of key is still running."""
+        with self._lock:
+            if key in self._running:
+                return False
+            self._running.add(key)
+        try:
+            self._executor.submit(self._run, key, func, *args)
+        except RuntimeError:  # Shutting down
+            self._done(key)
+            return False
+        return True
+
+    def running(self, key):
+        with self._lock:
+            return key in self._running
+
+    def _run(self, key, func, *args):
+        try:
+            func(*args)
+        except Exception as e:
+            logger.error(f'Background job {key} failed: {e}')
+        finally:
+            self._done(key)
+
+    def _done(self, key):
+        with self._lock:
+            self._running.discard(key)
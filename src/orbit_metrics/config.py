@@ -1,6 +1,235 @@
 import yaml
 
 
+# Defaults for the optional top-level config sections.
+DEFAULTS = {
+    'exporter': {
+        'mode': 'poll',  # 'poll' refreshes in a loop, 'scrape' when Prometheus scrapes, 'probe' only on /probe
+        'scrape_min_age': 10,  # Seconds a scrape-triggered collection is reused by later scrapes
+        'engine': 'threads',  # 'threads' or 'async' (requires aiohttp)
+        'series_ttl': 900,  # Seconds after which series that are no longer updated are removed, 0 to keep them
+        'reload_watch': True,  # Reload the configuration when its file changes, besides on SIGHUP
+    },
+    'concurrency': {
+        'max_workers': 16,  # Global number of concurrent upstream requests
+        'max_per_host': 4,  # Concurrent requests against a single LCD host
+    },
+    'http': {
+        'pool_connections': 10,  # Number of host pools kept per session
+        'pool_maxsize': 10,  # Connections kept alive per host
+        'pool_block': False,  # Block instead of opening extra connections above pool_maxsize
+        'keep_alive': True,
+        'connect_timeout': 3.05,  # Seconds to establish a connection
+        'read_timeout': 10,  # Seconds to wait for the response
+        'retries': 2,  # Retries of a request after every endpoint of the node failed
+        'backoff_base': 0.5,  # Seconds before the first retry, doubled for every next one (with jitter)
+        'backoff_max': 5,
+        'retry_budget': 50,  # Retries all nodes may spend together during a cycle
+    },
+    'endpoints': {  # Selection between the api_urls of a node
+        'ewma_alpha': 0.3,  # Weight of the latest request in the latency and error moving averages
+        'error_penalty': 10.0,  # Seconds added to the latency per unit of error rate
+        'max_height_lag': 5,  # Blocks an endpoint may lag behind the others before it is ranked last
+        'height_ttl': 120,  # Seconds a reported height is used to compute the lag
+        'hedge': False,  # Send a second request to the next endpoint when the first one is slow
+        'hedge_quantile': 0.95,  # Latency quantile of the first endpoint after which to hedge
+        'samples': 50,  # Latencies kept per endpoint to compute the quantile
+        'breaker_threshold': 5,  # Consecutive failures after which an endpoint is skipped
+        'breaker_reset': 60,  # Seconds an endpoint is skipped before it is tried again
+    },
+    'uptime': {  # Validator uptime from signing infos and block commits
+        'enabled': False,
+        'max_backfill': 20,  # Blocks fetched per cycle to catch up on the commits since the last one
+    },
+    'block_time': {  # Block time and stall detection from the headers of the latest blocks
+        'enabled': False,
+        'window': 100,  # Blocks the average block time is computed over
+        'max_backfill': 20,  # Blocks fetched per cycle to fill the gap since the last recorded one
+        'stall_factor': 5,  # Average block times without a new block after which the chain is stalled
+    },
+    'delegations': {  # Delegators, largest delegations, outstanding rewards and commission of the validators
+        'enabled': False,
+        'top_n': 10,  # Largest delegations exported per validator
+    },
+    'probe': {  # /probe?target=<chain>&module=<groups> collecting a single chain on demand
+        'enabled': True,
+        'timeout': 10,  # Seconds a probe may take, lowered to the scrape timeout sent by Prometheus
+        'min_age': 5,  # Seconds the groups fetched by a probe are reused by the next probes
+    },
+    'sharding': {  # Split the nodes across processes by consistent hashing of their names
+        'shards': 1,
+        'workers': False,  # Run every shard in a worker process of this exporter, instead of in separate replicas
+        'worker_port': 8001,  # Port of the first worker, the next ones listen on the following ports
+        'aggregate': True,  # Serve the metrics of every worker on port 8000, otherwise scrape the workers directly
+    },
+    'snapshot': {  # Last known values saved to disk, served right after a restart
+        'path': '',  # File of the snapshot, empty to disable snapshots
+        'interval': 60,  # Minimum seconds between two writes of the snapshot
+    },
+    'push': {  # Push the changed samples after every cycle, to a remote-write receiver or a Pushgateway
+        'enabled': False,
+        'format': 'remote_write',  # 'remote_write' or 'pushgateway'
+        'url': '',  # Remote-write endpoint, or base URL of the Pushgateway
+        'job': 'orbit_metrics',  # job label of the pushed series
+        'instance': '',  # instance label of the pushed series, the host name when empty
+        'full_interval': 240,  # Seconds after which unchanged samples are pushed again, below the 5m staleness
+        'max_samples_per_batch': 2000,  # Samples per remote-write request
+        'queue_size': 100,  # Batches kept in memory while they cannot be sent
+        'timeout': 10,  # Seconds a push request may take
+        'backoff_base': 1,  # Seconds before retrying a failed push, doubled for every next attempt (with jitter)
+        'backoff_max': 60,
+        'spill_path': '',  # Directory the queued batches are written to during outages, empty to drop them
+        'spill_max_bytes': 104857600,  # Size above which the oldest spilled batches are dropped
+    },
+    'refresh': {  # Seconds between refreshes of each metric group
+        'height': 15,
+        'blocks': 15,  # Commits of the blocks produced since the last refresh
+        'signing': 60,  # Signing infos (missed blocks counters)
+        'balances': 60,
+        'validators': 60,
+        'pool': 60,
+        'rewards': 300,  # Outstanding rewards and commission
+        'delegations': 3600,  # Every page of the delegations, collected in the background
+        'params': 3600,  # Distribution, mint, slashing and staking params only change through governance
+        'node_info': 3600,
+    },
+}
+
+
+# Allowed values of the settings that are not numbers or booleans
+CHOICES = {
+    ('exporter', 'mode'): ('poll', 'scrape', 'probe'),
+    ('exporter', 'engine'): ('threads', 'async'),
+    ('push', 'format'): ('remote_write', 'pushgateway'),
+}
+
+# Settings that count or size something and must be at least 1
+COUNTS = {
+    ('concurrency', 'max_workers'), ('concurrency', 'max_per_host'),
+    ('http', 'pool_connections'), ('http', 'pool_maxsize'),
+    ('endpoints', 'samples'), ('endpoints', 'breaker_threshold'),
+    ('block_time', 'window'),
+    ('delegations', 'top_n'),
+    ('sharding', 'shards'),
+    ('push', 'max_samples_per_batch'), ('push', 'queue_size'),
+}
+
+
+class ConfigError(ValueError):
+    """Raised when a configuration is invalid."""
+
+
 def load_config(config_path):
     with open(config_path, 'r') as file:
-        return yaml.safe_load(file)
\ No newline at end of file
+        return yaml.safe_load(file)
+
+
+def get_settings(config, section):
+    """Return the settings of a config section merged over its defaults."""
+    settings = dict(DEFAULTS.get(section, {}))
+    settings.update((config or {}).get(section) or {})
+    return settings
+
+
+def node_api_urls(node):
+    """Return the API endpoints of a node, its api_url first followed by its api_urls."""
+    urls = [node['api_url']] if node.get('api_url') else []
+    urls.extend(url for url in node.get('api_urls', []) if url not in urls)
+    if not urls:
+        raise KeyError(f"Node {node.get('name')} has no api_url")
+    return urls
+
+
+def _node_errors(node, where):
+    errors = []
+    if not node.get('api_url') and not node.get('api_urls'):
+        errors.append(f'{where} has no api_url')
+    if not isinstance(node.get('api_urls', []), list):
+        errors.append(f'{where}: api_urls must be a list')
+    if node.get('grpc_url') is not None and not isinstance(node['grpc_url'], str):
+        errors.append(f'{where}: grpc_url must be a string')
+    urls = [node.get('api_url') or ''] + (node['api_urls'] if isinstance(node.get('api_urls'), list) else [])
+    if not all(isinstance(url, str) for url in urls):
+        errors.append(f'{where}: api_url and api_urls must be strings')
+    if node.get('main_denom') is not None and not isinstance(node['main_denom'], str):
+        errors.append(f'{where}: main_denom must be a string')
+    elif node.get('wallets') and not node.get('main_denom'):  # The denom of the wallet balances
+        errors.append(f'{where} has wallets but no main_denom')
+    denoms = node.get('balance_denoms')
+    if denoms not in (None, 'all') and not (isinstance(denoms, list) and all(isinstance(d, str) for d in denoms)):
+        errors.append(f'{where}: balance_denoms must be "all" or a list of denoms')
+    for key in ('wallets', 'validators'):
+        if not isinstance(node.get(key) or [], list):
+            errors.append(f'{where}: {key} must be a list')
+    for wallet in node.get('wallets') if isinstance(node.get('wallets'), list) else []:
+        if not isinstance(wallet, dict) or not wallet.get('address'):
+            errors.append(f'{where} has a wallet without address')
+        elif not isinstance(wallet['address'], str) or not isinstance(wallet.get('type', ''), str):
+            errors.append(f'{where}: the address and type of wallet {wallet["address"]} must be strings')
+    for validator in node.get('validators') if isinstance(node.get('validators'), list) else []:
+        if not isinstance(validator, dict) or not validator.get('validator_id'):
+            errors.append(f'{where} has a validator without validator_id')
+        elif not isinstance(validator['validator_id'], str):
+            errors.append(f'{where}: validator_id {validator["validator_id"]} must be a string')
+    return errors
+
+
+def _setting_errors(section, settings):
+    errors = []
+    for key, value in settings.items():
+        if key not in DEFAULTS[section]:
+            errors.append(f'Unknown setting {section}.{key}')
+            continue
+        default = DEFAULTS[section][key]
+        if (section, key) in CHOICES:
+            if value not in CHOICES[(section, key)]:
+                errors.append(f'{section}.{key} must be one of {", ".join(CHOICES[(section, key)])}')
+        elif isinstance(default, bool):
+            if not isinstance(value, bool):
+                errors.append(f'{section}.{key} must be true or false')
+        elif isinstance(default, str):
+            if not isinstance(value, str):
+                errors.append(f'{section}.{key} must be a string')
+        elif isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+            errors.append(f'{section}.{key} must be a non-negative number')
+        elif (section, key) in COUNTS and (value < 1 or value != int(value)):
+            errors.append(f'{section}.{key} must be a positive integer')
+    return errors
+
+
+def validate_config(config):
+    """Raise a ConfigError describing every problem of config, before it is used."""
+    if not isinstance(config, dict) or not isinstance(config.get('nodes'), list) or not config['nodes']:
+        raise ConfigError('The configuration must define a list of nodes')
+
+    errors = []
+    names = set()
+    for index, node in enumerate(config['nodes']):
+        if not isinstance(node, dict):
+            errors.append(f'Node {index} must be a mapping')
+            continue
+        where = f"Node {node.get('name', index)}"
+        if not node.get('name'):
+            errors.append(f'Node {index} has no name')
+        elif not isinstance(node['name'], str):
+            errors.append(f'Node {index}: name must be a string')
+        elif node['name'] in names:
+            errors.append(f'{where} is defined more than once')
+        names.add(node.get('name'))
+        errors.extend(_node_errors(node, where))
+
+    for section in DEFAULTS:
+        settings = config.get(section)
+        if settings is None:
+            continue
+        if not isinstance(settings, dict):
+            errors.append(f'Section {section} must be a mapping')
+            continue
+        errors.extend(_setting_errors(section, settings))
+
+    push = config.get('push')
+    if isinstance(push, dict) and push.get('enabled') is True and not push.get('url'):
+        errors.append('push.url is required when push is enabled')
+
+    if errors:
+        raise ConfigError('; '.join(errors))
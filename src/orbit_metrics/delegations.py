@@ -0,0 +1,32 @@
+import heapq
+
+
+class DelegationStats:
+    """Running aggregates of the delegations of a validator, fed one page at a time.
+
+    Only the top_n largest delegations are kept, in a min-heap whose root is the
+    smallest of them, so the memory used does not grow with the number of delegators.
+    """
+
+    def __init__(self, top_n):
+        self.top_n = top_n
+        self.delegators = 0
+        self.tokens = 0.0
+        self._heap = []  # (amount, delegator)
+
+    def add(self, delegator, amount):
+        self.delegators += 1
+        self.tokens += amount
+        if len(self._heap) < self.top_n:
+            heapq.heappush(self._heap, (amount, delegator))
+        elif self._heap and amount > self._heap[0][0]:
+            heapq.heapreplace(self._heap, (amount, delegator))
+
+    def top(self):
+        """Return the (delegator, amount) of the largest delegations, largest first."""
+        return [(delegator, amount) for amount, delegator in sorted(self._heap, reverse=True)]
+
+    def as_dict(self):
+        # Plain lists, so the aggregates can be cached and written to the snapshot
+        return {'delegators': self.delegators, 'tokens': self.tokens,
+                'top': [[delegator, amount] for delegator, amount in self.top()]}
@@ -0,0 +1,106 @@
+import collections
+import threading
+import time
+
+from orbit_metrics.metrics import endpoint_error_rate_gauge, endpoint_latency_gauge
+from orbit_metrics.resilience import CircuitBreaker
+
+
+class EndpointStats:
+    """Health of a single API endpoint."""
+
+    def __init__(self, url, samples, breaker):
+        self.url = url
+        self.breaker = breaker
+        self.latency = None  # EWMA of request latency in seconds, None until measured
+        self.error_rate = 0.0  # EWMA of failed requests
+        self.latencies = collections.deque(maxlen=samples)  # Recent latencies for the hedging quantile
+        self.height = None
+        self.height_at = None
+
+
+class EndpointPool:
+    """Rank the API endpoints of a chain by latency, error rate and block height lag.
+
+    Endpoints lagging more than max_height_lag blocks behind the highest height
+    reported within height_ttl seconds are ranked last, the others by their EWMA
+    latency plus error_penalty seconds per unit of EWMA error rate. Endpoints
+    that were never measured are ranked first so every endpoint gets probed.
+    Endpoints whose circuit breaker is open are not available at all.
+    """
+
+    def __init__(self, urls, ewma_alpha=0.3, error_penalty=10.0, max_height_lag=5, height_ttl=120,
+                 hedge=False, hedge_quantile=0.95, samples=50, breaker_threshold=5, breaker_reset=60,
+                 clock=time.monotonic):
+        self.urls = list(urls)
+        self.ewma_alpha = ewma_alpha
+        self.error_penalty = error_penalty
+        self.max_height_lag = max_height_lag
+        self.height_ttl = height_ttl
+        self.hedge = hedge and len(self.urls) > 1
+        self.hedge_quantile = hedge_quantile
+        self.clock = clock
+        self.stats = {url: EndpointStats(url, samples, CircuitBreaker(url, breaker_threshold, breaker_reset, clock))
+                      for url in self.urls}
+        self._lock = threading.Lock()
+
+    def _ewma(self, current, sample):
+        if current is None:
+            return sample
+        return self.ewma_alpha * sample + (1 - self.ewma_alpha) * current
+
+    def record_success(self, url, latency):
+        with self._lock:
+            stats = self.stats[url]
+            stats.latency = self._ewma(stats.latency, latency)
+            stats.error_rate = self._ewma(stats.error_rate, 0.0)
+            stats.latencies.append(latency)
+        stats.breaker.record_success()
+        endpoint_latency_gauge.labels(endpoint=url).set(stats.latency)
+        endpoint_error_rate_gauge.labels(endpoint=url).set(stats.error_rate)
+
+    def record_failure(self, url):
+        with self._lock:
+            stats = self.stats[url]
+            stats.error_rate = self._ewma(stats.error_rate, 1.0)
+        stats.breaker.record_failure()
+        endpoint_error_rate_gauge.labels(endpoint=url).set(stats.error_rate)
+
+    def record_height(self, url, height):
+        with self._lock:
+            stats = self.stats[url]
+            stats.height = height
+            stats.height_at = self.clock()
+
+    def _is_lagging(self, stats, max_height, now):
+        if stats.height is None or now - stats.height_at >= self.height_ttl:
+            return False
+        return max_height - stats.height > self.max_height_lag
+
+    def ranked(self):
+        """Return the endpoint URLs ordered from best to worst."""
+        now = self.clock()
+        with self._lock:
+            recent_heights = [stats.height for stats in self.stats.values()
+                              if stats.height is not None and now - stats.height_at < self.height_ttl]
+            max_height = max(recent_heights) if recent_heights else None
+
+            def score(url):
+                stats = self.stats[url]
+                lagging = max_height is not None and self._is_lagging(stats, max_height, now)
+                latency = stats.latency if stats.latency is not None else 0.0
+                return lagging, latency + self.error_penalty * stats.error_rate
+
+            return sorted(self.urls, key=score)
+
+    def available(self):
+        """Return the ranked endpoint URLs whose circuit breaker allows a request."""
+        return [url for url in self.ranked() if self.stats[url].breaker.allows_request()]
+
+    def hedge_delay(self, url):
+        """Return how long to wait for url before hedging with the next endpoint, None if unmeasured."""
+        with self._lock:
+            latencies = sorted(self.stats[url].latencies)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(self.hedge_quantile * len(latencies)))]
@@ -1,96 +1,729 @@
+import asyncio
+import atexit
 import logging
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from orbit_metrics.metrics import *
-from orbit_metrics.api_client import APIClient
+from orbit_metrics.api_client import APIClient, clear_clients, drop_client, get_client
+from orbit_metrics.blocktime import HeaderWindow, block_header
+from orbit_metrics.concurrency import BackgroundRunner, HostLimiter
+from orbit_metrics.config import get_settings
+from orbit_metrics.plan import CollectionPlan
+from orbit_metrics.resilience import retry_budget
+from orbit_metrics.scheduler import TTLCache
+from orbit_metrics.series import SeriesRegistry
+from orbit_metrics.snapshot import read_snapshot, write_snapshot
+from orbit_metrics.uptime import UptimeTracker, commit_signers, valcons_address
 
 
 logger = logging.getLogger(__name__)
 
+BOND_STATUS_BONDED = 'BOND_STATUS_BONDED'
 
-def fetch_metrics(config):
-    for node in config['nodes']:
+# Groups holding chain state, which can only change when a new block is committed
+HEIGHT_VERSIONED_GROUPS = ('balances', 'validators', 'pool', 'params', 'signing', 'blocks', 'rewards', 'delegations')
+
+# Groups paginating through listings too long to wait for, collected in the background across cycles
+BACKGROUND_GROUPS = ('delegations',)
+
+# Metrics set from every metric group, the node info only provides labels
+GROUP_METRICS = {
+    'node_info': [],
+    'height': [chain_height_gauge],
+    'balances': [wallet_balance_gauge, wallet_denom_balance_gauge],
+    'validators': [validator_stake_gauge, validator_jailed_gauge, validator_bonded_gauge, active_validators_gauge],
+    'signing': [validator_missed_blocks_gauge, validator_jail_risk_gauge],
+    'blocks': [validator_missed_blocks_ratio_gauge, block_time_gauge, blocks_per_minute_gauge,
+               last_block_timestamp_gauge, time_since_last_block_gauge, chain_stalled_gauge],
+    'params': [community_tax_gauge, base_proposer_reward_gauge, bonus_proposer_reward_gauge,
+               withdraw_addr_enabled_gauge, inflation_rate_change_gauge, inflation_max_gauge, inflation_min_gauge,
+               goal_bonded_gauge, blocks_per_year_gauge, signed_blocks_window_gauge, min_signed_per_window_gauge,
+               downtime_jail_duration_gauge, slash_fraction_double_sign_gauge, slash_fraction_downtime_gauge,
+               unbonding_time_gauge, max_validators_gauge, max_entries_gauge, historical_entries_gauge],
+    'pool': [bonded_tokens_gauge, not_bonded_tokens_gauge],
+    'rewards': [validator_outstanding_rewards_gauge, validator_commission_gauge],
+    'delegations': [validator_delegators_gauge, validator_top_delegation_gauge],
+}
+
+# Last fetched values per (chain, group, item), served to the gauges between refreshes
+cache = TTLCache()
+
+# Exported label sets of the chain metrics, evicted once they are no longer updated
+series = SeriesRegistry()
+
+# Signing windows of the monitored validators per chain
+uptime_trackers = {}
+
+# Heights and times of the latest blocks per chain
+header_windows = {}
+
+# Jobs of the background groups, which outlive the cycle that started them
+background = BackgroundRunner(max_workers=2)
+
+# Plan of the current configuration, compiled on its first cycle
+compiled_plan = None
+
+# Plan collected by the last cycle, to detect configuration changes
+collected_plan = None
+
+# Event loop, shared session and clients of the async engine, created on its first cycle
+async_pool = None
+
+# Unix time the last snapshot was written
+last_snapshot = None
+
+# Pushes the changed samples after every cycle, with push enabled
+pusher = None
+
+# An independent unit of collection: the value returned by api_client.<method>(*args)
+# is cached under (chain, group, item) and exported by apply(node plan, api_client, value, *apply_args)
+Task = namedtuple('Task', ['name', 'group', 'item', 'method', 'args', 'apply', 'apply_args'])
+
+
+def cache_entry(node, group, item):
+    """Return the cache key and version of a metric group item.
+
+    Chain state groups are versioned by the latest known height, so they are not
+    refetched while the chain has not produced a new block.
+    """
+    version = cache.get((node.name, 'height', None)) if group in HEIGHT_VERSIONED_GROUPS else None
+    return (node.name, group, item), version
+
+
+def record_fetch(node, group, value):
+    """Export the outcome of fetching a metric group and return the fetched value."""
+    if value is None:
+        collection_errors_counter.labels(chain=node.name, group=group).inc()
+    else:
+        last_success_gauge.labels(chain=node.name, group=group).set_to_current_time()
+    return value
+
+
+def cached_fetch(node, group, item, intervals, fetch, fetched_at=None):
+    """Return the cached value of a metric group item, refetching it once its interval has passed.
+
+    A collection cycle passes its start as fetched_at, other callers cache the value from now.
+    """
+    key, version = cache_entry(node, group, item)
+    return cache.get_or_fetch(key, intervals[group], lambda: record_fetch(node, group, fetch()), version=version,
+                              fetched_at=fetched_at)
+
+
+async def cached_fetch_async(node, group, item, intervals, fetch, fetched_at=None):
+    """Coroutine version of cached_fetch, awaiting fetch() on a cache miss."""
+    key, version = cache_entry(node, group, item)
+    hit, value = cache.lookup(key, intervals[group], version=version, fetched_at=fetched_at)
+    if not hit:
+        value = record_fetch(node, group, await fetch())
+        if value is not None:
+            cache.set(key, value, intervals[group], version, fetched_at)
+    return value
+
+
+def set_chain_height(node, api_client, latest_height):
+    chain_id = api_client.chain_id  # Fetch the chain ID from APIClient
+    moniker = api_client.moniker  # Fetch the moniker from APIClient
+
+    # Use moniker in the metrics instead of host
+    series.set(chain_height_gauge, latest_height,
+               chain=node.name,
+               chain_id=chain_id,
+               host=moniker)
+    logger.debug(f'Fetched chain height {latest_height} for chain {chain_id} on node {node.name} with moniker {moniker}')
+
+
+def set_wallet_balance(node, api_client, balance, wallet):
+    series.set_values(wallet_balance_gauge, balance, wallet.bound(wallet_balance_gauge, api_client.chain_id))
+    logger.debug(f'Fetched wallet balance {balance} in denom {node.main_denom} for wallet {wallet.address}')
+
+
+def set_wallet_balances(node, api_client, balances, wallet, denoms):
+    """Export the balances of a wallet in every denom, or in the denoms listed in denoms."""
+    set_wallet_balance(node, api_client, balances.get(node.main_denom, 0.0), wallet)
+    if denoms != 'all':
+        balances = {denom: balances.get(denom, 0.0) for denom in denoms}
+    labels = dict(wallet.labels, chain_id=api_client.chain_id)
+    series.set_many(wallet_denom_balance_gauge,
+                    ((dict(labels, denom=denom), amount) for denom, amount in balances.items()))
+    logger.debug(f'Fetched wallet balances in {len(balances)} denoms for wallet {wallet.address}')
+
+
+def set_validator(node, api_client, data, validator):
+    chain_id = api_client.chain_id
+    series.set_values(validator_stake_gauge, float(data['tokens']), validator.bound(validator_stake_gauge, chain_id))
+    series.set_values(validator_jailed_gauge, 1 if data.get('jailed') else 0,
+                      validator.bound(validator_jailed_gauge, chain_id))
+    series.set_values(validator_bonded_gauge, 1 if data.get('status') == BOND_STATUS_BONDED else 0,
+                      validator.bound(validator_bonded_gauge, chain_id))
+    uptime_tracker(node).track(validator.validator_id, data.get('consensus_pubkey'))
+    logger.debug(f'Fetched stake {data["tokens"]} for validator {validator.validator_id}')
+
+
+def set_validator_set(node, api_client, validator_set):
+    """Export the configured validators from a single listing of the validator set."""
+    series.set(active_validators_gauge,
+               sum(1 for validator in validator_set if validator.get('status') == BOND_STATUS_BONDED),
+               chain=node.name,
+               chain_id=api_client.chain_id)
+
+    by_address = {validator['operator_address']: validator for validator in validator_set}
+    for validator in node.validators:
+        data = by_address.get(validator.validator_id)
+        if data is None:
+            logger.warning(f'Validator {validator.validator_id} not found in the validator set of {node.name}')
+            continue
+        set_validator(node, api_client, data, validator)
+
+
+def uptime_tracker(node):
+    return uptime_trackers.setdefault(node.name, UptimeTracker())
+
+
+def set_signing_infos(node, api_client, signing_infos):
+    """Export the missed blocks and jail risk of the monitored validators from their signing infos."""
+    slashing_params = cache.get((node.name, 'params', 'slashing'))
+    if slashing_params is None:
+        logger.debug(f'Slashing params of {node.name} not known yet, signing infos are exported next cycle')
+        return
+    window = int(slashing_params['signed_blocks_window'])
+    max_missed = window * (1 - float(slashing_params['min_signed_per_window']))
+
+    tracker = uptime_tracker(node)
+    tracker.resize(window)
+    by_address = {info['address']: info for info in signing_infos}
+    for validator_id, address in list(tracker.addresses.items()):
+        info = by_address.get(valcons_address(validator_id, address))
+        if info is None:
+            continue
+        missed = int(info.get('missed_blocks_counter', 0))
+        labels = {'chain': node.name, 'chain_id': api_client.chain_id, 'validator': validator_id}
+        series.set(validator_missed_blocks_gauge, missed, **labels)
+        series.set(validator_jail_risk_gauge, min(1.0, missed / max_missed) if max_missed else 0.0, **labels)
+
+
+def set_block_signatures(node, api_client, blocks):
+    """Record the commits of the fetched blocks and of the latest one, and export the missed blocks ratios."""
+    tracker = uptime_tracker(node)
+    for block in blocks + [api_client.latest_block_data]:
         try:
-            api_client = APIClient(node['api_url'])
-
-            # Fetch chain height
-            latest_height = api_client.fetch_chain_height()
-            chain_id = api_client.chain_id  # Fetch the chain ID from APIClient
-            moniker = api_client.moniker  # Fetch the moniker from APIClient
-
-            # Use moniker in the metrics instead of host
-            chain_height_gauge.labels(chain=node['name'],
-                                      chain_id=chain_id,
-                                      host=moniker).set(latest_height)
-            logger.debug(f'Fetched chain height {latest_height} for chain {chain_id} on node {node["name"]} with moniker {moniker}')
-
-            # Fetch wallet balances
-            for wallet in node.get('wallets', []):
-                wallet_type = wallet.get('type', 'unknown')  # Get type or default to 'unknown'
-                balance = api_client.fetch_wallet_balance(wallet['address'], node['main_denom'])
-                wallet_balance_gauge.labels(chain=node['name'],
-                                            chain_id=chain_id,
-                                            wallet=wallet['address'],
-                                            type=wallet_type).set(balance)
-                logger.debug(f'Fetched wallet balance {balance} in denom {node["main_denom"]} for wallet {wallet["address"]}')
-
-            # Fetch validator stakes
-            for validator in node.get('validators', []):
-                stake = api_client.fetch_validator_stake(validator['validator_id'])
-                validator_stake_gauge.labels(chain=node['name'],
-                                             chain_id=chain_id,
-                                             validator=validator['validator_id']).set(stake)
-                logger.debug(f'Fetched stake {stake} for validator {validator["validator_id"]}')
-
-            # Fetch distribution parameters
-            params = api_client.fetch_distribution_params()
-            if params:
-                community_tax_gauge.labels(chain=node['name']).set(float(params['community_tax']))
-                base_proposer_reward_gauge.labels(chain=node['name']).set(float(params['base_proposer_reward']))
-                bonus_proposer_reward_gauge.labels(chain=node['name']).set(float(params['bonus_proposer_reward']))
-                withdraw_addr_enabled_gauge.labels(chain=node['name']).set(1 if params['withdraw_addr_enabled'] else 0)
-
-            # Fetch mint parameters
-            mint_params = api_client.fetch_mint_params()
-            if mint_params:
-                mint_denom = mint_params['mint_denom']  # Keep mint_denom as a string
-                inflation_rate_change_gauge.labels(chain=node['name'],
-                                                   mint_denom=mint_denom).set(float(mint_params['inflation_rate_change']))
-                inflation_max_gauge.labels(chain=node['name'],
-                                           mint_denom=mint_denom).set(float(mint_params['inflation_max']))
-                inflation_min_gauge.labels(chain=node['name'],
-                                           mint_denom=mint_denom).set(float(mint_params['inflation_min']))
-                goal_bonded_gauge.labels(chain=node['name'],
-                                         mint_denom=mint_denom).set(float(mint_params['goal_bonded']))
-                blocks_per_year_gauge.labels(chain=node['name'],
-                                             mint_denom=mint_denom).set(int(mint_params['blocks_per_year']))
-
-            # Fetch slashing parameters
-            slashing_params = api_client.fetch_slashing_params()
-            if slashing_params:
-                signed_blocks_window_gauge.labels(chain=node['name']).set(int(slashing_params['signed_blocks_window']))
-                min_signed_per_window_gauge.labels(chain=node['name']).set(float(slashing_params['min_signed_per_window']))
-                downtime_jail_duration_gauge.labels(chain=node['name']).set(int(slashing_params['downtime_jail_duration'].replace('s', '')))  # Convert from "3600s" to int
-                slash_fraction_double_sign_gauge.labels(chain=node['name']).set(float(slashing_params['slash_fraction_double_sign']))
-                slash_fraction_downtime_gauge.labels(chain=node['name']).set(float(slashing_params['slash_fraction_downtime']))
-
-            # Fetch staking parameters
-            staking_params = api_client.fetch_staking_params()
-            if staking_params:
-                bond_denom = staking_params['bond_denom']  # Keep bond_denom as a string
-                unbonding_time_gauge.labels(chain=node['name'],
-                                            bond_denom=bond_denom).set(int(staking_params['unbonding_time'].replace('s', '')))
-                max_validators_gauge.labels(chain=node['name'],
-                                            bond_denom=bond_denom).set(int(staking_params['max_validators']))
-                max_entries_gauge.labels(chain=node['name'],
-                                         bond_denom=bond_denom).set(int(staking_params['max_entries']))
-                historical_entries_gauge.labels(chain=node['name'],
-                                                bond_denom=bond_denom).set(int(staking_params['historical_entries']))
-
-            # Fetch staking pool data
-            pool_data = api_client.fetch_staking_pool()
-            if pool_data:
-                bonded_tokens_gauge.labels(chain=node['name']).set(int(pool_data['bonded_tokens']))
-                not_bonded_tokens_gauge.labels(chain=node['name']).set(int(pool_data['not_bonded_tokens']))
+            tracker.record_commit(*commit_signers(block))
+        except (KeyError, ValueError, TypeError) as e:
+            logger.error(f'Error parsing block commit data of {node.name}: {e}')
+    for validator_id, ratio in tracker.missed_ratios().items():
+        series.set(validator_missed_blocks_ratio_gauge, ratio,
+                   chain=node.name,
+                   chain_id=api_client.chain_id,
+                   validator=validator_id)
+
+
+def header_window(node, size):
+    window = header_windows.get(node.name)
+    if window is None or window.size != size:
+        window = header_windows[node.name] = HeaderWindow(size)
+    return window
+
+
+def set_block_headers(node, api_client, blocks, block_time_settings):
+    """Record the headers of the fetched blocks and of the latest one, and export the block time and stall state."""
+    window = header_window(node, block_time_settings['window'])
+    try:
+        for block in blocks:
+            window.record(*block_header(block))
+        height, timestamp = block_header(api_client.latest_block_data)
+        # Until the blocks before it are recorded, as they would otherwise be left out of the window for good
+        if window.last_height is None or window.last_height >= height - 1:
+            window.record(height, timestamp)
+    except (KeyError, ValueError, TypeError) as e:
+        logger.error(f'Error parsing block header data of {node.name}: {e}')
+    if window.last_time is None:
+        return
+
+    labels = {'chain': node.name, 'chain_id': api_client.chain_id}
+    since_last_block = max(0.0, time.time() - window.last_time)
+    series.set(last_block_timestamp_gauge, window.last_time, **labels)
+    series.set(time_since_last_block_gauge, since_last_block, **labels)
+    block_time = window.block_time()
+    if block_time is not None:
+        series.set(block_time_gauge, block_time, **labels)
+        series.set(blocks_per_minute_gauge, 60 / block_time, **labels)
+        series.set(chain_stalled_gauge, 1 if since_last_block > block_time_settings['stall_factor'] * block_time else 0,
+                   **labels)
+
+
+def set_blocks(node, api_client, blocks, uptime, block_time_settings):
+    """Export the analytics of the blocks fetched for uptime tracking and block time."""
+    if uptime:
+        set_block_signatures(node, api_client, blocks)
+    if block_time_settings:
+        set_block_headers(node, api_client, blocks, block_time_settings)
+
+
+def set_delegations(node, api_client, delegations, validator):
+    # Delegators leaving the top keep their series until evicted by series_ttl
+    series.set_values(validator_delegators_gauge, delegations['delegators'],
+                      validator.bound(validator_delegators_gauge, api_client.chain_id))
+    labels = dict(validator.labels, chain_id=api_client.chain_id)
+    for rank, (delegator, amount) in enumerate(delegations['top'], start=1):
+        series.set(validator_top_delegation_gauge, amount, rank=str(rank), delegator=delegator, **labels)
+
+
+def set_validator_rewards(node, api_client, rewards, validator):
+    labels = dict(validator.labels, chain_id=api_client.chain_id)
+    for denom, amount in rewards['outstanding_rewards'].items():
+        series.set(validator_outstanding_rewards_gauge, amount, denom=denom, **labels)
+    for denom, amount in rewards['commission'].items():
+        series.set(validator_commission_gauge, amount, denom=denom, **labels)
+
+
+def set_distribution_params(node, api_client, params):
+    series.set(community_tax_gauge, float(params['community_tax']), chain=node.name)
+    series.set(base_proposer_reward_gauge, float(params['base_proposer_reward']), chain=node.name)
+    series.set(bonus_proposer_reward_gauge, float(params['bonus_proposer_reward']), chain=node.name)
+    series.set(withdraw_addr_enabled_gauge, 1 if params['withdraw_addr_enabled'] else 0, chain=node.name)
+
+
+def set_mint_params(node, api_client, mint_params):
+    mint_denom = mint_params['mint_denom']  # Keep mint_denom as a string
+    series.set(inflation_rate_change_gauge, float(mint_params['inflation_rate_change']),
+               chain=node.name, mint_denom=mint_denom)
+    series.set(inflation_max_gauge, float(mint_params['inflation_max']), chain=node.name, mint_denom=mint_denom)
+    series.set(inflation_min_gauge, float(mint_params['inflation_min']), chain=node.name, mint_denom=mint_denom)
+    series.set(goal_bonded_gauge, float(mint_params['goal_bonded']), chain=node.name, mint_denom=mint_denom)
+    series.set(blocks_per_year_gauge, int(mint_params['blocks_per_year']), chain=node.name, mint_denom=mint_denom)
+
+
+def set_slashing_params(node, api_client, slashing_params):
+    series.set(signed_blocks_window_gauge, int(slashing_params['signed_blocks_window']), chain=node.name)
+    series.set(min_signed_per_window_gauge, float(slashing_params['min_signed_per_window']), chain=node.name)
+    series.set(downtime_jail_duration_gauge, int(slashing_params['downtime_jail_duration'].replace('s', '')),
+               chain=node.name)  # Convert from "3600s" to int
+    series.set(slash_fraction_double_sign_gauge, float(slashing_params['slash_fraction_double_sign']),
+               chain=node.name)
+    series.set(slash_fraction_downtime_gauge, float(slashing_params['slash_fraction_downtime']), chain=node.name)
+
+
+def set_staking_params(node, api_client, staking_params):
+    bond_denom = staking_params['bond_denom']  # Keep bond_denom as a string
+    series.set(unbonding_time_gauge, int(staking_params['unbonding_time'].replace('s', '')),
+               chain=node.name, bond_denom=bond_denom)
+    series.set(max_validators_gauge, int(staking_params['max_validators']), chain=node.name, bond_denom=bond_denom)
+    series.set(max_entries_gauge, int(staking_params['max_entries']), chain=node.name, bond_denom=bond_denom)
+    series.set(historical_entries_gauge, int(staking_params['historical_entries']),
+               chain=node.name, bond_denom=bond_denom)
+
+
+def set_staking_pool(node, api_client, pool_data):
+    series.set(bonded_tokens_gauge, int(pool_data['bonded_tokens']), chain=node.name)
+    series.set(not_bonded_tokens_gauge, int(pool_data['not_bonded_tokens']), chain=node.name)
+
+
+def compile_tasks(node, settings):
+    """Return the tasks of a node that do not depend on the state of its chain, compiled once per configuration."""
+    tasks = []
+    for wallet in node.wallets:
+        if node.balance_denoms:  # Every balance of the wallet from a single request
+            tasks.append(Task(f'wallet {wallet.address}', 'balances', (wallet.address, 'denoms'),
+                              'fetch_wallet_balances', (wallet.address,),
+                              set_wallet_balances, (wallet, node.balance_denoms)))
+        else:
+            tasks.append(Task(f'wallet {wallet.address}', 'balances', wallet.address,
+                              'fetch_wallet_balance', (wallet.address, node.main_denom),
+                              set_wallet_balance, (wallet,)))
+    if node.validators and APIClient.prefers_validator_set(len(node.validators)):
+        tasks.append(Task('validator set', 'validators', None, 'fetch_validators', (), set_validator_set, ()))
+    else:
+        for validator in node.validators:
+            tasks.append(Task(f'validator {validator.validator_id}', 'validators', validator.validator_id,
+                              'fetch_validator', (validator.validator_id,), set_validator, (validator,)))
+    if settings['delegations']['enabled']:
+        for validator in node.validators:
+            validator_id = validator.validator_id
+            tasks.append(Task(f'rewards of {validator_id}', 'rewards', validator_id,
+                              'fetch_validator_rewards', (validator_id,), set_validator_rewards, (validator,)))
+            tasks.append(Task(f'delegations of {validator_id}', 'delegations', validator_id,
+                              'fetch_validator_delegations', (validator_id, settings['delegations']['top_n']),
+                              set_delegations, (validator,)))
+    tasks.append(Task('distribution params', 'params', 'distribution', 'fetch_distribution_params', (),
+                      set_distribution_params, ()))
+    tasks.append(Task('mint params', 'params', 'mint', 'fetch_mint_params', (), set_mint_params, ()))
+    tasks.append(Task('slashing params', 'params', 'slashing', 'fetch_slashing_params', (), set_slashing_params, ()))
+    tasks.append(Task('staking params', 'params', 'staking', 'fetch_staking_params', (), set_staking_params, ()))
+    tasks.append(Task('staking pool', 'pool', None, 'fetch_staking_pool', (), set_staking_pool, ()))
+    if node.validators and settings['uptime']['enabled']:
+        tasks.append(Task('signing infos', 'signing', None, 'fetch_signing_infos', (), set_signing_infos, ()))
+    return tuple(tasks)
+
+
+def collection_plan(config):
+    """Return the compiled plan of a configuration, compiling it on first use.
+
+    The configuration must have passed validate_config. Configurations are
+    replaced on reload rather than modified, so the plan of the current one is
+    kept until another configuration is collected.
+    """
+    global compiled_plan
+
+    plan = compiled_plan
+    if plan is None or plan.config is not config:
+        plan = CollectionPlan(config)
+        for node in plan.nodes:
+            node.tasks = compile_tasks(node, plan.settings)
+        compiled_plan = plan
+    return plan
 
+
+def node_tasks(node, plan):
+    """Return the independent tasks of a node, its compiled tasks followed by the blocks its analyses miss."""
+    uptime_settings = plan.settings['uptime']
+    uptime = bool(node.validators and uptime_settings['enabled'])
+    block_time_settings = plan.settings['block_time'] if plan.settings['block_time']['enabled'] else None
+    latest_height = cache.get((node.name, 'height', None))
+    if not (uptime or block_time_settings) or latest_height is None:
+        return node.tasks
+
+    # Blocks missed by either analysis are fetched once and used by both
+    heights = set()
+    if uptime:
+        heights.update(uptime_tracker(node).missing_blocks(latest_height, uptime_settings['max_backfill']))
+    if block_time_settings:
+        heights.update(header_window(node, block_time_settings['window']).missing_blocks(
+            latest_height, block_time_settings['max_backfill']))
+    return node.tasks + (Task('blocks', 'blocks', None, 'fetch_blocks', (sorted(heights),),
+                              set_blocks, (uptime, block_time_settings)),)
+
+
+def run_task(node, api_client, intervals, task, fetched_at=None):
+    fetch = getattr(api_client, task.method)
+    value = cached_fetch(node, task.group, task.item, intervals, lambda: fetch(*task.args), fetched_at)
+    if value is not None:
+        task.apply(node, api_client, value, *task.apply_args)
+    return value
+
+
+async def run_task_async(node, api_client, intervals, task, fetched_at=None):
+    fetch = getattr(api_client, task.method)
+    value = await cached_fetch_async(node, task.group, task.item, intervals, lambda: fetch(*task.args), fetched_at)
+    if value is not None:
+        task.apply(node, api_client, value, *task.apply_args)
+
+
+def apply_cached(node, api_client, intervals, task, fetched_at=None):
+    """Export the cached value of a task without fetching it and return whether it was served from the cache."""
+    key, version = cache_entry(node, task.group, task.item)
+    hit, value = cache.lookup(key, intervals[task.group], version=version, fetched_at=fetched_at)
+    if hit:
+        task.apply(node, api_client, value, *task.apply_args)
+    return hit
+
+
+def refresh_in_background(node, intervals, task, http_settings, endpoint_settings):
+    # The pooled synchronous client of the node, also with the async engine whose event loop only runs during cycles
+    api_client = get_client(node.api_urls, http_settings, endpoint_settings, chain=node.name, grpc_url=node.grpc_url)
+    apply_node_info(api_client, cache.get((node.name, 'node_info', None)))
+    run_task(node, api_client, intervals, task)
+
+
+def run_background_task(node, api_client, intervals, task, http_settings, endpoint_settings, fetched_at=None):
+    """Export the cached value of a background group task, refetching it in the background once expired.
+
+    The cycle does not wait for the refetch, which exports the new value once
+    done and caches it from then. A task still running from an earlier cycle
+    is not started again.
+    """
+    if not apply_cached(node, api_client, intervals, task, fetched_at):
+        background.submit((node.name, task.group, task.item), refresh_in_background, node, intervals, task,
+                          http_settings, endpoint_settings)
+
+
+def node_info(api_client):
+    if api_client.moniker is None:
+        return None
+    return {'moniker': api_client.moniker, 'chain_id': api_client.chain_id}
+
+
+def apply_node_info(api_client, info):
+    # Clients created while the node info is cached, such as after a reload or a restart, get it from the cache
+    if info is not None:
+        api_client.moniker = info['moniker']
+        api_client.chain_id = info['chain_id']
+
+
+def fetch_node_info(api_client):
+    api_client.fetch_node_info()
+    return node_info(api_client)
+
+
+def fetch_latest_height(api_client):
+    api_client.fetch_latest_block_data()
+    return api_client.fetch_chain_height()
+
+
+def connect_node(node, http_settings, endpoint_settings, intervals, fetched_at=None):
+    """Return the pooled API client of a node and export its chain height."""
+    api_client = get_client(node.api_urls, http_settings, endpoint_settings, chain=node.name, grpc_url=node.grpc_url)
+    apply_node_info(api_client, cached_fetch(node, 'node_info', None, intervals, lambda: fetch_node_info(api_client),
+                                             fetched_at))
+    latest_height = cached_fetch(node, 'height', None, intervals, lambda: fetch_latest_height(api_client), fetched_at)
+    if latest_height is not None:
+        set_chain_height(node, api_client, latest_height)
+    return api_client
+
+
+async def fetch_node_info_async(api_client):
+    await api_client.fetch_node_info()
+    return node_info(api_client)
+
+
+async def fetch_latest_height_async(api_client):
+    await api_client.fetch_latest_block_data()
+    return await api_client.fetch_chain_height()
+
+
+async def connect_node_async(node, pool, intervals, fetched_at=None):
+    """Coroutine version of connect_node, using the async client of the node."""
+    api_client = pool.get_client(node.api_urls, chain=node.name, grpc_url=node.grpc_url)
+    apply_node_info(api_client, await cached_fetch_async(node, 'node_info', None, intervals,
+                                                        lambda: fetch_node_info_async(api_client), fetched_at))
+    latest_height = await cached_fetch_async(node, 'height', None, intervals,
+                                             lambda: fetch_latest_height_async(api_client), fetched_at)
+    if latest_height is not None:
+        set_chain_height(node, api_client, latest_height)
+    return api_client
+
+
+async def collect_node_async(node, pool, plan, fetched_at):
+    intervals = plan.intervals
+    try:
+        api_client = await connect_node_async(node, pool, intervals, fetched_at)
+    except Exception as e:
+        logger.error(f"Failed to fetch metrics for {node.name}: {e}")
+        return
+
+    tasks = []
+    for task in node_tasks(node, plan):
+        try:
+            if task.group in BACKGROUND_GROUPS:
+                run_background_task(node, api_client, intervals, task, pool.http_settings, pool.endpoint_settings,
+                                    fetched_at)
+            elif not apply_cached(node, api_client, intervals, task, fetched_at):  # Only cache misses become coroutines
+                tasks.append(task)
         except Exception as e:
-            logger.error(f"Failed to fetch metrics for {node['name']}: {e}")
+            logger.error(f"Failed to fetch {task.name} metrics for {node.name}: {e}")
+    results = await asyncio.gather(*(run_task_async(node, api_client, intervals, task, fetched_at) for task in tasks),
+                                   return_exceptions=True)
+    for task, result in zip(tasks, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to fetch {task.name} metrics for {node.name}: {result}")
+
+
+async def fetch_metrics_async(plan, pool, fetched_at=None):
+    """Collect the metrics of all nodes as coroutines on the event loop of pool."""
+    await asyncio.gather(*(collect_node_async(node, pool, plan, fetched_at) for node in plan.nodes))
+
+
+def evict_series(plan, cycle_started):
+    """Remove the series that are no longer updated.
+
+    After the nodes configuration changed, every series that was not set during
+    the cycle (removed wallets, validators and chains) is removed right away,
+    otherwise the series that were not set for series_ttl seconds. The nodes are
+    only compared when a new plan is collected.
+    """
+    global collected_plan
+
+    if collected_plan is not None and collected_plan is not plan and \
+            [node.node for node in plan.nodes] != [node.node for node in collected_plan.nodes]:
+        removed = series.sweep(cycle_started)
+        logger.info(f'Nodes configuration changed, removed {removed} series')
+    else:
+        series.evict(plan.settings['exporter']['series_ttl'])
+    collected_plan = plan
+
+
+def apply_config_change(old_config, new_config):
+    """Drop the state of the chains that a new configuration removed or moved to other endpoints.
+
+    Pooled clients, cached values and endpoint health of the other chains are
+    kept. Wallets and validators removed from a kept chain lose their series
+    after the next cycle, see evict_series. When the http, endpoints or
+    concurrency settings change, every client is recreated with the new ones.
+    """
+    global async_pool
+
+    old_plan, new_plan = collection_plan(old_config), collection_plan(new_config)
+    sections = ('http', 'endpoints', 'concurrency')
+    if any(old_plan.settings[section] != new_plan.settings[section] for section in sections) or \
+            old_plan.settings['exporter']['engine'] != new_plan.settings['exporter']['engine']:
+        logger.info('Client settings changed, recreating the API clients of every chain')
+        clear_clients()
+        if async_pool is not None:
+            async_pool.close()
+            async_pool = None
+
+    for node in old_plan.nodes:
+        new_node = new_plan.by_name.get(node.name)
+        if new_node is not None and new_node.api_urls == node.api_urls and new_node.grpc_url == node.grpc_url:
+            continue
+        logger.info(f"Chain {node.name} was {'removed' if new_node is None else 'moved to other endpoints'}")
+        drop_client(node.api_urls)
+        if async_pool is not None:
+            async_pool.drop_client(node.api_urls)
+        cache.remove_if(lambda key: key[0] == node.name)
+        uptime_trackers.pop(node.name, None)
+        header_windows.pop(node.name, None)
+        if new_node is None:
+            series.remove(chain=node.name)
+
+
+def save_snapshot(plan):
+    """Write a snapshot of the cache and of the exported series, at most every snapshot.interval seconds."""
+    global last_snapshot
+
+    settings = plan.settings['snapshot']
+    now = time.time()
+    if not settings['path'] or (last_snapshot is not None and now - last_snapshot < settings['interval']):
+        return
+    last_snapshot = now
+    try:
+        write_snapshot(settings['path'], cache, series, now)
+    except OSError as e:
+        logger.error(f"Failed to write the snapshot {settings['path']}: {e}")
+
+
+def restore_snapshot(config):
+    """Restore the cache and the exported series from the snapshot, before the first cycle."""
+    settings = get_settings(config, 'snapshot')
+    if not settings['path']:
+        return
+    written_at = read_snapshot(settings['path'], config, cache, series)
+    if written_at is not None:
+        snapshot_restored_gauge.set(written_at)
+
+
+def push_samples(plan):
+    """Queue the samples that changed during the cycle for the push receiver, recreating the pusher on changes."""
+    global pusher
+
+    settings = plan.settings['push']
+    if pusher is not None and pusher.settings != settings:
+        pusher.close()
+        pusher = None
+    if not settings['enabled']:
+        return
+    if pusher is None:
+        from orbit_metrics.push import Pusher  # Only imported with push enabled
+        pusher = Pusher(settings)
+        atexit.register(pusher.close)  # Spills the queued batches on shutdown
+    pusher.push()
+
+
+def fetch_metrics_threads(plan, fetched_at=None):
+    """Collect the metrics of all nodes as tasks on a worker pool.
+
+    Tasks served from the cache are exported right away, only the ones to
+    fetch are submitted to the pool, at most max_per_host of them per host at
+    a time.
+    """
+    intervals = plan.intervals
+    http_settings, endpoint_settings = plan.settings['http'], plan.settings['endpoints']
+
+    with ThreadPoolExecutor(max_workers=plan.settings['concurrency']['max_workers']) as executor:
+        limiter = HostLimiter(executor, plan.settings['concurrency']['max_per_host'])
+        node_futures = {limiter.submit(node.host, connect_node, node, http_settings, endpoint_settings, intervals,
+                                       fetched_at): node
+                        for node in plan.nodes}
+
+        task_futures = {}
+        for future in as_completed(node_futures):
+            node = node_futures[future]
+            try:
+                api_client = future.result()
+            except Exception as e:
+                logger.error(f"Failed to fetch metrics for {node.name}: {e}")
+                continue
+
+            for task in node_tasks(node, plan):
+                try:
+                    if task.group in BACKGROUND_GROUPS:
+                        run_background_task(node, api_client, intervals, task, http_settings, endpoint_settings,
+                                            fetched_at)
+                        continue
+                    if apply_cached(node, api_client, intervals, task, fetched_at):
+                        continue
+                except Exception as e:
+                    logger.error(f"Failed to fetch {task.name} metrics for {node.name}: {e}")
+                    continue
+                task_future = limiter.submit(node.host, run_task, node, api_client, intervals, task, fetched_at)
+                task_futures[task_future] = (node, task.name)
+
+        for future in as_completed(task_futures):
+            node, name = task_futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                logger.error(f"Failed to fetch {name} metrics for {node.name}: {e}")
+
+
+def probe_node(plan, node, groups, intervals):
+    """Collect the given metric groups of a single node and return whether every fetch succeeded.
+
+    The node is always connected, as its node info and height provide the
+    labels of the other groups. The tasks run concurrently, up to max_per_host
+    at a time, with the threads engine whatever the configured one.
+    """
+    api_client = connect_node(node, plan.settings['http'], plan.settings['endpoints'], intervals)
+    succeeded = cache.get((node.name, 'height', None)) is not None
+    tasks = [task for task in node_tasks(node, plan) if task.group in groups]
+    if not tasks:
+        return succeeded
+
+    with ThreadPoolExecutor(max_workers=min(len(tasks), plan.settings['concurrency']['max_per_host'])) as executor:
+        futures = {executor.submit(run_task, node, api_client, intervals, task): task for task in tasks}
+        for future in as_completed(futures):
+            try:
+                succeeded = future.result() is not None and succeeded
+            except Exception as e:
+                logger.error(f"Failed to fetch {futures[future].name} metrics for {node.name}: {e}")
+                succeeded = False
+    return succeeded
+
+
+def fetch_metrics(config):
+    """Collect the metrics of all nodes concurrently, export the duration of the cycle and evict stale series.
+
+    Every node is connected first (node info and chain height, which provide the
+    labels), then its wallets, validators, params and pool are fetched as
+    independent tasks on the same worker pool, so a cycle takes as long as the
+    slowest endpoint rather than the sum of all of them. Groups whose refresh
+    interval has not passed yet are served from the cache without a request.
+    The background groups, which page through long listings, are refetched on
+    a pool of their own that the cycle does not wait for.
+
+    With the async engine the same tasks run as coroutines on a single event loop.
+    Both run off the plan compiled from config on its first cycle.
+    """
+    global async_pool
+
+    plan = collection_plan(config)
+    http_settings = plan.settings['http']
+    retry_budget.reset(http_settings['retry_budget'])
+    fetched_at = cache.clock()  # The entries fetched by the cycle expire relative to its start
+    cycle_started = series.clock()
+    started = time.monotonic()
+    try:
+        if plan.settings['exporter']['engine'] == 'async':
+            if async_pool is None:
+                # Imported on first use, aiohttp alone takes longer to import than the rest of the exporter
+                from orbit_metrics.async_client import AsyncClientPool
+                async_pool = AsyncClientPool(plan.settings['concurrency'], http_settings, plan.settings['endpoints'])
+            async_pool.run(fetch_metrics_async(plan, async_pool, fetched_at))
+        else:
+            fetch_metrics_threads(plan, fetched_at)
+    finally:
+        cycle_duration_gauge.set(time.monotonic() - started)
+    evict_series(plan, cycle_started)
+    snapshot_restored_gauge.set(0)
+    save_snapshot(plan)
+    push_samples(plan)
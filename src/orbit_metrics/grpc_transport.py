@@ -0,0 +1,234 @@
+import base64
+import logging
+import re
+import threading
+from urllib.parse import urlparse
+
+try:
+    import grpc
+except ImportError:  # Optional dependency, only needed by nodes with a grpc_url
+    grpc = None
+
+import requests
+
+from orbit_metrics.endpoints import EndpointPool
+from orbit_metrics.protobuf import decode_message, encode_message, enum
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses of the gRPC status codes, as mapped by the REST gateway of the node
+HTTP_STATUSES = {
+    'CANCELLED': 499, 'UNKNOWN': 500, 'INVALID_ARGUMENT': 400, 'DEADLINE_EXCEEDED': 504, 'NOT_FOUND': 404,
+    'ALREADY_EXISTS': 409, 'PERMISSION_DENIED': 403, 'RESOURCE_EXHAUSTED': 429, 'FAILED_PRECONDITION': 400,
+    'ABORTED': 409, 'OUT_OF_RANGE': 400, 'UNIMPLEMENTED': 501, 'INTERNAL': 500, 'UNAVAILABLE': 503,
+    'DATA_LOSS': 500, 'UNAUTHENTICATED': 401,
+}
+
+# Channel options: keep the HTTP/2 connection alive between cycles, allow large validator set pages and leave
+# the retries to APIClient.request, which spends the retry budget of the cycle
+CHANNEL_OPTIONS = [
+    ('grpc.keepalive_time_ms', 30000),
+    ('grpc.keepalive_timeout_ms', 10000),
+    ('grpc.max_receive_message_length', 64 * 1024 * 1024),
+    ('grpc.enable_retries', 0),
+]
+
+COIN = {1: ('denom', 'string'), 2: ('amount', 'string')}
+PAGE_RESPONSE = {1: ('next_key', 'bytes'), 2: ('total', 'integer')}
+BLOCK_ID = {1: ('hash', 'bytes'), 2: ('part_set_header', {1: ('total', 'number'), 2: ('hash', 'bytes')})}
+HEADER = {
+    1: ('version', {1: ('block', 'integer'), 2: ('app', 'integer')}),
+    2: ('chain_id', 'string'),
+    3: ('height', 'integer'),
+    4: ('time', 'timestamp'),
+    5: ('last_block_id', BLOCK_ID),
+    6: ('last_commit_hash', 'bytes'),
+    7: ('data_hash', 'bytes'),
+    8: ('validators_hash', 'bytes'),
+    9: ('next_validators_hash', 'bytes'),
+    10: ('consensus_hash', 'bytes'),
+    11: ('app_hash', 'bytes'),
+    12: ('last_results_hash', 'bytes'),
+    13: ('evidence_hash', 'bytes'),
+    14: ('proposer_address', 'bytes'),
+}
+COMMIT_SIG = {
+    1: ('block_id_flag', enum({0: 'BLOCK_ID_FLAG_UNKNOWN', 1: 'BLOCK_ID_FLAG_ABSENT', 2: 'BLOCK_ID_FLAG_COMMIT',
+                               3: 'BLOCK_ID_FLAG_NIL'})),
+    2: ('validator_address', 'bytes'),
+    3: ('timestamp', 'timestamp'),
+    4: ('signature', 'bytes'),
+}
+BLOCK = {
+    1: ('header', HEADER),
+    2: ('data', {1: ('txs', 'bytes', 'repeated')}),
+    4: ('last_commit', {1: ('height', 'integer'), 2: ('round', 'number'), 3: ('block_id', BLOCK_ID),
+                        4: ('signatures', COMMIT_SIG, 'repeated')}),
+}
+VALIDATOR = {
+    1: ('operator_address', 'string'),
+    2: ('consensus_pubkey', 'public_key'),
+    3: ('jailed', 'bool'),
+    4: ('status', enum({0: 'BOND_STATUS_UNSPECIFIED', 1: 'BOND_STATUS_UNBONDED', 2: 'BOND_STATUS_UNBONDING',
+                        3: 'BOND_STATUS_BONDED'})),
+    5: ('tokens', 'string'),
+    6: ('delegator_shares', 'dec'),
+    7: ('description', {1: ('moniker', 'string'), 2: ('identity', 'string'), 3: ('website', 'string'),
+                        4: ('security_contact', 'string'), 5: ('details', 'string')}),
+    8: ('unbonding_height', 'integer'),
+    9: ('unbonding_time', 'timestamp'),
+    10: ('commission', {1: ('commission_rates', {1: ('rate', 'dec'), 2: ('max_rate', 'dec'),
+                                                 3: ('max_change_rate', 'dec')}),
+                        2: ('update_time', 'timestamp')}),
+    11: ('min_self_delegation', 'string'),
+}
+DISTRIBUTION_PARAMS = {
+    1: ('community_tax', 'dec'),
+    2: ('base_proposer_reward', 'dec'),
+    3: ('bonus_proposer_reward', 'dec'),
+    4: ('withdraw_addr_enabled', 'bool'),
+}
+MINT_PARAMS = {
+    1: ('mint_denom', 'string'),
+    2: ('inflation_rate_change', 'dec'),
+    3: ('inflation_max', 'dec'),
+    4: ('inflation_min', 'dec'),
+    5: ('goal_bonded', 'dec'),
+    6: ('blocks_per_year', 'integer'),
+}
+SLASHING_PARAMS = {
+    1: ('signed_blocks_window', 'integer'),
+    2: ('min_signed_per_window', 'dec'),
+    3: ('downtime_jail_duration', 'duration'),
+    4: ('slash_fraction_double_sign', 'dec'),
+    5: ('slash_fraction_downtime', 'dec'),
+}
+STAKING_PARAMS = {
+    1: ('unbonding_time', 'duration'),
+    2: ('max_validators', 'number'),
+    3: ('max_entries', 'number'),
+    4: ('historical_entries', 'number'),
+    5: ('bond_denom', 'string'),
+    6: ('min_commission_rate', 'dec'),
+}
+
+
+def page_request(params):
+    """Return the PageRequest fields of the pagination query parameters of a REST request."""
+    key = params.get('pagination.key')
+    return [(1, base64.b64decode(key) if key else None), (3, params.get('pagination.limit'))]
+
+
+class Route:
+    """A REST path served by a gRPC method, with its request and the schema of its response."""
+
+    def __init__(self, pattern, method, request, schema):
+        self.pattern = re.compile(pattern)
+        self.method = method
+        self.request = request  # (path match, query parameters) -> request fields
+        self.schema = schema
+
+
+ROUTES = [
+    Route(r'^/cosmos/base/tendermint/v1beta1/blocks/latest$', '/cosmos.base.tendermint.v1beta1.Service/GetLatestBlock',
+          lambda match, params: [], {1: ('block_id', BLOCK_ID), 2: ('block', BLOCK)}),
+    Route(r'^/cosmos/bank/v1beta1/balances/([^/]+)$', '/cosmos.bank.v1beta1.Query/AllBalances',
+          lambda match, params: [(1, match.group(1)), (2, page_request(params))],
+          {1: ('balances', COIN, 'repeated'), 2: ('pagination', PAGE_RESPONSE)}),
+    Route(r'^/cosmos/bank/v1beta1/balances/([^/]+)/by_denom$', '/cosmos.bank.v1beta1.Query/Balance',
+          lambda match, params: [(1, match.group(1)), (2, params.get('denom'))], {1: ('balance', COIN)}),
+    Route(r'^/cosmos/staking/v1beta1/validators$', '/cosmos.staking.v1beta1.Query/Validators',
+          lambda match, params: [(2, page_request(params))],
+          {1: ('validators', VALIDATOR, 'repeated'), 2: ('pagination', PAGE_RESPONSE)}),
+    Route(r'^/cosmos/staking/v1beta1/validators/([^/]+)$', '/cosmos.staking.v1beta1.Query/Validator',
+          lambda match, params: [(1, match.group(1))], {1: ('validator', VALIDATOR)}),
+    Route(r'^/cosmos/distribution/v1beta1/params$', '/cosmos.distribution.v1beta1.Query/Params',
+          lambda match, params: [], {1: ('params', DISTRIBUTION_PARAMS)}),
+    Route(r'^/cosmos/mint/v1beta1/params$', '/cosmos.mint.v1beta1.Query/Params',
+          lambda match, params: [], {1: ('params', MINT_PARAMS)}),
+    Route(r'^/cosmos/slashing/v1beta1/params$', '/cosmos.slashing.v1beta1.Query/Params',
+          lambda match, params: [], {1: ('params', SLASHING_PARAMS)}),
+    Route(r'^/cosmos/staking/v1beta1/params$', '/cosmos.staking.v1beta1.Query/Params',
+          lambda match, params: [], {1: ('params', STAKING_PARAMS)}),
+    Route(r'^/cosmos/staking/v1beta1/pool$', '/cosmos.staking.v1beta1.Query/Pool',
+          lambda match, params: [], {1: ('pool', {1: ('not_bonded_tokens', 'string'), 2: ('bonded_tokens', 'string')})}),
+]
+
+
+def grpc_error(error, url):
+    """Return the requests exception matching a failed gRPC call, so the callers handle both transports alike.
+
+    Statuses the REST gateway would answer with a 4xx status become an HTTPError
+    with that status, which is not retried nor counted against the endpoint.
+    """
+    code = error.code()
+    name = code.name if code is not None else 'UNKNOWN'
+    message = f'{name} from {url}: {error.details()}'
+    status = HTTP_STATUSES.get(name, 500)
+    if status >= 500 and name != 'UNIMPLEMENTED':
+        return requests.exceptions.ConnectionError(message)
+    response = requests.Response()
+    response.status_code = status
+    response.url = url
+    return requests.exceptions.HTTPError(message, response=response)
+
+
+class GrpcTransport:
+    """Serve the queries of APIClient that have a gRPC method from the gRPC endpoint of the node.
+
+    A single channel is kept open per node: its HTTP/2 connection is reused by
+    every cycle and the concurrent calls of the tasks are multiplexed over it.
+    Responses are decoded to the same dicts as the REST API returns, so the
+    fetch methods of APIClient work unchanged. Other queries, which return
+    None from route(), keep using the REST endpoints.
+
+    grpc_url is host:port, or https://host:port for a TLS endpoint. Its health
+    and circuit breaker are kept in endpoints, a pool of its own, apart from
+    the REST endpoints of the node.
+    """
+
+    def __init__(self, grpc_url, timeout=10, endpoints=None):
+        if grpc is None:
+            raise RuntimeError("gRPC endpoints require grpcio, install it with 'pip install orbit_metrics[grpc]'")
+        self.url = grpc_url
+        self.timeout = timeout
+        self.endpoints = endpoints or EndpointPool([grpc_url])
+        parsed = urlparse(grpc_url if '://' in grpc_url else f'grpc://{grpc_url}')
+        if parsed.scheme == 'https':
+            self.channel = grpc.secure_channel(parsed.netloc, grpc.ssl_channel_credentials(), options=CHANNEL_OPTIONS)
+        else:
+            self.channel = grpc.insecure_channel(parsed.netloc, options=CHANNEL_OPTIONS)
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def route(self, path):
+        """Return the (route, path match) serving path, or None when it has no gRPC method."""
+        for route in ROUTES:
+            match = route.pattern.match(path)
+            if match:
+                return route, match
+        return None
+
+    def _call(self, method):
+        with self._lock:
+            call = self._calls.get(method)
+            if call is None:
+                call = self._calls[method] = self.channel.unary_unary(method)  # Raw bytes in and out
+        return call
+
+    def get_json(self, path, params, timer):
+        """Call the gRPC method of path and return its response as the REST API would."""
+        route, match = self.route(path)
+        request = encode_message(route.request(match, params or {}))
+        try:
+            response = self._call(route.method)(request, timeout=self.timeout)
+        except grpc.RpcError as e:
+            error = grpc_error(e, f'{self.url}{route.method}')
+            if error.response is not None:
+                timer.record_response(error.response.status_code)
+            raise error
+        timer.record_response(200, len(response))
+        return decode_message(response, route.schema)
+
+    def close(self):
+        self.channel.close()
@@ -0,0 +1,39 @@
+import re
+import time
+
+from orbit_metrics.metrics import http_request_duration_histogram, http_request_errors_counter, \
+    http_response_bytes_counter
+
+# Path segments identifying an account, validator or block rather than an endpoint
+VARIABLE_SEGMENT = re.compile(r'^(\d+|[a-z]+1[02-9ac-hj-np-z]{38,})$')
+
+
+def endpoint_kind(path):
+    """Return path with its addresses and heights replaced by {}, keeping the label cardinality bounded."""
+    return '/'.join('{}' if VARIABLE_SEGMENT.match(segment) else segment for segment in path.split('/'))
+
+
+class RequestTimer:
+    """Context manager observing the duration, status, size and errors of one upstream request."""
+
+    def __init__(self, chain, path):
+        self.chain = chain
+        self.kind = endpoint_kind(path)
+        self.status = 'error'
+        self.started = None
+
+    def record_response(self, status, size=0):
+        self.status = str(status)
+        if size:
+            http_response_bytes_counter.labels(chain=self.chain, kind=self.kind).inc(size)
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        http_request_duration_histogram.labels(chain=self.chain, kind=self.kind,
+                                               status=self.status).observe(time.monotonic() - self.started)
+        if exc_type is not None:
+            http_request_errors_counter.labels(chain=self.chain, kind=self.kind, error=exc_type.__name__).inc()
+        return False
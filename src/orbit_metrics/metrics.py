@@ -1,4 +1,5 @@
-from prometheus_client import Gauge
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_client.metrics import MetricWrapperBase
 
 # /cosmos/base/tendermint/v1beta1/blocks/latest
 chain_height_gauge = Gauge('orbit_metrics_chain_height',
@@ -10,11 +11,60 @@ wallet_balance_gauge = Gauge('orbit_metrics_wallet_balance',
                              'Balance of the wallet in the blockchain',
                              ['chain', 'chain_id', 'wallet', 'type'])
 
+# /cosmos/bank/v1beta1/balances/{wallet_address}, with balance_denoms configured
+wallet_denom_balance_gauge = Gauge('orbit_metrics_wallet_denom_balance',
+                                   'Balance of the wallet in a denom',
+                                   ['chain', 'chain_id', 'wallet', 'type', 'denom'])
+
 # /cosmos/staking/v1beta1/validators/{validator_address}
 validator_stake_gauge = Gauge('orbit_metrics_validator_stake',
                               'Amount of stake on a validator',
                               ['chain', 'chain_id', 'validator'])
 
+validator_jailed_gauge = Gauge('orbit_metrics_validator_jailed',
+                               'Is the validator jailed (1 for true, 0 for false)',
+                               ['chain', 'chain_id', 'validator'])
+
+validator_bonded_gauge = Gauge('orbit_metrics_validator_bonded',
+                               'Is the validator in the active set (1 for true, 0 for false)',
+                               ['chain', 'chain_id', 'validator'])
+
+# /cosmos/staking/v1beta1/validators (only listed with enough configured validators)
+active_validators_gauge = Gauge('orbit_metrics_active_validators',
+                                'Number of bonded validators in the active set',
+                                ['chain', 'chain_id'])
+
+# /cosmos/slashing/v1beta1/signing_infos and the commits of /cosmos/base/tendermint/v1beta1/blocks/{height}
+validator_missed_blocks_gauge = Gauge('orbit_metrics_validator_missed_blocks',
+                                      'Blocks missed by the validator in the signed blocks window, from its signing info',
+                                      ['chain', 'chain_id', 'validator'])
+
+validator_jail_risk_gauge = Gauge('orbit_metrics_validator_jail_risk',
+                                  'Missed blocks relative to the number after which the validator is jailed (1 = jailed on the next miss)',
+                                  ['chain', 'chain_id', 'validator'])
+
+validator_missed_blocks_ratio_gauge = Gauge('orbit_metrics_validator_missed_blocks_ratio',
+                                            'Ratio of missed blocks among the commits observed in the signed blocks window',
+                                            ['chain', 'chain_id', 'validator'])
+
+# /cosmos/staking/v1beta1/validators/{validator_address}/delegations (every page)
+validator_delegators_gauge = Gauge('orbit_metrics_validator_delegators',
+                                   'Number of delegations to the validator',
+                                   ['chain', 'chain_id', 'validator'])
+
+validator_top_delegation_gauge = Gauge('orbit_metrics_validator_top_delegation',
+                                       'Amount of one of the largest delegations to the validator, by rank',
+                                       ['chain', 'chain_id', 'validator', 'rank', 'delegator'])
+
+# /cosmos/distribution/v1beta1/validators/{validator_address}/outstanding_rewards and /commission
+validator_outstanding_rewards_gauge = Gauge('orbit_metrics_validator_outstanding_rewards',
+                                            'Rewards of the validator and its delegators not withdrawn yet',
+                                            ['chain', 'chain_id', 'validator', 'denom'])
+
+validator_commission_gauge = Gauge('orbit_metrics_validator_commission',
+                                   'Commission of the validator not withdrawn yet',
+                                   ['chain', 'chain_id', 'validator', 'denom'])
+
 
 """
 /cosmos/distribution/v1beta1/params
@@ -153,4 +203,160 @@ not_bonded_tokens_gauge = Gauge(
     'orbit_metrics_not_bonded_tokens',
     'Total not bonded tokens in the staking pool',
     ['chain']
-)
\ No newline at end of file
+)
+
+
+"""
+/cosmos/base/tendermint/v1beta1/blocks/{height}
+"""
+block_time_gauge = Gauge(
+    'orbit_metrics_block_time_seconds',
+    'Average seconds between two blocks over the header window',
+    ['chain', 'chain_id']
+)
+
+blocks_per_minute_gauge = Gauge(
+    'orbit_metrics_blocks_per_minute',
+    'Blocks produced per minute over the header window',
+    ['chain', 'chain_id']
+)
+
+last_block_timestamp_gauge = Gauge(
+    'orbit_metrics_last_block_timestamp_seconds',
+    'Unix time of the latest block header',
+    ['chain', 'chain_id']
+)
+
+time_since_last_block_gauge = Gauge(
+    'orbit_metrics_time_since_last_block_seconds',
+    'Seconds between the latest block header and the last collection',
+    ['chain', 'chain_id']
+)
+
+chain_stalled_gauge = Gauge(
+    'orbit_metrics_chain_stalled',
+    'Whether no block was produced for stall_factor average block times (1 or 0)',
+    ['chain', 'chain_id']
+)
+
+
+"""
+Exporter HTTP connection pool
+"""
+http_requests_counter = Counter(
+    'orbit_metrics_http_requests',
+    'Requests sent to the upstream API',
+    ['host']
+)
+
+http_connections_opened_counter = Counter(
+    'orbit_metrics_http_connections_opened',
+    'Connections opened to the upstream API, the remaining requests reused a pooled connection',
+    ['host']
+)
+
+
+"""
+Exporter API endpoint selection
+"""
+endpoint_latency_gauge = Gauge(
+    'orbit_metrics_endpoint_latency_seconds',
+    'Moving average of the request latency of an API endpoint',
+    ['endpoint']
+)
+
+endpoint_error_rate_gauge = Gauge(
+    'orbit_metrics_endpoint_error_rate',
+    'Moving average of the failed request ratio of an API endpoint',
+    ['endpoint']
+)
+
+
+circuit_breaker_state_gauge = Gauge(
+    'orbit_metrics_circuit_breaker_state',
+    'Circuit breaker state of an API endpoint (0 closed, 1 open, 2 half-open)',
+    ['endpoint']
+)
+
+http_retries_counter = Counter(
+    'orbit_metrics_http_retries',
+    'Requests retried after every endpoint of a node failed',
+    ['host']
+)
+
+
+# Self-instrumentation of the exporter
+http_request_duration_histogram = Histogram(
+    'orbit_metrics_http_request_duration_seconds',
+    'Duration of upstream API requests by endpoint kind and HTTP status (error when no response was received)',
+    ['chain', 'kind', 'status'],
+    buckets=(0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+http_response_bytes_counter = Counter(
+    'orbit_metrics_http_response_bytes',
+    'Bytes received in upstream API response bodies',
+    ['chain', 'kind']
+)
+
+http_request_errors_counter = Counter(
+    'orbit_metrics_http_request_errors',
+    'Failed upstream API requests by error type',
+    ['chain', 'kind', 'error']
+)
+
+collection_errors_counter = Counter(
+    'orbit_metrics_collection_errors',
+    'Failed fetches of a metric group',
+    ['chain', 'group']
+)
+
+last_success_gauge = Gauge(
+    'orbit_metrics_last_success_timestamp_seconds',
+    'Unix time of the last successful fetch of a metric group',
+    ['chain', 'group']
+)
+
+cycle_duration_gauge = Gauge(
+    'orbit_metrics_cycle_duration_seconds',
+    'Duration of the last collection cycle'
+)
+
+snapshot_restored_gauge = Gauge(
+    'orbit_metrics_snapshot_restored_timestamp_seconds',
+    'Unix time the snapshot served since the restart was written, 0 once a collection cycle completed'
+)
+
+
+push_batches_counter = Counter(
+    'orbit_metrics_push_batches',
+    'Push batches by result (sent, failed attempt or dropped)',
+    ['result']
+)
+
+push_samples_counter = Counter(
+    'orbit_metrics_push_samples',
+    'Samples queued to be pushed, unchanged samples are only pushed every full_interval'
+)
+
+push_queue_gauge = Gauge(
+    'orbit_metrics_push_queue_batches',
+    'Push batches waiting in memory to be sent'
+)
+
+push_spilled_bytes_gauge = Gauge(
+    'orbit_metrics_push_spilled_bytes',
+    'Size of the push batches spilled to disk while the receiver is unavailable'
+)
+
+
+config_reloads_counter = Counter(
+    'orbit_metrics_config_reloads',
+    'Configuration reloads by result (success or failure)',
+    ['result']
+)
+
+
+def exported_metrics():
+    """Return every metric defined in this module."""
+    return [metric for metric in globals().values() if isinstance(metric, MetricWrapperBase)]
@@ -0,0 +1,43 @@
+import json
+import logging
+
+try:
+    import orjson
+except ImportError:  # Optional dependency, parsing falls back to the standard library
+    orjson = None
+
+# Characters of a response payload written to the debug log
+DEBUG_PAYLOAD_LIMIT = 1000
+
+
+def loads(body):
+    """Parse a JSON response body (bytes or str), with orjson when it is installed.
+
+    orjson parses large LCD responses several times faster than the standard
+    library and decodes the UTF-8 body itself instead of building a str first.
+    Both backends raise a ValueError on invalid JSON.
+    """
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+
+def dumps(data):
+    """Serialize data to compact JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':')).encode()
+
+
+def log_payload(logger, description, data, limit=DEBUG_PAYLOAD_LIMIT):
+    """Log a response payload at debug level, truncated to limit characters.
+
+    The payload is only formatted when debug logging is enabled, since a
+    validator set or a balance list with many IBC denoms can be megabytes.
+    """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    text = str(data)
+    if len(text) > limit:
+        text = f'{text[:limit]}... ({len(text)} characters)'
+    logger.debug(f'{description}: {text}')
@@ -0,0 +1,85 @@
+from orbit_metrics.config import DEFAULTS, get_settings, node_api_urls
+from orbit_metrics.scheduler import refresh_intervals
+
+
+class Labelled:
+    """A configured item with the label values of its series, computed once per metric and chain ID.
+
+    The chain ID is only known once the node is connected, the other labels
+    come from the configuration. Values are strings in the order of the label
+    names of the metric, as SeriesRegistry.set_values expects them.
+    """
+
+    __slots__ = ('labels', '_bound')
+
+    def __init__(self, labels):
+        self.labels = labels
+        self._bound = {}  # (metric, chain ID) -> label values
+
+    def bound(self, metric, chain_id=None):
+        key = (metric, chain_id)
+        label_values = self._bound.get(key)
+        if label_values is None:
+            labels = dict(self.labels, chain_id=chain_id)
+            label_values = self._bound[key] = tuple(str(labels[name]) for name in metric._labelnames)
+        return label_values
+
+
+class WalletPlan(Labelled):
+    __slots__ = ('address', 'type')
+
+    def __init__(self, chain, wallet):
+        self.address = wallet['address']
+        self.type = wallet.get('type', 'unknown')
+        super().__init__({'chain': chain, 'wallet': self.address, 'type': self.type})
+
+
+class ValidatorPlan(Labelled):
+    __slots__ = ('validator_id',)
+
+    def __init__(self, chain, validator):
+        self.validator_id = validator['validator_id']
+        super().__init__({'chain': chain, 'validator': self.validator_id})
+
+
+class NodePlan(Labelled):
+    """A configured node with its endpoints, wallets and validators resolved.
+
+    tasks holds the tasks of the node that do not depend on the state of the
+    chain, compiled once by the exporter.
+    """
+
+    __slots__ = ('name', 'node', 'api_urls', 'host', 'grpc_url', 'main_denom', 'balance_denoms', 'wallets',
+                 'validators', 'tasks')
+
+    def __init__(self, node):
+        self.name = node['name']
+        self.node = node
+        self.api_urls = tuple(node_api_urls(node))
+        self.host = self.api_urls[0]  # Concurrency limit key of the node
+        self.grpc_url = node.get('grpc_url')
+        self.main_denom = node.get('main_denom')
+        self.balance_denoms = node.get('balance_denoms')
+        self.wallets = tuple(WalletPlan(self.name, wallet) for wallet in node.get('wallets') or [])
+        self.validators = tuple(ValidatorPlan(self.name, validator) for validator in node.get('validators') or [])
+        self.tasks = ()
+        super().__init__({'chain': self.name})
+
+
+class CollectionPlan:
+    """A validated configuration compiled into what every collection cycle needs.
+
+    The nodes, the settings of every section and the refresh intervals are
+    resolved once per configuration instead of on every cycle. The
+    configuration is validated before it is sharded, so the plan of a shard
+    owning no chain is simply empty.
+    """
+
+    __slots__ = ('config', 'nodes', 'by_name', 'settings', 'intervals')
+
+    def __init__(self, config):
+        self.config = config
+        self.nodes = tuple(NodePlan(node) for node in config['nodes'])
+        self.by_name = {node.name: node for node in self.nodes}
+        self.settings = {section: get_settings(config, section) for section in DEFAULTS}
+        self.intervals = refresh_intervals(config)
@@ -0,0 +1,134 @@
+import logging
+import threading
+import time
+from socketserver import ThreadingMixIn
+from urllib.parse import parse_qs
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from prometheus_client import REGISTRY, CollectorRegistry, make_wsgi_app
+from prometheus_client.core import GaugeMetricFamily
+from prometheus_client.exposition import choose_encoder
+
+from orbit_metrics.config import get_settings
+from orbit_metrics.exporter import GROUP_METRICS, collection_plan, probe_node
+from orbit_metrics.metrics import collection_errors_counter, last_success_gauge
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds kept from the scrape timeout sent by Prometheus to write the response
+SCRAPE_TIMEOUT_OFFSET = 0.5
+
+
+class ProbeCollector:
+    """Collector of the series of a single chain in some metric groups, with the outcome of the probe."""
+
+    def __init__(self, chain, groups, success, duration):
+        self.chain = chain
+        self.groups = groups
+        self.success = success
+        self.duration = duration
+
+    def _keep(self, sample):
+        if sample.labels.get('chain') != self.chain:
+            return False
+        return 'group' not in sample.labels or sample.labels['group'] in self.groups  # Collection health
+
+    def collect(self):
+        success = GaugeMetricFamily('orbit_metrics_probe_success', 'Whether every fetch of the probe succeeded')
+        success.add_metric([], 1 if self.success else 0)
+        duration = GaugeMetricFamily('orbit_metrics_probe_duration_seconds', 'Duration of the probe')
+        duration.add_metric([], self.duration)
+        yield success
+        yield duration
+
+        metrics = [metric for group in sorted(self.groups) for metric in GROUP_METRICS[group]]
+        for metric in metrics + [last_success_gauge, collection_errors_counter]:
+            for family in metric.collect():
+                family.samples = [sample for sample in family.samples if self._keep(sample)]
+                if family.samples:
+                    yield family
+
+
+class ProbeApp:
+    """WSGI application serving /probe?target=<chain>&module=<groups>, and registry on every other path.
+
+    A probe collects the groups of a single chain (every group without module)
+    in its own thread, so a slow chain only delays its own scrapes, and serves
+    them from a registry of its own. Groups are reused for min_age seconds
+    instead of their refresh interval, the scrape interval of every probe job
+    decides how often they are refreshed.
+    """
+
+    def __init__(self, reloader, registry=REGISTRY):
+        self.reloader = reloader
+        self.metrics_app = make_wsgi_app(registry)
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO') != '/probe':
+            return self.metrics_app(environ, start_response)
+        status, content_type, body = self.probe(environ)
+        start_response(status, [('Content-Type', content_type), ('Content-Length', str(len(body)))])
+        return [body]
+
+    def _timeout(self, environ, timeout):
+        try:
+            scrape_timeout = float(environ.get('HTTP_X_PROMETHEUS_SCRAPE_TIMEOUT_SECONDS', 0))
+        except ValueError:
+            return timeout
+        return min(timeout, scrape_timeout - SCRAPE_TIMEOUT_OFFSET) if scrape_timeout else timeout
+
+    def probe(self, environ):
+        """Return the status, content type and body of a probe."""
+        config = self.reloader.poll()
+        settings = get_settings(config, 'probe')
+        query = parse_qs(environ.get('QUERY_STRING', ''))
+        target = query.get('target', [''])[0]
+        plan = collection_plan(config)
+        node = plan.by_name.get(target)
+        if node is None:
+            return '400 Bad Request', 'text/plain', f'Unknown target {target!r}\n'.encode()
+        groups = {group for module in query.get('module', []) for group in module.split(',') if group}
+        unknown = groups - set(GROUP_METRICS)
+        if unknown:
+            return '400 Bad Request', 'text/plain', f'Unknown modules {sorted(unknown)}, ' \
+                                                    f'use {", ".join(GROUP_METRICS)}\n'.encode()
+        groups = groups or set(GROUP_METRICS)
+
+        intervals = {group: settings['min_age'] for group in GROUP_METRICS}
+        result = []
+
+        def collect():
+            try:
+                result.append(probe_node(plan, node, groups, intervals))
+            except Exception as e:
+                logger.error(f'Failed to probe {target}: {e}')
+                result.append(False)
+
+        started = time.monotonic()
+        worker = threading.Thread(target=collect, name=f'probe-{target}', daemon=True)
+        worker.start()
+        worker.join(max(0.0, self._timeout(environ, settings['timeout'])))
+        if not result:
+            logger.warning(f'Probe of {target} timed out, serving the values collected so far')
+
+        registry = CollectorRegistry()
+        registry.register(ProbeCollector(target, groups, bool(result and result[0]), time.monotonic() - started))
+        encoder, content_type = choose_encoder(environ.get('HTTP_ACCEPT'))
+        return '200 OK', content_type, encoder(registry)
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class SilentHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass  # Every scrape would be logged
+
+
+def start_probe_server(reloader, port, addr='0.0.0.0', registry=REGISTRY):
+    """Serve registry and the probes in a daemon thread, like prometheus_client.start_http_server."""
+    server = make_server(addr, port, ProbeApp(reloader, registry), ThreadingWSGIServer, handler_class=SilentHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
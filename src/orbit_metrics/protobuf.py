@@ -0,0 +1,176 @@
+import base64
+import struct
+import time
+
+# Wire types of the protobuf encoding
+VARINT = 0
+FIXED64 = 1
+LENGTH_DELIMITED = 2
+FIXED32 = 5
+
+# Decimal places of the cosmos-sdk Dec type, sent over gRPC as the digits of value * 10**18
+DEC_PRECISION = 18
+
+
+class DecodeError(ValueError):
+    """Raised on a malformed protobuf message."""
+
+
+def encode_varint(value):
+    if value < 0:
+        value += 1 << 64  # Negative int64 are sent as their two's complement
+    data = bytearray()
+    while True:
+        byte = value & 0x7f
+        value >>= 7
+        if value:
+            data.append(byte | 0x80)
+        else:
+            data.append(byte)
+            return bytes(data)
+
+
+def encode_message(fields):
+    """Encode a message from (field number, value) pairs.
+
+    Integers and booleans are sent as varints, floats as doubles, strings and
+    bytes as themselves and lists of pairs as nested messages. None values are
+    omitted.
+    """
+    data = bytearray()
+    for number, value in fields:
+        if value is None:
+            continue
+        if isinstance(value, (bool, int)):
+            data += encode_varint(number << 3 | VARINT) + encode_varint(int(value))
+            continue
+        if isinstance(value, float):
+            data += encode_varint(number << 3 | FIXED64) + struct.pack('<d', value)
+            continue
+        if isinstance(value, str):
+            value = value.encode()
+        elif isinstance(value, list):
+            value = encode_message(value)
+        data += encode_varint(number << 3 | LENGTH_DELIMITED) + encode_varint(len(value)) + value
+    return bytes(data)
+
+
+def _read_varint(data, position):
+    value = shift = 0
+    while True:
+        if position >= len(data):
+            raise DecodeError('Truncated varint')
+        byte = data[position]
+        position += 1
+        value |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return value, position
+        shift += 7
+
+
+def iter_fields(data):
+    """Yield the (field number, wire type, value) of a message, varints as int and the other types as bytes."""
+    data = memoryview(data)
+    position = 0
+    while position < len(data):
+        key, position = _read_varint(data, position)
+        number, wire_type = key >> 3, key & 7
+        if wire_type == VARINT:
+            value, position = _read_varint(data, position)
+        elif wire_type == LENGTH_DELIMITED:
+            length, position = _read_varint(data, position)
+            value = bytes(data[position:position + length])
+            position += length
+        elif wire_type in (FIXED64, FIXED32):
+            length = 8 if wire_type == FIXED64 else 4
+            value = bytes(data[position:position + length])
+            position += length
+        else:
+            raise DecodeError(f'Unsupported wire type {wire_type} of field {number}')
+        if position > len(data):
+            raise DecodeError(f'Truncated field {number}')
+        yield number, wire_type, value
+
+
+def _dec(value):
+    digits = value.decode()
+    sign = '-' if digits.startswith('-') else ''
+    digits = digits.lstrip('-').rjust(DEC_PRECISION + 1, '0')
+    return f'{sign}{digits[:-DEC_PRECISION]}.{digits[-DEC_PRECISION:]}'
+
+
+def _integer(value):
+    return str(value - (1 << 64) if value >= 1 << 63 else value)
+
+
+def _timestamp(value):
+    fields = {number: field for number, _, field in iter_fields(value)}
+    date = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(fields.get(1, 0)))
+    return f'{date}.{fields[2]:09d}Z' if fields.get(2) else f'{date}Z'
+
+
+def _duration(value):
+    fields = {number: field for number, _, field in iter_fields(value)}
+    seconds = int(_integer(fields.get(1, 0)))
+    return f'{seconds}.{fields[2]:09d}'.rstrip('0') + 's' if fields.get(2) else f'{seconds}s'
+
+
+def _public_key(value):
+    # google.protobuf.Any holding a PubKey message, whose field 1 is the key
+    fields = {number: field for number, _, field in iter_fields(value)}
+    key = {number: field for number, _, field in iter_fields(fields.get(2, b''))}.get(1, b'')
+    return {'@type': fields.get(1, b'').decode(), 'key': base64.b64encode(key).decode()}
+
+
+# Conversions of the scalar kinds of a schema to the values of the REST API JSON, with their defaults
+SCALARS = {
+    'string': (lambda value: value.decode(), ''),
+    'bytes': (lambda value: base64.b64encode(value).decode(), None),
+    'integer': (_integer, '0'),  # 64-bit integers are strings in JSON
+    'number': (lambda value: value, 0),
+    'bool': (bool, False),
+    'dec': (_dec, '0.' + '0' * DEC_PRECISION),
+    'timestamp': (_timestamp, None),
+    'duration': (_duration, '0s'),
+    'public_key': (_public_key, None),
+}
+
+
+def enum(names):
+    """Return the kind of an enum field, whose values are exported by name."""
+    return lambda value: names.get(value, str(value)), names[0]
+
+
+def decode_message(data, schema):
+    """Decode a message to the dict the REST API returns for it.
+
+    schema maps field numbers to (name, kind) or (name, kind, 'repeated'),
+    where kind is a nested schema, one of SCALARS or a (convert, default) pair
+    such as an enum. Fields missing from the message get their default value,
+    as in the REST API, and fields missing from the schema are skipped.
+    """
+    message = {}
+    for field in schema.values():
+        name, kind = field[:2]
+        if len(field) > 2:
+            message[name] = []
+        else:
+            message[name] = None if isinstance(kind, dict) else SCALARS.get(kind, kind)[1]
+
+    for number, _, value in iter_fields(data):
+        field = schema.get(number)
+        if field is None:
+            continue
+        name, kind = field[:2]
+        try:
+            if isinstance(kind, dict):
+                value = decode_message(value, kind)
+            else:
+                value = SCALARS.get(kind, kind)[0](value)
+        except (AttributeError, TypeError, UnicodeDecodeError) as e:  # Wire type not matching the schema
+            raise DecodeError(f'Invalid field {number} ({name}): {e}')
+        if len(field) > 2:
+            message[name].append(value)
+        else:
+            message[name] = value
+    return message
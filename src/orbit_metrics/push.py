@@ -0,0 +1,355 @@
+import logging
+import math
+import os
+import socket
+import struct
+import threading
+import time
+from collections import deque
+
+try:
+    import snappy
+except ImportError:  # Optional dependency, the pure Python compressor below is used without it
+    snappy = None
+
+import requests
+from prometheus_client import CollectorRegistry, generate_latest
+
+from orbit_metrics.metrics import exported_metrics, push_batches_counter, push_queue_gauge, \
+    push_samples_counter, push_spilled_bytes_gauge
+from orbit_metrics.protobuf import encode_message, encode_varint
+from orbit_metrics.resilience import backoff_delay
+
+logger = logging.getLogger(__name__)
+
+# Value marking a series as stale in Prometheus, sent once for series that are no longer exported
+STALE_NAN = struct.unpack('<d', struct.pack('<Q', 0x7ff0000000000002))[0]
+
+REMOTE_WRITE_HEADERS = {
+    'Content-Encoding': 'snappy',
+    'Content-Type': 'application/x-protobuf',
+    'X-Prometheus-Remote-Write-Version': '0.1.0',
+}
+PUSHGATEWAY_HEADERS = {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+def _snappy_literal(output, literal):
+    length = len(literal) - 1
+    if length < 0:
+        return
+    if length < 60:
+        output.append(length << 2)
+    else:
+        size = (length.bit_length() + 7) // 8
+        output.append((59 + size) << 2)
+        output += length.to_bytes(size, 'little')
+    output += literal
+
+
+def snappy_compress(data):
+    """Compress data to the snappy block format, as remote-write receivers expect.
+
+    A plain Python port of the greedy snappy matcher, used when python-snappy is
+    not installed: every 64 KiB block is scanned for 4-byte sequences seen
+    earlier in the block, which are replaced by copies of up to 64 bytes.
+    """
+    if snappy is not None:
+        return snappy.compress(data)
+    output = bytearray(encode_varint(len(data)))
+    for start in range(0, len(data), 65536):
+        block = data[start:start + 65536]
+        table = {}
+        position = literal_start = misses = 0
+        while position + 4 <= len(block):
+            key = block[position:position + 4]
+            candidate = table.get(key)
+            table[key] = position
+            if candidate is None:
+                misses += 1
+                position += 1 + (misses >> 5)  # Skip faster through data that does not compress
+                continue
+            misses = 0
+            length = 4
+            while position + length < len(block) and block[candidate + length] == block[position + length]:
+                length += 1
+            _snappy_literal(output, block[literal_start:position])
+            offset = position - candidate
+            for copy_start in range(0, length, 64):
+                output.append((min(64, length - copy_start) - 1) << 2 | 2)
+                output += offset.to_bytes(2, 'little')
+            position = literal_start = position + length
+        _snappy_literal(output, block[literal_start:])
+    return bytes(output)
+
+
+def remote_write_request(samples, timestamp_ms):
+    """Encode (name, labels, value) samples as a remote-write WriteRequest protobuf message."""
+    timeseries = []
+    for name, labels, value in samples:
+        label_fields = [(1, [(1, label), (2, label_value)])
+                        for label, label_value in sorted(labels + (('__name__', name),))]
+        timeseries.append((1, label_fields + [(2, [(1, float(value)), (2, timestamp_ms)])]))
+    return encode_message(timeseries)
+
+
+class SampleFilter:
+    """Keep track of the last sent value of every sample, to only send the changed ones.
+
+    Unchanged samples are sent again after full_interval seconds, so a receiver
+    that marks series stale when they stop receiving samples keeps them.
+    """
+
+    def __init__(self, full_interval):
+        self.full_interval = full_interval
+        self._sent = {}  # (name, labels) -> (value, sent_at)
+
+    def changes(self, families, now):
+        """Return the families with changed samples, their changed samples and the removed series."""
+        changed_families, samples, seen = [], [], set()
+        for family in families:
+            changed = False
+            for sample in family.samples:
+                if sample.name.endswith('_created'):  # Creation times of counters and histograms
+                    continue
+                key = (sample.name, tuple(sorted(sample.labels.items())))
+                seen.add(key)
+                sent = self._sent.get(key)
+                if sent is not None and now - sent[1] < self.full_interval and \
+                        (sent[0] == sample.value or math.isnan(sent[0]) and math.isnan(sample.value)):
+                    continue
+                self._sent[key] = (sample.value, now)
+                samples.append((key[0], key[1], sample.value))
+                changed = True
+            if changed:
+                changed_families.append(family)
+        removed = [key for key in self._sent if key not in seen]
+        for key in removed:
+            del self._sent[key]
+        return changed_families, samples, removed
+
+
+class FamiliesCollector:
+    """Collector of fixed metric families, to render a subset of the metrics in the text format."""
+
+    def __init__(self, families):
+        self.families = families
+
+    def collect(self):
+        return self.families
+
+
+class Pusher:
+    """Push the changed samples of the exporter after every cycle, instead of waiting to be scraped.
+
+    Samples are sent to a Prometheus remote-write receiver (protobuf, snappy
+    compressed) or to a Pushgateway (text format, the families with a changed
+    sample replacing their previous samples). Batches wait in a bounded queue
+    for a sender thread, which retries them with exponential backoff. With a
+    spill_path, the failed batch and the batches overflowing the queue are
+    written to disk while the receiver is down, and sent first once it is back,
+    also after a restart; otherwise the oldest batches are dropped when the
+    queue is full.
+    """
+
+    def __init__(self, settings, metrics=exported_metrics, session=None):
+        self.settings = settings
+        self.metrics = metrics
+        self.session = session or requests.Session()
+        self.instance = settings['instance'] or socket.gethostname()
+        self.filter = SampleFilter(settings['full_interval'])
+        self._queue = deque()  # (method, body), oldest first
+        self._spilled = deque()  # Paths of the spilled batches, all older than the queued ones
+        self._spilled_bytes = 0
+        self._sequence = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        if settings['spill_path']:
+            os.makedirs(settings['spill_path'], exist_ok=True)
+            for name in sorted(os.listdir(settings['spill_path'])):
+                if name.endswith(('.post', '.put')):
+                    path = os.path.join(settings['spill_path'], name)
+                    self._spilled.append(path)
+                    self._spilled_bytes += os.path.getsize(path)
+            push_spilled_bytes_gauge.set(self._spilled_bytes)
+        self._thread = threading.Thread(target=self._run, name='push', daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self):
+        if self.settings['format'] == 'pushgateway':
+            return f"{self.settings['url'].rstrip('/')}/metrics/job/{self.settings['job']}/instance/{self.instance}"
+        return self.settings['url']
+
+    def push(self, now=None):
+        """Queue the samples that changed since the last push, returning the number of batches queued."""
+        now = time.time() if now is None else now
+        families = [family for metric in self.metrics() for family in metric.collect()]
+        changed_families, samples, removed = self.filter.changes(families, now)
+
+        if self.settings['format'] == 'pushgateway':
+            if removed:  # A POST only replaces the families it sends, replace the whole group instead
+                batches = [('PUT', generate_latest(self._registry(families)))]
+            elif changed_families:
+                batches = [('POST', generate_latest(self._registry(changed_families)))]
+            else:
+                batches = []
+        else:
+            external = (('instance', self.instance), ('job', self.settings['job']))
+            samples = [(name, labels + external, value) for name, labels, value in samples]
+            samples += [(name, labels + external, STALE_NAN) for name, labels in removed]
+            size = self.settings['max_samples_per_batch']
+            batches = [('POST', snappy_compress(remote_write_request(samples[start:start + size], int(now * 1000))))
+                       for start in range(0, len(samples), size)]
+
+        with self._condition:
+            for batch in batches:
+                self._queue.append(batch)
+                if len(self._queue) > self.settings['queue_size']:
+                    self._overflow()
+            push_queue_gauge.set(len(self._queue))
+            self._condition.notify()
+        push_samples_counter.inc(len(samples))
+        return len(batches)
+
+    def _registry(self, families):
+        registry = CollectorRegistry(auto_describe=False)
+        registry.register(FamiliesCollector(families))
+        return registry
+
+    def _overflow(self):
+        if self.settings['spill_path']:
+            self._spill(*self._queue.popleft())
+        else:
+            self._queue.popleft()
+            push_batches_counter.labels(result='dropped').inc()
+            logger.warning(f'Push queue full, dropped the oldest batch for {self.url}')
+
+    def _spill(self, method, body, first=False):
+        """Write a batch to the spill directory, dropping the oldest spilled batches above spill_max_bytes.
+
+        With first, the batch is sent before the spilled ones, its file name sorting before theirs.
+        """
+        if first and self._spilled:
+            stem = self._spilled[0].rpartition('.')[0]
+            path = f'{stem}-0.{method.lower()}'  # '-' sorts before '.'
+        else:
+            self._sequence += 1
+            path = os.path.join(self.settings['spill_path'],
+                                f'{time.time() * 1000:015.0f}-{self._sequence:06d}.{method.lower()}')
+        try:
+            with open(f'{path}.tmp', 'wb') as file:
+                file.write(body)
+            os.replace(f'{path}.tmp', path)
+        except OSError as e:
+            push_batches_counter.labels(result='dropped').inc()
+            logger.error(f'Failed to spill a push batch to {path}: {e}')
+            return
+        if first:
+            self._spilled.appendleft(path)
+        else:
+            self._spilled.append(path)
+        self._spilled_bytes += len(body)
+        while self._spilled_bytes > self.settings['spill_max_bytes'] and len(self._spilled) > 1:
+            self._remove_spilled(self._spilled[0])
+            push_batches_counter.labels(result='dropped').inc()
+        push_spilled_bytes_gauge.set(self._spilled_bytes)
+
+    def _remove_spilled(self, path):
+        if path not in self._spilled:  # Dropped above spill_max_bytes while it was being sent
+            return
+        self._spilled.remove(path)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            self._spilled_bytes -= size
+        except OSError as e:
+            logger.error(f'Failed to remove the spilled push batch {path}: {e}')
+        push_spilled_bytes_gauge.set(self._spilled_bytes)
+
+    def _next_batch(self):
+        """Wait for the oldest batch and return (spilled path or None, method, body), or None once closed.
+
+        Spilled batches are read without holding the lock, which push() takes after every cycle.
+        """
+        while True:
+            with self._condition:
+                while not self._closed and not self._spilled and not self._queue:
+                    self._condition.wait()
+                if self._closed:
+                    return None
+                if not self._spilled:
+                    method, body = self._queue.popleft()
+                    push_queue_gauge.set(len(self._queue))
+                    return None, method, body
+                path = self._spilled[0]
+            try:
+                with open(path, 'rb') as file:
+                    return path, path.rpartition('.')[2].upper(), file.read()
+            except OSError as e:
+                logger.error(f'Failed to read the spilled push batch {path}: {e}')
+                with self._condition:
+                    self._remove_spilled(path)
+
+    def _send(self, method, body):
+        headers = PUSHGATEWAY_HEADERS if self.settings['format'] == 'pushgateway' else REMOTE_WRITE_HEADERS
+        response = self.session.request(method, self.url, data=body, headers=headers, timeout=self.settings['timeout'])
+        response.raise_for_status()
+
+    def _run(self):
+        attempt = 0
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            path, method, body = batch
+            try:
+                self._send(method, body)
+            except requests.exceptions.RequestException as e:
+                status = getattr(e.response, 'status_code', None)
+                if status is not None and status < 500 and status != 429:
+                    push_batches_counter.labels(result='dropped').inc()
+                    logger.error(f'Push to {self.url} rejected, dropping the batch: {e}')
+                    self._done(path)
+                    continue
+                push_batches_counter.labels(result='failed').inc()
+                attempt += 1
+                delay = backoff_delay(attempt, self.settings['backoff_base'], self.settings['backoff_max'])
+                logger.warning(f'Push to {self.url} failed, retrying in {delay:.1f}s: {e}')
+                self._retry_later(path, method, body, delay)
+                continue
+            attempt = 0
+            push_batches_counter.labels(result='sent').inc()
+            self._done(path)
+
+    def _done(self, path):
+        if path is not None:
+            with self._condition:
+                self._remove_spilled(path)
+
+    def _retry_later(self, path, method, body, delay):
+        """Put a failed batch back in front of the others and wait for delay seconds or the closing."""
+        with self._condition:
+            if path is None:
+                if self.settings['spill_path']:
+                    # Only the failed batch is written, the queue spills its oldest batches once full
+                    self._spill(method, body, first=True)
+                elif len(self._queue) < self.settings['queue_size']:
+                    self._queue.appendleft((method, body))
+                else:  # The failed batch is the oldest one
+                    push_batches_counter.labels(result='dropped').inc()
+            if not self._closed:
+                self._condition.wait(delay)
+
+    def close(self):
+        """Stop the sender thread, spilling the batches still queued when a spill_path is set."""
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join(self.settings['timeout'])
+        with self._condition:
+            if self.settings['spill_path']:
+                while self._queue:
+                    self._spill(*self._queue.popleft())
+        self.session.close()
@@ -0,0 +1,88 @@
+import logging
+import os
+import signal
+import threading
+
+import yaml
+
+from orbit_metrics.config import ConfigError, get_settings, load_config, validate_config
+from orbit_metrics.exporter import apply_config_change
+from orbit_metrics.metrics import config_reloads_counter
+
+
+logger = logging.getLogger(__name__)
+
+
+def diff_nodes(old_config, new_config):
+    """Return the names of the (added, removed, changed) nodes between two configurations."""
+    old_nodes = {node['name']: node for node in old_config['nodes']}
+    new_nodes = {node['name']: node for node in new_config['nodes']}
+    added = [name for name in new_nodes if name not in old_nodes]
+    removed = [name for name in old_nodes if name not in new_nodes]
+    changed = [name for name in new_nodes if name in old_nodes and new_nodes[name] != old_nodes[name]]
+    return added, removed, changed
+
+
+class ConfigReloader:
+    """Reload the configuration file on SIGHUP or when it changes, between collection cycles.
+
+    A reload is only requested by the signal handler or noticed from the file's
+    modification time; it is applied by poll(), which the collection loop calls
+    before every cycle, so a cycle never sees two configurations. An invalid
+    configuration is logged and the current one is kept. prepare is applied to
+    every reloaded configuration, such as keeping the nodes of a shard.
+    """
+
+    def __init__(self, config_path, config, prepare=None):
+        self.config_path = config_path
+        self.config = config
+        self.prepare = prepare
+        self.requested = threading.Event()
+        self._mtime = self._modified()
+        self._lock = threading.Lock()  # Probes and scrapes poll from the HTTP server threads
+
+    def _modified(self):
+        try:
+            return os.stat(self.config_path).st_mtime
+        except OSError:
+            return None
+
+    def install_signal_handler(self):
+        if hasattr(signal, 'SIGHUP'):  # Not available on Windows
+            signal.signal(signal.SIGHUP, lambda signum, frame: self.requested.set())
+
+    def _changed(self):
+        if self.requested.is_set():
+            return True
+        return get_settings(self.config, 'exporter')['reload_watch'] and self._modified() != self._mtime
+
+    def poll(self):
+        """Return the configuration of the next cycle, reloading it first when requested or changed."""
+        if not self._changed():
+            return self.config
+        with self._lock:
+            if self._changed():
+                return self._reload()
+            return self.config
+
+    def _reload(self):
+        self.requested.clear()
+        self._mtime = self._modified()
+
+        try:
+            new_config = load_config(self.config_path)
+            validate_config(new_config)
+        except (OSError, yaml.YAMLError, ConfigError) as e:
+            logger.error(f'Keeping the current configuration, the new one is invalid: {e}')
+            config_reloads_counter.labels(result='failure').inc()
+            return self.config
+        if self.prepare:
+            new_config = self.prepare(new_config)
+
+        added, removed, changed = diff_nodes(self.config, new_config)
+        logger.info(f'Configuration reloaded: {len(added)} chains added {added}, {len(removed)} removed {removed}, '
+                    f'{len(changed)} changed {changed}')
+        apply_config_change(self.config, new_config)
+        self.config = new_config
+        config_reloads_counter.labels(result='success').inc()
+        return new_config
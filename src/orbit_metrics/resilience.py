@@ -0,0 +1,102 @@
+import random
+import threading
+import time
+
+from orbit_metrics.metrics import circuit_breaker_state_gauge
+
+
+class CircuitOpenError(Exception):
+    """Raised without sending a request when the circuit breakers of all endpoints of a node are open."""
+
+
+class CircuitBreaker:
+    """Fail fast on an endpoint after consecutive failures.
+
+    After failure_threshold consecutive failures the breaker opens and the
+    endpoint is skipped for reset_timeout seconds. It is then half-open: a
+    single trial request is let through, whose success closes it and whose
+    failure opens it again. A trial that is never recorded, as when the
+    endpoint was listed but another one answered, is replaced by a new one
+    after reset_timeout seconds.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 0, 1, 2
+
+    def __init__(self, endpoint, failure_threshold=5, reset_timeout=60, clock=time.monotonic):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.trial_started_at = None  # Start of the request let through while half-open
+        self._lock = threading.Lock()
+        circuit_breaker_state_gauge.labels(endpoint=endpoint).set(self.CLOSED)
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if self.clock() - self.opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allows_request(self):
+        """Return whether a request may be sent, admitting a single trial request while half-open."""
+        with self._lock:
+            state = self.state
+            allowed = state == self.CLOSED
+            if state == self.HALF_OPEN:
+                now = self.clock()
+                if self.trial_started_at is None or now - self.trial_started_at >= self.reset_timeout:
+                    self.trial_started_at = now
+                    allowed = True
+        circuit_breaker_state_gauge.labels(endpoint=self.endpoint).set(state)
+        return allowed
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_started_at = None
+        circuit_breaker_state_gauge.labels(endpoint=self.endpoint).set(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                self.opened_at = self.clock()
+                self.trial_started_at = None
+        circuit_breaker_state_gauge.labels(endpoint=self.endpoint).set(self.state)
+
+
+class RetryBudget:
+    """Number of retries all clients may spend together during a collection cycle."""
+
+    def __init__(self, retries=0):
+        self.retries = retries
+        self.remaining = retries
+        self._lock = threading.Lock()
+
+    def reset(self, retries=None):
+        with self._lock:
+            if retries is not None:
+                self.retries = retries
+            self.remaining = self.retries
+
+    def acquire(self):
+        """Spend one retry, returning False once the budget is exhausted."""
+        with self._lock:
+            if self.remaining <= 0:
+                return False
+            self.remaining -= 1
+            return True
+
+
+def backoff_delay(attempt, base, cap):
+    """Return the full-jitter exponential backoff delay before retry number attempt (starting at 1)."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+# Shared by every client, empty until the exporter resets it at the start of a cycle
+retry_budget = RetryBudget()
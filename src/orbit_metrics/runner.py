@@ -0,0 +1,125 @@
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from functools import partial
+
+from prometheus_client import CollectorRegistry, start_http_server
+
+from orbit_metrics.collector import register_scrape_collector
+from orbit_metrics.config import ConfigError, get_settings, load_config, validate_config
+from orbit_metrics.exporter import collection_plan, fetch_metrics, restore_snapshot
+from orbit_metrics.logger import get_log_level, setup_logging
+from orbit_metrics.probe import start_probe_server
+from orbit_metrics.reload import ConfigReloader
+from orbit_metrics.scheduler import tick_interval
+from orbit_metrics.sharding import ShardAggregator, shard_config
+
+
+logger = logging.getLogger(__name__)
+
+
+def start_server(reloader, port, addr):
+    # The probes are served next to the metrics of every chain unless disabled
+    if get_settings(reloader.config, 'probe')['enabled']:
+        start_probe_server(reloader, port, addr)
+    else:
+        start_http_server(port, addr=addr)
+
+
+def run_poll_loop(reloader, port=8000, addr='0.0.0.0'):
+    # Run as often as the shortest refresh interval, groups that are not due are served from cache
+    start_server(reloader, port, addr)
+    while True:
+        config = reloader.poll()
+        interval = tick_interval(config)
+        started = time.monotonic()
+        fetch_metrics(config)
+        time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+
+def run_scrape_mode(reloader, min_age, port=8000, addr='0.0.0.0'):
+    # Metrics are collected by the HTTP server threads when Prometheus scrapes
+    register_scrape_collector(reloader.config, min_age, reloader=reloader)
+    start_server(reloader, port, addr)
+    threading.Event().wait()
+
+
+def run_probe_mode(reloader, port=8000, addr='0.0.0.0'):
+    # Chains are only collected by the probes, /metrics serves the values they collected last
+    start_probe_server(reloader, port, addr)
+    threading.Event().wait()
+
+
+def run_exporter(config_path, config, shard=0, shards=1, port=8000, addr='0.0.0.0'):
+    # Reloaded on SIGHUP and when the file changes, the mode, port and shards require a restart
+    prepare = partial(shard_config, shard=shard, shards=shards)
+    reloader = ConfigReloader(config_path, prepare(config), prepare=prepare)
+    reloader.install_signal_handler()
+    # Compiled before serving, config was validated before sharding as a shard may own no chain
+    collection_plan(reloader.config)
+    # Serve the last known values until the first cycle completes
+    restore_snapshot(reloader.config)
+
+    exporter_settings = get_settings(config, 'exporter')
+    if exporter_settings['mode'] == 'scrape':
+        logger.info(f"Collecting metrics on scrape.")
+        run_scrape_mode(reloader, exporter_settings['scrape_min_age'], port, addr)
+    elif exporter_settings['mode'] == 'probe':
+        logger.info(f"Collecting metrics on probe only.")
+        run_probe_mode(reloader, port, addr)
+    else:
+        run_poll_loop(reloader, port, addr)
+
+
+def run_shard_worker(args, shard, shards, port, addr):
+    # Entry point of a spawned worker process, which starts without the logging setup of its parent
+    setup_logging(log_file=args.log_file and f'{args.log_file}.shard{shard}', log_level=get_log_level(args.log_level))
+    config = load_config(args.config)
+    try:
+        validate_config(config)
+    except ConfigError as e:
+        logger.error(f'Invalid configuration {args.config}: {e}')
+        raise SystemExit(1)
+    run_exporter(args.config, config, shard, shards, port, addr)
+
+
+def run_shard_workers(args, config, shards):
+    # Workers are spawned rather than forked, the front process may already run HTTP server threads.
+    # Their entry point lives here, as multiprocessing cannot import it from the __main__ of a package.
+    sharding_settings = get_settings(config, 'sharding')
+    aggregate = sharding_settings['aggregate']
+    addr = '127.0.0.1' if aggregate else '0.0.0.0'
+    ports = [sharding_settings['worker_port'] + shard for shard in range(shards)]
+    context = multiprocessing.get_context('spawn')
+    workers = {}
+
+    def start_worker(shard):
+        workers[shard] = context.Process(target=run_shard_worker, args=(args, shard, shards, ports[shard], addr),
+                                         name=f'orbit-metrics-shard-{shard}', daemon=True)
+        workers[shard].start()
+
+    for shard in range(shards):
+        start_worker(shard)
+    logger.info(f'Started {shards} shard workers on ports {ports[0]}-{ports[-1]}')
+
+    if aggregate:
+        registry = CollectorRegistry()
+        registry.register(ShardAggregator([f'http://127.0.0.1:{port}/metrics' for port in ports]))
+        start_http_server(8000, registry=registry)
+
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda signum, frame: [os.kill(worker.pid, signal.SIGHUP)
+                                                            for worker in workers.values() if worker.is_alive()])
+    # Exit through SystemExit so that multiprocessing terminates the daemon workers
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    while True:
+        time.sleep(5)
+        for shard, worker in list(workers.items()):
+            if not worker.is_alive():
+                logger.error(f'Shard worker {shard} exited with code {worker.exitcode}, restarting it')
+                start_worker(shard)
@@ -0,0 +1,107 @@
+import threading
+import time
+
+from orbit_metrics.config import get_settings
+
+
+class TTLCache:
+    """Thread-safe cache of fetched values that expire after a per-entry TTL.
+
+    Failed fetches (None) are never cached, so they are retried on the next cycle
+    while the gauges keep serving the last good value.
+
+    Entries can carry a version, such as the block height they were fetched at.
+    An expired entry whose version is still current is renewed instead of
+    refetched, since the data it was fetched from cannot have changed.
+
+    Entries fetched by a collection cycle are set with the start of the cycle
+    as fetched_at rather than the end of their fetch, so a group whose interval
+    equals the tick of the loop expires on the next cycle instead of the one
+    after it. Entries expire up to tolerance seconds early, absorbing the drift
+    of the loop between the starts of two cycles.
+    """
+
+    def __init__(self, clock=time.time, tolerance=0.1):
+        self.clock = clock
+        self.tolerance = tolerance
+        self._entries = {}  # key -> (value, fetched_at, ttl, version)
+        self._lock = threading.Lock()
+
+    def _fresh(self, fetched_at, ttl):
+        return self.clock() - fetched_at < ttl - self.tolerance
+
+    def _entry(self, key):
+        with self._lock:
+            return self._entries.get(key)
+
+    def get(self, key):
+        """Return the cached value of key, or None if it is missing or expired."""
+        entry = self._entry(key)
+        if entry is None:
+            return None
+        value, fetched_at, ttl, _ = entry
+        if not self._fresh(fetched_at, ttl):
+            return None
+        return value
+
+    def set(self, key, value, ttl, version=None, fetched_at=None):
+        """Cache value for ttl seconds from fetched_at, the current time by default."""
+        now = self.clock()
+        fetched_at = now if fetched_at is None else min(now, fetched_at)
+        with self._lock:
+            self._entries[key] = (value, fetched_at, ttl, version)
+
+    def lookup(self, key, ttl, version=None, fetched_at=None):
+        """Return (hit, value) for key.
+
+        An expired value fetched at the same, non-None version is renewed for ttl and counts as a hit.
+        """
+        entry = self._entry(key)
+        if entry is None:
+            return False, None
+        value, fetched_at, cached_ttl, cached_version = entry
+        if self._fresh(fetched_at, cached_ttl):
+            return True, value
+        if version is not None and cached_version == version:
+            self.set(key, value, ttl, version, fetched_at)
+            return True, value
+        return False, None
+
+    def get_or_fetch(self, key, ttl, fetch, version=None, fetched_at=None):
+        """Return the cached value of key, calling fetch() on a miss."""
+        hit, value = self.lookup(key, ttl, version=version, fetched_at=fetched_at)
+        if not hit:
+            value = fetch()
+            if value is not None:
+                self.set(key, value, ttl, version, fetched_at)
+        return value
+
+    def remove_if(self, predicate):
+        """Remove the entries whose key matches predicate."""
+        with self._lock:
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+
+    def entries(self):
+        """Return the (key, value, fetched_at, ttl, version) of every entry."""
+        with self._lock:
+            return [(key,) + entry for key, entry in self._entries.items()]
+
+    def restore(self, key, value, fetched_at, ttl, version=None):
+        """Add an entry fetched at fetched_at, unless key was set since."""
+        with self._lock:
+            self._entries.setdefault(key, (value, fetched_at, ttl, version))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def refresh_intervals(config):
+    """Return the refresh interval in seconds of every metric group."""
+    return {group: float(interval) for group, interval in get_settings(config, 'refresh').items()}
+
+
+def tick_interval(config):
+    """Return how often the exporter loop must run to honour the shortest refresh interval."""
+    return min(refresh_intervals(config).values())
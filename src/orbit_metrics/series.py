@@ -0,0 +1,108 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SeriesRegistry:
+    """Children of labelled metrics with the time each label set was last set.
+
+    Setting values through the registry reuses the child of a label set instead
+    of resolving it with labels() on every cycle, and records when it was last
+    set. Series that are no longer updated, such as those of a removed wallet or
+    validator or of a former moniker, can then be removed from the exported
+    metrics after a TTL or as soon as the configuration changes.
+    """
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._series = {}  # (metric, label values) -> [child, last set, value]
+        self._lock = threading.Lock()
+
+    def _key(self, metric, labels):
+        # labels() stores its label values as strings in the order of the metric's label names
+        return metric, tuple(str(labels[name]) for name in metric._labelnames)
+
+    def _child(self, key, now, value):
+        series = self._series.get(key)
+        if series is None:
+            metric, label_values = key
+            series = self._series[key] = [metric.labels(*label_values), now, value]
+        else:
+            series[1] = now
+            series[2] = value
+        return series[0]
+
+    def set(self, metric, value, **labels):
+        """Set the value of metric for labels."""
+        self.set_values(metric, value, self._key(metric, labels)[1])
+
+    def set_values(self, metric, value, label_values):
+        """Set the value of metric for label values given as strings in the order of its label names."""
+        with self._lock:
+            child = self._child((metric, label_values), self.clock(), value)
+        child.set(value)
+
+    def set_many(self, metric, values):
+        """Set metric for many label sets at once, values being (labels, value) pairs."""
+        now = self.clock()
+        with self._lock:
+            children = [(self._child(self._key(metric, labels), now, value), value) for labels, value in values]
+        for child, value in children:
+            child.set(value)
+
+    def _remove(self, keys):
+        # Called with the lock held, so no series is set again between its selection and its removal
+        for key in keys:
+            del self._series[key]
+            metric, label_values = key
+            metric.remove(*label_values)
+        return len(keys)
+
+    def sweep(self, before):
+        """Remove the series that were not set since the timestamp before and return how many were removed."""
+        with self._lock:
+            keys = [key for key, series in self._series.items() if series[1] < before]
+            return self._remove(keys)
+
+    def evict(self, ttl):
+        """Remove the series that were not set for ttl seconds, never when ttl is 0."""
+        if not ttl:
+            return 0
+        removed = self.sweep(self.clock() - ttl)
+        if removed:
+            logger.info(f'Removed {removed} series not updated for {ttl} seconds')
+        return removed
+
+    def remove(self, **match):
+        """Remove every series whose labels include match, such as chain='BitSong', and return how many."""
+        items = {name: str(value) for name, value in match.items()}
+        with self._lock:
+            keys = [key for key in self._series
+                    if all(dict(zip(key[0]._labelnames, key[1])).get(name) == value for name, value in items.items())]
+            return self._remove(keys)
+
+    def items(self):
+        """Return the (metric, label values, value, last set) of every series."""
+        with self._lock:
+            return [(metric, label_values, value, last_set)
+                    for (metric, label_values), (_, last_set, value) in self._series.items()]
+
+    def restore(self, metric, label_values, value, last_set):
+        """Set a series to a value saved at last_set, unless it was set since."""
+        key = (metric, tuple(str(label_value) for label_value in label_values))
+        with self._lock:
+            if key in self._series:
+                return
+            child = metric.labels(*key[1])
+            self._series[key] = [child, last_set, value]
+        child.set(value)
+
+    def __len__(self):
+        return len(self._series)
+
+    def clear(self):
+        """Forget every series without removing them from the metrics."""
+        with self._lock:
+            self._series.clear()
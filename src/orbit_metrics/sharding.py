@@ -0,0 +1,94 @@
+import bisect
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from prometheus_client.core import GaugeMetricFamily, Metric
+from prometheus_client.parser import text_string_to_metric_families
+
+
+logger = logging.getLogger(__name__)
+
+
+def _hash(key):
+    # Stable across processes and restarts, unlike hash()
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], 'big')
+
+
+class HashRing:
+    """Consistent hashing of chain names onto shards.
+
+    Every shard owns points of a hash ring, and a chain belongs to the shard
+    owning the first point after the hash of its name. Growing from N to N + 1
+    shards only moves the chains taken over by the new shard's points, about
+    1 / (N + 1) of them.
+    """
+
+    def __init__(self, shards, points_per_shard=128):
+        self.shards = shards
+        ring = sorted((_hash(f'shard-{shard}-{point}'), shard)
+                      for shard in range(shards) for point in range(points_per_shard))
+        self._hashes = [point for point, _ in ring]
+        self._shards = [shard for _, shard in ring]
+
+    def shard_of(self, key):
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._shards[index]
+
+
+# Settings naming files or directories that every shard writes on its own, suffixed with the shard like the log file
+SHARD_PATHS = (('snapshot', 'path'), ('push', 'spill_path'))
+
+
+def shard_config(config, shard, shards):
+    """Return a copy of config keeping only the nodes of a shard, and the files of the shard apart from the others."""
+    if shards <= 1:
+        return config
+    ring = HashRing(shards)
+    sharded = dict(config)
+    sharded['nodes'] = [node for node in config['nodes'] if ring.shard_of(node['name']) == shard]
+    for section, key in SHARD_PATHS:
+        if (config.get(section) or {}).get(key):
+            sharded[section] = dict(config[section], **{key: f'{config[section][key]}.shard{shard}'})
+    logger.info(f"Shard {shard} of {shards} collects {len(sharded['nodes'])} of {len(config['nodes'])} chains")
+    return sharded
+
+
+class ShardAggregator:
+    """Collector serving the metrics of every shard worker as one exposition.
+
+    Families with a chain label are merged as they are, since every chain is
+    collected by a single shard. The others, such as the cycle duration or the
+    process metrics of the workers, get a shard label to keep them apart.
+    """
+
+    def __init__(self, urls, timeout=10):
+        self.urls = urls
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=len(urls))
+
+    def _scrape(self, url):
+        try:
+            response = requests.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            return list(text_string_to_metric_families(response.text))
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error(f'Failed to scrape shard worker {url}: {e}')
+            return None
+
+    def collect(self):
+        up = GaugeMetricFamily('orbit_metrics_shard_up', 'Whether the last scrape of a shard worker succeeded',
+                               labels=['shard'])
+        merged = {}
+        for shard, families in enumerate(self._executor.map(self._scrape, self.urls)):
+            up.add_metric([str(shard)], 0 if families is None else 1)
+            for family in families or []:
+                has_chain = any('chain' in sample.labels for sample in family.samples)
+                target = merged.get(family.name)
+                if target is None:
+                    target = merged[family.name] = Metric(family.name, family.documentation, family.type, family.unit)
+                target.samples.extend(sample if has_chain else sample._replace(labels=dict(sample.labels, shard=str(shard)))
+                                      for sample in family.samples)
+        yield up
+        yield from merged.values()
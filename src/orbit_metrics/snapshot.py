@@ -0,0 +1,83 @@
+import logging
+import os
+
+from orbit_metrics.metrics import exported_metrics, last_success_gauge
+from orbit_metrics.parsing import dumps, loads
+
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+# Groups left out of snapshots, the latest block data they go with is kept by the API client
+SKIPPED_GROUPS = ('height', 'blocks')
+
+
+def _cache_key(key):
+    # JSON turns the tuples of cache keys, such as the (address, 'denoms') balance items, into lists
+    return tuple(_cache_key(part) if isinstance(part, list) else part for part in key)
+
+
+def write_snapshot(path, cache, series, written_at):
+    """Write the cached values, exported series and last success times to path.
+
+    The snapshot is written to a temporary file first and renamed over path, so
+    a crash while writing never leaves a truncated snapshot behind.
+    """
+    data = {
+        'version': SNAPSHOT_VERSION,
+        'written_at': written_at,
+        'cache': [list(entry) for entry in cache.entries() if entry[0][1] not in SKIPPED_GROUPS],
+        'series': [[metric._name, label_values, value, last_set]
+                   for metric, label_values, value, last_set in series.items()],
+        'last_success': [[sample.labels['chain'], sample.labels['group'], sample.value]
+                         for metric in last_success_gauge.collect() for sample in metric.samples],
+    }
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'wb') as file:
+        file.write(dumps(data))
+    os.replace(temporary_path, path)
+
+
+def read_snapshot(path, config, cache, series):
+    """Restore the state saved in the snapshot at path for the chains of config.
+
+    Restored cache entries and series keep the time they were fetched and set,
+    so they expire and are evicted as if the exporter had not restarted. Return
+    the time the snapshot was written, or None when there is no usable snapshot.
+    """
+    try:
+        with open(path, 'rb') as file:
+            data = loads(file.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f'Ignoring the unreadable snapshot {path}: {e}')
+        return None
+    if not isinstance(data, dict) or data.get('version') != SNAPSHOT_VERSION:
+        logger.warning(f'Ignoring the snapshot {path} written by another version of the exporter')
+        return None
+
+    chains = {node['name'] for node in config['nodes']}
+    metrics = {metric._name: metric for metric in exported_metrics()}
+    try:
+        for key, value, fetched_at, ttl, version in data['cache']:
+            if key[0] in chains:
+                cache.restore(_cache_key(key), value, fetched_at, ttl, version)
+        restored = 0
+        for name, label_values, value, last_set in data['series']:
+            metric = metrics.get(name)
+            if metric is None or len(label_values) != len(metric._labelnames) or \
+                    dict(zip(metric._labelnames, label_values)).get('chain') not in chains:
+                continue
+            series.restore(metric, label_values, value, last_set)
+            restored += 1
+        for chain, group, value in data['last_success']:
+            if chain in chains:
+                last_success_gauge.labels(chain=chain, group=group).set(value)
+    except (KeyError, TypeError, ValueError) as e:
+        logger.warning(f'Ignoring the rest of the malformed snapshot {path}: {e}')
+        return None
+
+    logger.info(f'Restored {restored} series from the snapshot {path} written at {data["written_at"]}')
+    return data['written_at']
@@ -0,0 +1,166 @@
+import base64
+import hashlib
+import threading
+
+BECH32_CHARSET = 'qpzry9x8gf2tvdw0s3jn54khce6mua7l'
+
+# Votes counted as signed by the slashing module, which only penalizes absent validators
+BLOCK_ID_FLAG_ABSENT = 'BLOCK_ID_FLAG_ABSENT'
+
+
+def _bech32_polymod(values):
+    generator = [0x3b6a57b2, 0x26508e6d, 0x1ea119fa, 0x3d4233dd, 0x2a1462b3]
+    checksum = 1
+    for value in values:
+        top = checksum >> 25
+        checksum = (checksum & 0x1ffffff) << 5 ^ value
+        for index in range(5):
+            checksum ^= generator[index] if (top >> index) & 1 else 0
+    return checksum
+
+
+def bech32_encode(hrp, data):
+    """Encode bytes as a bech32 address with the human-readable part hrp."""
+    words, accumulator, bits = [], 0, 0
+    for byte in data:  # Regroup the 8-bit bytes into 5-bit words
+        accumulator = accumulator << 8 | byte
+        bits += 8
+        while bits >= 5:
+            bits -= 5
+            words.append(accumulator >> bits & 31)
+    if bits:
+        words.append(accumulator << (5 - bits) & 31)
+
+    expanded_hrp = [ord(char) >> 5 for char in hrp] + [0] + [ord(char) & 31 for char in hrp]
+    polymod = _bech32_polymod(expanded_hrp + words + [0] * 6) ^ 1
+    checksum = [polymod >> 5 * (5 - index) & 31 for index in range(6)]
+    return hrp + '1' + ''.join(BECH32_CHARSET[word] for word in words + checksum)
+
+
+def consensus_address(pubkey):
+    """Return the consensus address bytes of an ed25519 consensus public key, None for other key types."""
+    if not pubkey or not str(pubkey.get('@type', '')).endswith('ed25519.PubKey'):
+        return None
+    return hashlib.sha256(base64.b64decode(pubkey['key'])).digest()[:20]
+
+
+def valcons_address(operator_address, address):
+    """Return the bech32 consensus address of a validator, as used by its signing info."""
+    hrp = operator_address.rpartition('1')[0].replace('valoper', 'valcons')
+    return bech32_encode(hrp, address)
+
+
+def commit_signers(block_data):
+    """Return the height of the commit included in a block and the base64 addresses of the validators that signed it."""
+    commit = block_data['block']['last_commit']
+    signers = {signature['validator_address'] for signature in commit.get('signatures') or []
+               if signature.get('validator_address') and signature.get('block_id_flag') != BLOCK_ID_FLAG_ABSENT}
+    return int(commit['height']), signers
+
+
+class SigningWindow:
+    """Bit-packed ring buffer of the blocks a validator signed among the last window heights.
+
+    Two bits per height (observed and missed) bound the memory to window / 4
+    bytes per validator, and the counters are updated as heights are overwritten.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.observed_bits = bytearray((window + 7) // 8)
+        self.missed_bits = bytearray((window + 7) // 8)
+        self.observed = 0
+        self.missed = 0
+
+    def _forget(self, position):
+        byte, mask = position // 8, 1 << position % 8
+        if self.observed_bits[byte] & mask:
+            self.observed -= 1
+            self.observed_bits[byte] &= ~mask
+        if self.missed_bits[byte] & mask:
+            self.missed -= 1
+            self.missed_bits[byte] &= ~mask
+
+    def clear(self, height):
+        """Mark a height of the window as not observed."""
+        self._forget(height % self.window)
+
+    def record(self, height, signed):
+        position = height % self.window
+        self._forget(position)
+        byte, mask = position // 8, 1 << position % 8
+        self.observed_bits[byte] |= mask
+        self.observed += 1
+        if not signed:
+            self.missed_bits[byte] |= mask
+            self.missed += 1
+
+    @property
+    def missed_ratio(self):
+        return self.missed / self.observed if self.observed else None
+
+
+class UptimeTracker:
+    """Signing windows of the monitored validators of a chain, fed with consecutive block commits.
+
+    Commits are recorded incrementally from the last recorded height, heights
+    that could not be fetched are cleared instead of being kept from a previous
+    pass over the window.
+    """
+
+    def __init__(self):
+        self.window = None  # signed_blocks_window of the chain, None until the slashing params are known
+        self.addresses = {}  # operator address -> consensus address bytes
+        self.windows = {}  # operator address -> SigningWindow
+        self.last_height = None  # Height of the last recorded commit
+        self._lock = threading.Lock()
+
+    def track(self, operator_address, pubkey):
+        """Track the validator with the given consensus public key."""
+        address = consensus_address(pubkey)
+        if address is None:
+            return
+        with self._lock:
+            if self.addresses.get(operator_address) != address:
+                self.addresses[operator_address] = address
+                if self.window:
+                    self.windows[operator_address] = SigningWindow(self.window)
+
+    def resize(self, window):
+        """Set the signed blocks window, restarting every signing window when it changed."""
+        with self._lock:
+            if window == self.window:
+                return
+            self.window = window
+            self.windows = {operator_address: SigningWindow(window) for operator_address in self.addresses}
+            self.last_height = None
+
+    def missing_blocks(self, latest_height, max_backfill):
+        """Return the heights of the blocks to fetch to record every commit up to the latest block.
+
+        The latest block itself carries the commit of the height before it, so
+        it is not included. At most the max_backfill most recent blocks are returned.
+        """
+        if self.last_height is None or not self.window:
+            return []
+        first = max(self.last_height + 2, latest_height - max_backfill)
+        return list(range(first, latest_height))
+
+    def record_commit(self, height, signers):
+        """Record which validators signed the commit of height, ignoring heights already recorded."""
+        with self._lock:
+            if not self.window or (self.last_height is not None and height <= self.last_height):
+                return
+            if self.last_height is not None:
+                for skipped in range(max(self.last_height + 1, height - self.window + 1), height):
+                    for window in self.windows.values():
+                        window.clear(skipped)
+            for operator_address, window in self.windows.items():
+                window.record(height, base64.b64encode(self.addresses[operator_address]).decode() in signers)
+            self.last_height = height
+
+    def missed_ratios(self):
+        """Return the ratio of missed blocks among the observed ones of every validator with observations."""
+        with self._lock:
+            return {operator_address: window.missed_ratio for operator_address, window in self.windows.items()
+                    if window.observed}
@@ -1,22 +1,29 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
+import requests
 from unittest.mock import patch, MagicMock
-from orbit_metrics.api_client import APIClient
+from orbit_metrics.api_client import APIClient, ETagCache, build_session, clear_clients, get_client
+from orbit_metrics.endpoints import EndpointPool
+from orbit_metrics.resilience import retry_budget
 
 @pytest.fixture
 def api_client():
     return APIClient("http://fake_api_url")
 
 def test_fetch_distribution_params(api_client):
-    with patch("requests.get") as mock_get:
+    with patch("requests.Session.get") as mock_get:
         mock_response = MagicMock()
-        mock_response.json.return_value = {
+        mock_response.content = json.dumps({
             "params": {
                 "community_tax": "0.020000000000000000",
                 "base_proposer_reward": "0.010000000000000000",
                 "bonus_proposer_reward": "0.040000000000000000",
                 "withdraw_addr_enabled": True
             }
-        }
+        }).encode()
         mock_get.return_value = mock_response
         mock_get.return_value.status_code = 200
 
@@ -24,9 +31,9 @@ def test_fetch_distribution_params(api_client):
         assert params['community_tax'] == "0.020000000000000000"
 
 def test_fetch_mint_params(api_client):
-    with patch("requests.get") as mock_get:
+    with patch("requests.Session.get") as mock_get:
         mock_response = MagicMock()
-        mock_response.json.return_value = {
+        mock_response.content = json.dumps({
             "params": {
                 "mint_denom": "ubtsg",
                 "inflation_rate_change": "0.130000000000000000",
@@ -35,7 +42,7 @@ def test_fetch_mint_params(api_client):
                 "goal_bonded": "0.670000000000000000",
                 "blocks_per_year": "5733820"
             }
-        }
+        }).encode()
         mock_get.return_value = mock_response
         mock_get.return_value.status_code = 200
 
@@ -43,9 +50,9 @@ def test_fetch_mint_params(api_client):
         assert params['mint_denom'] == "ubtsg"
 
 def test_fetch_slashing_params(api_client):
-    with patch("requests.get") as mock_get:
+    with patch("requests.Session.get") as mock_get:
         mock_response = MagicMock()
-        mock_response.json.return_value = {
+        mock_response.content = json.dumps({
             "params": {
                 "signed_blocks_window": "10000",
                 "min_signed_per_window": "0.050000000000000000",
@@ -53,7 +60,7 @@ def test_fetch_slashing_params(api_client):
                 "slash_fraction_double_sign": "0.050000000000000000",
                 "slash_fraction_downtime": "0.010000000000000000"
             }
-        }
+        }).encode()
         mock_get.return_value = mock_response
         mock_get.return_value.status_code = 200
 
@@ -61,16 +68,220 @@ def test_fetch_slashing_params(api_client):
         assert params['signed_blocks_window'] == "10000"
 
 def test_fetch_staking_pool(api_client):
-    with patch("requests.get") as mock_get:
+    with patch("requests.Session.get") as mock_get:
         mock_response = MagicMock()
-        mock_response.json.return_value = {
+        mock_response.content = json.dumps({
             "pool": {
                 "not_bonded_tokens": "10968485993366",
                 "bonded_tokens": "74343129493578"
             }
-        }
+        }).encode()
         mock_get.return_value = mock_response
         mock_get.return_value.status_code = 200
 
         pool = api_client.fetch_staking_pool()
         assert pool['not_bonded_tokens'] == "10968485993366"
+
+def test_get_client_reuses_client_per_api_url():
+    clear_clients()
+    with patch("requests.Session.get") as mock_get:
+        client = get_client("http://fake_api_url")
+        assert get_client("http://fake_api_url") is client
+        assert get_client("http://other_api_url") is not client
+        mock_get.assert_not_called()  # The node info is fetched by the first cycle
+    clear_clients()
+
+def test_concurrent_first_calls_share_one_client():
+    clear_clients()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        clients = list(executor.map(lambda _: get_client("http://fake_api_url"), range(8)))
+    assert all(client is clients[0] for client in clients)
+    clear_clients()
+
+def test_build_session_settings():
+    session = build_session({"pool_maxsize": 3, "keep_alive": False})
+    adapter = session.get_adapter("https://fake_api_url")
+    assert adapter._pool_maxsize == 3
+    assert session.headers["Connection"] == "close"
+
+def test_fetch_validators_follows_pagination(api_client):
+    with patch("requests.Session.get") as mock_get:
+        first_page = MagicMock()
+        first_page.content = json.dumps({
+            "validators": [{"operator_address": "valoper1", "tokens": "100"}],
+            "pagination": {"next_key": "a2V5", "total": "2"}
+        }).encode()
+        second_page = MagicMock()
+        second_page.content = json.dumps({
+            "validators": [{"operator_address": "valoper2", "tokens": "200"}],
+            "pagination": {"next_key": None, "total": "0"}
+        }).encode()
+        mock_get.side_effect = [first_page, second_page]
+
+        validators = api_client.fetch_validators()
+        assert [v["operator_address"] for v in validators] == ["valoper1", "valoper2"]
+        assert mock_get.call_args_list[1].kwargs["params"]["pagination.key"] == "a2V5"
+        assert len(api_client._etags) == 0  # The validator set is cached by the exporter, not here
+
+def test_etag_cache_drops_least_recently_used_bodies():
+    etags = ETagCache(max_entries=2)
+    etags.put("a", '"1"', {"a": 1})
+    etags.put("b", '"1"', {"b": 1})
+    assert etags.get("a") == ('"1"', {"a": 1})
+    etags.put("c", '"1"', {"c": 1})
+    assert etags.get("b") is None
+    assert sorted(etags) == ["a", "c"]
+
+def test_prefers_validator_set(api_client):
+    assert not api_client.prefers_validator_set(1)
+    assert api_client.prefers_validator_set(APIClient.BULK_VALIDATORS_THRESHOLD)
+
+def test_get_json_revalidates_with_etag(api_client):
+    with patch("requests.Session.get") as mock_get:
+        first = MagicMock(status_code=200, headers={"ETag": '"v1"'})
+        first.content = json.dumps({"pool": {"bonded_tokens": "1", "not_bonded_tokens": "2"}}).encode()
+        not_modified = MagicMock(status_code=304, headers={})
+        mock_get.side_effect = [first, not_modified]
+
+        assert api_client.fetch_staking_pool()["bonded_tokens"] == "1"
+        assert api_client.fetch_staking_pool()["bonded_tokens"] == "1"
+        assert mock_get.call_args_list[1].kwargs["headers"] == {"If-None-Match": '"v1"'}
+
+def test_get_json_fails_over_to_next_endpoint():
+    with patch.object(APIClient, "fetch_node_info"):
+        client = APIClient("http://primary", endpoints=EndpointPool(["http://primary", "http://backup"]))
+
+    with patch("requests.Session.get") as mock_get:
+        response = MagicMock(status_code=200, headers={})
+        response.content = json.dumps({"pool": {"bonded_tokens": "1", "not_bonded_tokens": "2"}}).encode()
+        mock_get.side_effect = [requests.exceptions.ConnectionError("down"), response]
+
+        assert client.fetch_staking_pool()["bonded_tokens"] == "1"
+        assert mock_get.call_args_list[1].args[0] == "http://backup/cosmos/staking/v1beta1/pool"
+        assert client.endpoints.ranked() == ["http://backup", "http://primary"]
+
+def test_get_json_does_not_fail_over_on_client_errors():
+    with patch.object(APIClient, "fetch_node_info"):
+        client = APIClient("http://primary", endpoints=EndpointPool(["http://primary", "http://backup"]))
+
+    with patch("requests.Session.get") as mock_get:
+        response = MagicMock(status_code=404, headers={})
+        response.raise_for_status.side_effect = requests.exceptions.HTTPError("not found", response=response)
+        mock_get.return_value = response
+
+        assert client.fetch_mint_params() is None
+        assert mock_get.call_count == 1
+
+def test_get_json_hedges_slow_endpoint():
+    endpoints = EndpointPool(["http://slow", "http://fast"], hedge=True)
+    endpoints.record_success("http://slow", 0.01)
+    with patch.object(APIClient, "fetch_node_info"):
+        client = APIClient("http://slow", endpoints=endpoints)
+
+    def get(url, **kwargs):
+        if url.startswith("http://slow"):
+            time.sleep(0.5)
+        response = MagicMock(status_code=200, headers={})
+        response.content = json.dumps({"pool": {"bonded_tokens": url}}).encode()
+        return response
+
+    with patch("requests.Session.get", side_effect=get):
+        assert client.fetch_staking_pool()["bonded_tokens"].startswith("http://fast")
+
+def test_request_retries_within_budget():
+    with patch.object(APIClient, "fetch_node_info"):
+        client = APIClient("http://flaky", http_settings={"retries": 3})
+
+    retry_budget.reset(1)
+    try:
+        with patch("requests.Session.get", side_effect=requests.exceptions.ConnectionError("down")) as mock_get, \
+                patch("orbit_metrics.api_client.time.sleep") as mock_sleep:
+            assert client.fetch_mint_params() is None
+            assert mock_get.call_count == 2
+            assert mock_sleep.call_count == 1
+    finally:
+        retry_budget.reset(0)
+
+def test_open_circuit_breaker_fails_fast():
+    endpoints = EndpointPool(["http://down"], breaker_threshold=2)
+    with patch.object(APIClient, "fetch_node_info"):
+        client = APIClient("http://down", endpoints=endpoints)
+
+    with patch("requests.Session.get", side_effect=requests.exceptions.ConnectionError("down")) as mock_get:
+        assert client.fetch_mint_params() is None
+        assert client.fetch_mint_params() is None
+        assert client.fetch_mint_params() is None
+        assert mock_get.call_count == 2
+
+def test_fetch_wallet_balance_queries_single_denom(api_client):
+    with patch("requests.Session.get") as mock_get:
+        response = MagicMock(status_code=200, headers={})
+        response.content = json.dumps({"balance": {"denom": "ubtsg", "amount": "1500"}}).encode()
+        mock_get.return_value = response
+
+        assert api_client.fetch_wallet_balance("bitsong1abc", "ubtsg") == 1500.0
+        assert mock_get.call_args.args[0] == "http://fake_api_url/cosmos/bank/v1beta1/balances/bitsong1abc/by_denom"
+        assert mock_get.call_args.kwargs["params"] == {"denom": "ubtsg"}
+
+def test_fetch_wallet_balances_returns_every_denom(api_client):
+    with patch("requests.Session.get") as mock_get:
+        response = MagicMock(status_code=200, headers={})
+        response.content = json.dumps({
+            "balances": [{"denom": "ibc/27394FB0", "amount": "7"}, {"denom": "ubtsg", "amount": "1500"}],
+            "pagination": {"next_key": None, "total": "2"}
+        }).encode()
+        mock_get.return_value = response
+
+        assert api_client.fetch_wallet_balances("bitsong1abc") == {"ibc/27394FB0": 7.0, "ubtsg": 1500.0}
+        assert mock_get.call_count == 1
+
+def test_fetchers_return_none_on_null_payloads(api_client):
+    with patch("requests.Session.get") as mock_get:
+        response = MagicMock(status_code=200, headers={})
+        response.content = json.dumps({"balances": None, "validators": None, "info": None,
+                                       "validator": {"tokens": None}}).encode()
+        mock_get.return_value = response
+
+        assert api_client.fetch_wallet_balances("bitsong1abc") is None
+        assert api_client.fetch_validators() is None
+        assert api_client.fetch_signing_infos() is None
+        assert api_client.fetch_validator_stake("bitsongvaloper1abc") is None
+
+def test_fetch_validator_delegations_streams_pages(api_client):
+    def page(amounts, next_key):
+        response = MagicMock(status_code=200, headers={"ETag": '"v1"'})
+        response.content = json.dumps({
+            "delegation_responses": [{"delegation": {"delegator_address": delegator},
+                                      "balance": {"denom": "ubtsg", "amount": str(amount)}}
+                                     for delegator, amount in amounts],
+            "pagination": {"next_key": next_key}
+        }).encode()
+        return response
+
+    with patch("requests.Session.get") as mock_get:
+        mock_get.side_effect = [page([("d1", 5), ("d2", 50)], "a2V5"), page([("d3", 20), ("d4", 1)], None)]
+
+        delegations = api_client.fetch_validator_delegations("bitsongvaloper1abc", 2)
+        assert delegations == {"delegators": 4, "tokens": 76.0, "top": [["d2", 50.0], ["d3", 20.0]]}
+        assert mock_get.call_args_list[1].kwargs["params"]["pagination.key"] == "a2V5"
+        assert len(api_client._etags) == 0  # The pages are not kept for revalidation
+
+def test_fetch_validator_rewards(api_client):
+    with patch("requests.Session.get") as mock_get:
+        rewards = MagicMock(status_code=200, headers={})
+        rewards.content = json.dumps({"rewards": {"rewards": [{"denom": "ubtsg", "amount": "12.5"}]}}).encode()
+        commission = MagicMock(status_code=200, headers={})
+        commission.content = json.dumps({"commission": {"commission": []}}).encode()
+        mock_get.side_effect = [rewards, commission]
+
+        assert api_client.fetch_validator_rewards("bitsongvaloper1abc") == {
+            "outstanding_rewards": {"ubtsg": 12.5}, "commission": {}}
+
+def test_fetch_blocks_does_not_keep_blocks_for_revalidation(api_client):
+    with patch("requests.Session.get") as mock_get:
+        response = MagicMock(status_code=200, headers={"ETag": '"v1"'})
+        response.content = json.dumps({"block": {"header": {"height": "5"}}}).encode()
+        mock_get.return_value = response
+
+        assert len(api_client.fetch_blocks([5, 6])) == 2
+        assert len(api_client._etags) == 0
@@ -0,0 +1,160 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from prometheus_client import REGISTRY
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+
+from orbit_metrics import exporter
+from orbit_metrics.async_client import AsyncAPIClient, AsyncClientPool
+
+
+RESPONSES = {
+    "/cosmos/base/tendermint/v1beta1/node_info": {
+        "default_node_info": {"moniker": "node-a", "network": "chain-a"}
+    },
+    "/cosmos/base/tendermint/v1beta1/blocks/latest": {
+        "block": {"header": {"height": "18722229", "chain_id": "chain-a"}}
+    },
+    "/cosmos/bank/v1beta1/balances/addressA1": {
+        "balances": [{"denom": "uother", "amount": "1"}, {"denom": "udenom", "amount": "250"}]
+    },
+    "/cosmos/bank/v1beta1/balances/addressA1/by_denom": {
+        "balance": {"denom": "udenom", "amount": "250"}
+    },
+    "/cosmos/base/tendermint/v1beta1/blocks/5": {
+        "block": {"header": {"height": "5", "chain_id": "chain-a"}}
+    },
+    "/cosmos/staking/v1beta1/validators/valoperA": {
+        "validator": {"operator_address": "valoperA", "tokens": "1000", "status": "BOND_STATUS_BONDED"}
+    },
+    "/cosmos/staking/v1beta1/validators/valoperA/delegations": {
+        "delegation_responses": [{"delegation": {"delegator_address": "d1"}, "balance": {"amount": "600"}},
+                                 {"delegation": {"delegator_address": "d2"}, "balance": {"amount": "400"}}],
+        "pagination": {"next_key": None}
+    },
+    "/cosmos/distribution/v1beta1/validators/valoperA/outstanding_rewards": {
+        "rewards": {"rewards": [{"denom": "udenom", "amount": "12.5"}]}
+    },
+    "/cosmos/distribution/v1beta1/validators/valoperA/commission": {
+        "commission": {"commission": [{"denom": "udenom", "amount": "2.5"}]}
+    },
+    "/cosmos/staking/v1beta1/pool": {
+        "pool": {"not_bonded_tokens": "10968485993366", "bonded_tokens": "74343129493578"}
+    },
+}
+
+
+async def handle(request):
+    if request.path not in RESPONSES:
+        raise web.HTTPNotFound()
+    return web.json_response(RESPONSES[request.path], headers={"ETag": '"v1"'})
+
+
+def serve_in_thread():
+    """Serve RESPONSES from an event loop of its own, for the blocking fetch_metrics, and return (url, stop)."""
+    loop = asyncio.new_event_loop()
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", handle)
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    def stop():
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result(5)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(5)
+        loop.close()
+
+    return f"http://127.0.0.1:{runner.addresses[0][1]}", stop
+
+
+async def with_client(test):
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    try:
+        async with aiohttp.ClientSession() as session:
+            return await test(AsyncAPIClient(f"http://127.0.0.1:{port}", session))
+    finally:
+        await runner.cleanup()
+
+
+def test_async_client_fetches_like_api_client():
+    async def test(client):
+        await client.fetch_node_info()
+        return (client.moniker, client.chain_id, await client.fetch_chain_height(),
+                await client.fetch_wallet_balance("addressA1", "udenom"),
+                await client.fetch_wallet_balances("addressA1"), await client.fetch_staking_pool())
+
+    moniker, chain_id, height, balance, balances, pool = asyncio.run(with_client(test))
+    assert (moniker, chain_id, height, balance) == ("node-a", "chain-a", 18722229, 250.0)
+    assert balances == {"uother": 1.0, "udenom": 250.0}
+    assert pool["bonded_tokens"] == "74343129493578"
+
+
+def test_async_client_returns_none_on_errors():
+    async def test(client):
+        return await client.fetch_mint_params()
+
+    assert asyncio.run(with_client(test)) is None
+
+
+def test_async_client_pool_reuses_clients():
+    pool = AsyncClientPool({"max_workers": 10, "max_per_host": 2}, {"keep_alive": True})
+
+    async def test():
+        return pool.get_client("http://fake_api_url"), pool.get_client("http://fake_api_url")
+
+    first, second = pool.run(test())
+    assert first is second
+    pool.close()
+
+
+def test_async_client_does_not_keep_blocks_for_revalidation():
+    async def test(client):
+        await client.fetch_staking_pool()
+        blocks = await client.fetch_blocks([5])
+        return blocks, [url for url, _ in client._etags]
+
+    blocks, revalidated = asyncio.run(with_client(test))
+    assert blocks[0]["block"]["header"]["height"] == "5"
+    assert [url.rpartition("/cosmos")[2] for url in revalidated] == ["/staking/v1beta1/pool"]
+
+
+def test_async_engine_exports_rewards_and_delegations():
+    url, stop = serve_in_thread()
+    config = {
+        "exporter": {"engine": "async"},
+        "delegations": {"enabled": True, "top_n": 1},
+        "uptime": {"enabled": False},
+        "nodes": [{"name": "ChainAsync", "api_url": url, "validators": [{"validator_id": "valoperA"}]}],
+    }
+    try:
+        exporter.fetch_metrics(config)
+        for _ in range(200):  # The delegations are collected in the background with the pooled sync client
+            if not exporter.background.running(("ChainAsync", "delegations", "valoperA")):
+                break
+            time.sleep(0.01)
+        exporter.fetch_metrics(config)
+    finally:
+        exporter.async_pool.close()
+        exporter.async_pool = None
+        stop()
+
+    labels = {"chain": "ChainAsync", "chain_id": "chain-a", "validator": "valoperA"}
+    assert REGISTRY.get_sample_value("orbit_metrics_validator_outstanding_rewards", dict(labels, denom="udenom")) == 12.5
+    assert REGISTRY.get_sample_value("orbit_metrics_validator_commission", dict(labels, denom="udenom")) == 2.5
+    assert REGISTRY.get_sample_value("orbit_metrics_validator_delegators", labels) == 2
+    assert REGISTRY.get_sample_value("orbit_metrics_validator_top_delegation",
+                                     dict(labels, rank="1", delegator="d1")) == 600
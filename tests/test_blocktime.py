@@ -0,0 +1,47 @@
+import pytest
+from orbit_metrics.blocktime import HeaderWindow, block_header, header_time
+
+
+def test_header_time_parses_nanoseconds():
+    assert header_time("2024-05-01T12:00:00Z") == 1714564800.0
+    assert header_time("2024-05-01T12:00:00.250000000Z") == pytest.approx(1714564800.25)
+
+
+def test_block_header():
+    block = {"block": {"header": {"height": "42", "time": "2024-05-01T12:00:06.5Z"}}}
+    assert block_header(block) == (42, 1714564806.5)
+
+
+def test_header_window_ignores_recorded_heights():
+    window = HeaderWindow(4)
+    assert window.last_height is None and window.block_time() is None
+    window.record(10, 100.0)
+    window.record(10, 200.0)
+    window.record(9, 90.0)
+    assert (window.count, window.last_height, window.last_time) == (1, 10, 100.0)
+    assert window.block_time() is None
+
+
+def test_header_window_wraps_around():
+    window = HeaderWindow(3)
+    for height in range(1, 6):
+        window.record(height, height * 6.0)
+    assert window.count == 3
+    assert sorted(window.heights) == [3, 4, 5]
+    assert window.block_time() == 6.0
+
+
+def test_block_time_ignores_gaps():
+    window = HeaderWindow(10)
+    window.record(100, 0.0)
+    window.record(110, 50.0)  # Blocks 101 to 109 were not backfilled
+    assert window.block_time() == 5.0
+
+
+def test_missing_blocks():
+    window = HeaderWindow(10)
+    assert window.missing_blocks(200, 5) == []  # Nothing recorded yet
+    window.record(100, 0.0)
+    assert window.missing_blocks(104, 5) == [101, 102, 103]
+    assert window.missing_blocks(200, 5) == [195, 196, 197, 198, 199]
+    assert window.missing_blocks(101, 5) == []
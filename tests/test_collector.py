@@ -0,0 +1,47 @@
+import threading
+import time
+from unittest.mock import patch
+
+from prometheus_client import CollectorRegistry, Gauge, generate_latest
+
+from orbit_metrics.collector import ScrapeCollector
+
+
+def make_collector(min_age=10):
+    registry = CollectorRegistry()
+    gauge = Gauge('test_scrape_gauge', 'Test gauge', ['chain'], registry=None)
+    collector = ScrapeCollector({'nodes': []}, min_age, metrics=[gauge])
+    registry.register(collector)
+    return registry, gauge, collector
+
+
+def test_scrape_collector_reuses_recent_collection():
+    with patch('orbit_metrics.collector.fetch_metrics') as mock_fetch:
+        registry, gauge, _ = make_collector()
+        mock_fetch.side_effect = lambda config: gauge.labels(chain='ChainA').set(7)
+
+        assert b'test_scrape_gauge{chain="ChainA"} 7.0' in generate_latest(registry)
+        generate_latest(registry)
+        mock_fetch.assert_called_once()
+
+
+def test_scrape_collector_coalesces_concurrent_scrapes():
+    with patch('orbit_metrics.collector.fetch_metrics') as mock_fetch:
+        registry, _, _ = make_collector()
+        mock_fetch.side_effect = lambda config: time.sleep(0.1)
+
+        threads = [threading.Thread(target=generate_latest, args=(registry,)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        mock_fetch.assert_called_once()
+
+
+def test_scrape_collector_refreshes_after_min_age():
+    with patch('orbit_metrics.collector.fetch_metrics') as mock_fetch:
+        registry, _, collector = make_collector(min_age=0)
+        generate_latest(registry)
+        generate_latest(registry)
+        assert mock_fetch.call_count == 2
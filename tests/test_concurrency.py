@@ -0,0 +1,72 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import pytest
+
+from orbit_metrics.concurrency import BackgroundRunner, HostLimiter
+
+
+def test_host_limiter_bounds_in_flight_tasks_per_host():
+    lock = threading.Lock()
+    in_flight = {'a': 0, 'b': 0}
+    peak = {'a': 0, 'b': 0}
+
+    def task(host):
+        with lock:
+            in_flight[host] += 1
+            peak[host] = max(peak[host], in_flight[host])
+        time.sleep(0.02)
+        with lock:
+            in_flight[host] -= 1
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        limiter = HostLimiter(executor, 2)
+        futures = [limiter.submit(f'http://{host}.example.com/path{i}', task, host)
+                   for i, host in enumerate('ab' * 4)]
+        wait(futures)
+
+    assert peak == {'a': 2, 'b': 2}
+
+
+def test_host_limiter_returns_result_and_exception():
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        limiter = HostLimiter(executor, 1)
+        assert limiter.submit('http://a.example.com', lambda x: x * 2, 21).result(5) == 42
+        with pytest.raises(ZeroDivisionError):
+            limiter.submit('http://a.example.com', lambda x: x / 0, 21).result(5)
+        assert limiter.submit('http://a.example.com', lambda: 'slot released').result(5) == 'slot released'
+
+
+def test_host_limiter_does_not_hold_workers_for_a_busy_host():
+    released = threading.Event()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        limiter = HostLimiter(executor, 1)
+        slow = [limiter.submit('http://slow.example.com', released.wait, 5) for _ in range(3)]
+        assert limiter.submit('http://fast.example.com', lambda: 'done').result(1) == 'done'
+        assert not any(future.done() for future in slow)
+        released.set()
+        assert all(future.result(5) for future in slow)
+
+
+def test_background_runner_skips_running_jobs():
+    runner = BackgroundRunner(2)
+    released = threading.Event()
+    calls = []
+
+    def job(name):
+        calls.append(name)
+        released.wait(5)
+
+    assert runner.submit('key', job, 'first')
+    assert not runner.submit('key', job, 'second')
+    assert runner.running('key')
+    released.set()
+    for _ in range(100):
+        if not runner.running('key'):
+            break
+        time.sleep(0.01)
+    assert not runner.running('key')
+    assert runner.submit('key', job, 'third')
+    time.sleep(0.05)
+    assert calls == ['first', 'third']
@@ -1,7 +1,7 @@
 # tests/test_config.py
 
 import pytest
-from orbit_metrics.config import load_config
+from orbit_metrics.config import ConfigError, load_config, validate_config
 
 def test_load_config_valid():
     config = load_config("tests/valid_config.yml")  # Replace with a valid config file path
@@ -12,3 +12,70 @@ def test_load_config_valid():
 def test_load_config_invalid():
     with pytest.raises(FileNotFoundError):
         load_config("non_existent_config.yml")
+
+def test_validate_config_accepts_valid_config():
+    validate_config(load_config("tests/valid_config.yml"))
+
+def test_validate_config_reports_every_problem():
+    config = {
+        "nodes": [
+            {"name": "ChainA", "api_url": "http://api.chainA.com", "main_denom": "udenom",
+             "wallets": [{"type": "validator"}]},
+            {"name": "ChainA", "main_denom": "udenom"},
+        ],
+        "exporter": {"engine": "fibers"},
+        "http": {"read_timeout": "slow", "keep_alives": True},
+    }
+    with pytest.raises(ConfigError) as error:
+        validate_config(config)
+    message = str(error.value)
+    for problem in ["Node ChainA has a wallet without address", "Node ChainA is defined more than once",
+                    "Node ChainA has no api_url", "exporter.engine must be one of threads, async",
+                    "http.read_timeout must be a non-negative number", "Unknown setting http.keep_alives"]:
+        assert problem in message
+
+def test_validate_config_requires_nodes():
+    with pytest.raises(ConfigError):
+        validate_config({"nodes": []})
+
+def test_validate_config_requires_whole_shards():
+    node = {"name": "ChainA", "api_url": "http://api.chainA.com", "main_denom": "udenom"}
+    for shards in (0, 1.5):
+        with pytest.raises(ConfigError, match="sharding.shards must be a positive integer"):
+            validate_config({"nodes": [node], "sharding": {"shards": shards}})
+
+def test_validate_config_requires_positive_counts():
+    node = {"name": "ChainA", "api_url": "http://api.chainA.com", "main_denom": "udenom"}
+    config = {"nodes": [node], "concurrency": {"max_workers": 0, "max_per_host": 0}, "block_time": {"window": 0},
+              "push": {"max_samples_per_batch": 0, "queue_size": 2.5}, "delegations": {"top_n": 0}}
+    with pytest.raises(ConfigError) as error:
+        validate_config(config)
+    message = str(error.value)
+    for setting in ["concurrency.max_workers", "concurrency.max_per_host", "block_time.window",
+                    "push.max_samples_per_batch", "push.queue_size", "delegations.top_n"]:
+        assert f"{setting} must be a positive integer" in message
+    validate_config({"nodes": [node], "uptime": {"max_backfill": 0}, "exporter": {"series_ttl": 0}})
+
+def test_validate_config_requires_push_url():
+    node = {"name": "ChainA", "api_url": "http://api.chainA.com", "main_denom": "udenom"}
+    with pytest.raises(ConfigError, match="push.url is required"):
+        validate_config({"nodes": [node], "push": {"enabled": True}})
+    with pytest.raises(ConfigError, match="push.format must be one of remote_write, pushgateway"):
+        validate_config({"nodes": [node], "push": {"format": "graphite"}})
+
+def test_validate_config_checks_value_types():
+    node = {"name": "ChainA", "api_urls": ["http://api.chainA.com", 8080], "main_denom": "udenom",
+            "balance_denoms": ["uatom", 5], "wallets": [{"address": 123}], "validators": [{"validator_id": 7}]}
+    with pytest.raises(ConfigError) as error:
+        validate_config({"nodes": [node, {"name": 5, "api_url": "http://api.chainB.com", "main_denom": "ub"}]})
+    message = str(error.value)
+    for problem in ["api_url and api_urls must be strings", "balance_denoms must be",
+                    "the address and type of wallet 123 must be strings", "validator_id 7 must be a string",
+                    "Node 1: name must be a string"]:
+        assert problem in message
+
+def test_validate_config_requires_main_denom_for_wallets_only():
+    node = {"name": "ChainA", "api_url": "http://api.chainA.com", "validators": [{"validator_id": "valoper1"}]}
+    validate_config({"nodes": [node]})
+    with pytest.raises(ConfigError, match="Node ChainA has wallets but no main_denom"):
+        validate_config({"nodes": [dict(node, wallets=[{"address": "addressA1"}])]})
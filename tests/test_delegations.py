@@ -0,0 +1,22 @@
+import random
+
+from orbit_metrics.delegations import DelegationStats
+
+
+def test_delegation_stats_keeps_largest_delegations():
+    amounts = list(range(1, 1001))
+    random.Random(1).shuffle(amounts)
+    stats = DelegationStats(3)
+    for amount in amounts:
+        stats.add(f'delegator{amount}', float(amount))
+
+    assert stats.delegators == 1000
+    assert stats.tokens == sum(amounts)
+    assert stats.top() == [('delegator1000', 1000.0), ('delegator999', 999.0), ('delegator998', 998.0)]
+    assert len(stats._heap) == 3
+
+
+def test_delegation_stats_without_top():
+    stats = DelegationStats(0)
+    stats.add('delegator', 10.0)
+    assert stats.as_dict() == {'delegators': 1, 'tokens': 10.0, 'top': []}
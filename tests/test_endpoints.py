@@ -0,0 +1,48 @@
+from orbit_metrics.endpoints import EndpointPool
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_unmeasured_endpoints_are_ranked_first():
+    pool = EndpointPool(["http://a", "http://b"])
+    pool.record_success("http://a", 0.5)
+    assert pool.ranked() == ["http://b", "http://a"]
+
+
+def test_endpoints_are_ranked_by_latency_and_errors():
+    pool = EndpointPool(["http://a", "http://b", "http://c"], ewma_alpha=0.5)
+    pool.record_success("http://a", 0.3)
+    pool.record_success("http://b", 0.1)
+    pool.record_success("http://c", 0.2)
+    assert pool.ranked() == ["http://b", "http://c", "http://a"]
+
+    pool.record_failure("http://b")
+    assert pool.ranked() == ["http://c", "http://a", "http://b"]
+
+
+def test_lagging_endpoints_are_ranked_last_until_their_height_expires():
+    clock = FakeClock()
+    pool = EndpointPool(["http://a", "http://b"], max_height_lag=5, height_ttl=60, clock=clock)
+    pool.record_success("http://a", 0.1)
+    pool.record_success("http://b", 0.5)
+    pool.record_height("http://a", 100)
+    pool.record_height("http://b", 110)
+    assert pool.ranked() == ["http://b", "http://a"]
+
+    clock.now += 60
+    assert pool.ranked() == ["http://a", "http://b"]
+
+
+def test_hedge_delay_uses_latency_quantile():
+    pool = EndpointPool(["http://a", "http://b"], hedge=True, hedge_quantile=0.9)
+    assert pool.hedge_delay("http://a") is None
+    for latency in range(1, 11):
+        pool.record_success("http://a", latency / 10)
+    assert pool.hedge_delay("http://a") == 1.0
+    assert EndpointPool(["http://a"], hedge=True).hedge is False
@@ -1,8 +1,17 @@
+import threading
+import time
+from datetime import datetime, timezone
 from unittest.mock import patch, MagicMock
-from orbit_metrics.exporter import fetch_metrics
+
+import pytest
+from prometheus_client import REGISTRY
+from orbit_metrics.api_client import APIClient, clear_clients
+from orbit_metrics.exporter import background, cache, fetch_metrics
 
 
 def test_fetch_metrics():
+    clear_clients()
+    cache.clear()
     mock_config = {
         "nodes": [
             {
@@ -59,3 +68,251 @@ def test_fetch_metrics():
         mock_client.fetch_mint_params.assert_called_once()
         mock_client.fetch_slashing_params.assert_called_once()
         mock_client.fetch_staking_pool.assert_called_once()
+
+
+def test_fetch_metrics_isolates_failing_nodes():
+    clear_clients()
+    cache.clear()
+    mock_config = {
+        "concurrency": {"max_workers": 4, "max_per_host": 2},
+        "nodes": [
+            {"name": "ChainA", "api_url": "http://api.chainA.com", "main_denom": "udenom"},
+            {"name": "ChainB", "api_url": "http://api.chainB.com", "main_denom": "udenom"},
+        ]
+    }
+
+    healthy_client = MagicMock()
+    healthy_client.fetch_chain_height.return_value = 100
+
+    def make_client(api_url, **kwargs):
+        if api_url == "http://api.chainA.com":
+            raise RuntimeError("node down")
+        return healthy_client
+
+    with patch("orbit_metrics.api_client.APIClient", side_effect=make_client):
+        fetch_metrics(mock_config)
+
+    healthy_client.fetch_staking_pool.assert_called_once()
+    healthy_client.fetch_staking_params.assert_called_once()
+
+
+def test_fetch_metrics_serves_params_from_cache():
+    clear_clients()
+    cache.clear()
+    mock_config = {
+        "nodes": [
+            {"name": "ChainA", "api_url": "http://api.chainA.com", "main_denom": "udenom",
+             "wallets": [{"address": "addressA1"}]}
+        ]
+    }
+
+    with patch("orbit_metrics.api_client.APIClient") as MockAPIClient:
+        mock_client = MockAPIClient.return_value
+        mock_client.fetch_wallet_balance.return_value = 10.0
+        mock_client.fetch_staking_params.return_value = None  # Failed fetches are retried
+
+        fetch_metrics(mock_config)
+        cache.set(("ChainA", "balances", "addressA1"), 10.0, 0)  # Expire the balance immediately
+        fetch_metrics(mock_config)
+
+        mock_client.fetch_distribution_params.assert_called_once()
+        assert mock_client.fetch_staking_params.call_count == 2
+        assert mock_client.fetch_wallet_balance.call_count == 2
+
+
+def test_fetch_metrics_lists_validator_set_for_many_validators():
+    clear_clients()
+    cache.clear()
+    validator_ids = [f"valoper{i}" for i in range(APIClient.BULK_VALIDATORS_THRESHOLD)]
+    mock_config = {
+        "nodes": [
+            {"name": "ChainA", "api_url": "http://api.chainA.com", "main_denom": "udenom",
+             "validators": [{"validator_id": validator_id} for validator_id in validator_ids]}
+        ]
+    }
+
+    with patch("orbit_metrics.api_client.APIClient") as MockAPIClient:
+        mock_client = MockAPIClient.return_value
+        mock_client.chain_id = "chain-a"
+        mock_client.fetch_validators.return_value = [
+            {"operator_address": validator_id, "tokens": "100", "status": "BOND_STATUS_BONDED", "jailed": False}
+            for validator_id in validator_ids
+        ]
+
+        fetch_metrics(mock_config)
+
+        mock_client.fetch_validators.assert_called_once()
+        mock_client.fetch_validator.assert_not_called()
+        assert REGISTRY.get_sample_value("orbit_metrics_active_validators",
+                                         {"chain": "ChainA", "chain_id": "chain-a"}) == len(validator_ids)
+
+
+def test_fetch_metrics_skips_chain_state_at_unchanged_height():
+    clear_clients()
+    cache.clear()
+    mock_config = {
+        "refresh": {"balances": 0, "pool": 0},
+        "nodes": [
+            {"name": "ChainA", "api_url": "http://api.chainA.com", "main_denom": "udenom",
+             "wallets": [{"address": "addressA1"}]}
+        ]
+    }
+
+    with patch("orbit_metrics.api_client.APIClient") as MockAPIClient:
+        mock_client = MockAPIClient.return_value
+        mock_client.fetch_chain_height.side_effect = [100, 101]
+        mock_client.fetch_wallet_balance.return_value = 10.0
+
+        fetch_metrics(mock_config)
+        fetch_metrics(mock_config)  # Height 100 is still cached
+        cache.set(("ChainA", "height", None), 100, 0)  # Expire the height
+        fetch_metrics(mock_config)
+
+        assert mock_client.fetch_wallet_balance.call_count == 2
+        assert mock_client.fetch_staking_pool.call_count == 2
+
+
+def test_fetch_metrics_exports_collection_health():
+    clear_clients()
+    cache.clear()
+    mock_config = {
+        "nodes": [
+            {"name": "ChainHealth", "api_url": "http://api.chainHealth.com", "main_denom": "udenom"}
+        ]
+    }
+
+    with patch("orbit_metrics.api_client.APIClient") as MockAPIClient:
+        mock_client = MockAPIClient.return_value
+        mock_client.fetch_chain_height.return_value = 100
+        mock_client.fetch_staking_pool.return_value = None
+
+        fetch_metrics(mock_config)
+
+    labels = {"chain": "ChainHealth", "group": "pool"}
+    assert REGISTRY.get_sample_value("orbit_metrics_collection_errors_total", labels) == 1
+    assert REGISTRY.get_sample_value("orbit_metrics_last_success_timestamp_seconds",
+                                     {"chain": "ChainHealth", "group": "height"}) > 0
+    assert REGISTRY.get_sample_value("orbit_metrics_cycle_duration_seconds") >= 0
+
+
+def test_fetch_metrics_exports_allowed_denoms_from_one_request():
+    clear_clients()
+    cache.clear()
+    mock_config = {
+        "nodes": [
+            {"name": "ChainDenoms", "api_url": "http://api.chainDenoms.com", "main_denom": "udenom",
+             "balance_denoms": ["udenom", "ibc/ATOM", "ibc/OSMO"],
+             "wallets": [{"address": "addressD1", "type": "savings"}]}
+        ]
+    }
+
+    with patch("orbit_metrics.api_client.APIClient") as MockAPIClient:
+        mock_client = MockAPIClient.return_value
+        mock_client.chain_id = "denoms-1"
+        mock_client.fetch_wallet_balances.return_value = {"udenom": 5.0, "ibc/ATOM": 2.0, "ibc/JUNO": 3.0}
+
+        fetch_metrics(mock_config)
+
+        mock_client.fetch_wallet_balances.assert_called_once_with("addressD1")
+        mock_client.fetch_wallet_balance.assert_not_called()
+
+    labels = {"chain": "ChainDenoms", "chain_id": "denoms-1", "wallet": "addressD1", "type": "savings"}
+    assert REGISTRY.get_sample_value("orbit_metrics_wallet_balance", labels) == 5.0
+    assert REGISTRY.get_sample_value("orbit_metrics_wallet_denom_balance", dict(labels, denom="ibc/ATOM")) == 2.0
+    assert REGISTRY.get_sample_value("orbit_metrics_wallet_denom_balance", dict(labels, denom="ibc/OSMO")) == 0.0
+    assert REGISTRY.get_sample_value("orbit_metrics_wallet_denom_balance", dict(labels, denom="ibc/JUNO")) is None
+
+
+def test_fetch_metrics_removes_series_of_removed_wallets():
+    clear_clients()
+    cache.clear()
+    node = {"name": "ChainSeries", "api_url": "http://api.chainSeries.com", "main_denom": "udenom",
+            "wallets": [{"address": "addressS1"}, {"address": "addressS2"}]}
+
+    with patch("orbit_metrics.api_client.APIClient") as MockAPIClient:
+        mock_client = MockAPIClient.return_value
+        mock_client.chain_id = "series-1"
+        mock_client.fetch_wallet_balance.return_value = 10.0
+
+        fetch_metrics({"nodes": [node]})
+        fetch_metrics({"nodes": [dict(node, wallets=[{"address": "addressS1"}])]})
+
+    labels = {"chain": "ChainSeries", "chain_id": "series-1", "type": "unknown"}
+    assert REGISTRY.get_sample_value("orbit_metrics_wallet_balance", dict(labels, wallet="addressS1")) == 10.0
+    assert REGISTRY.get_sample_value("orbit_metrics_wallet_balance", dict(labels, wallet="addressS2")) is None
+
+
+def test_fetch_metrics_exports_block_time_and_stalls():
+    clear_clients()
+    cache.clear()
+    now = time.time()
+
+    def block(height, seconds_ago):
+        header_time = datetime.fromtimestamp(now - seconds_ago, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+        return {"block": {"header": {"height": str(height), "time": header_time}}}
+
+    mock_config = {
+        "block_time": {"enabled": True, "window": 10},
+        "refresh": {"blocks": 0},
+        "nodes": [{"name": "ChainBlocks", "api_url": "http://api.chainBlocks.com", "main_denom": "udenom"}]
+    }
+
+    with patch("orbit_metrics.api_client.APIClient") as MockAPIClient:
+        mock_client = MockAPIClient.return_value
+        mock_client.chain_id = "blocks-1"
+        mock_client.fetch_chain_height.side_effect = [100, 103]
+        mock_client.latest_block_data = block(100, 118)
+        mock_client.fetch_blocks.return_value = []
+        fetch_metrics(mock_config)
+        mock_client.fetch_blocks.assert_called_once_with([])
+
+        cache.set(("ChainBlocks", "height", None), 100, 0)  # Expire the height
+        mock_client.latest_block_data = block(103, 100)
+        mock_client.fetch_blocks.return_value = [block(101, 112), block(102, 106)]
+        fetch_metrics(mock_config)
+        mock_client.fetch_blocks.assert_called_with([101, 102])
+
+    labels = {"chain": "ChainBlocks", "chain_id": "blocks-1"}
+    assert REGISTRY.get_sample_value("orbit_metrics_block_time_seconds", labels) == pytest.approx(6.0)
+    assert REGISTRY.get_sample_value("orbit_metrics_blocks_per_minute", labels) == pytest.approx(10.0)
+    assert REGISTRY.get_sample_value("orbit_metrics_time_since_last_block_seconds", labels) >= 100
+    assert REGISTRY.get_sample_value("orbit_metrics_chain_stalled", labels) == 1
+
+
+def test_fetch_metrics_collects_delegations_in_background():
+    clear_clients()
+    cache.clear()
+    mock_config = {
+        "delegations": {"enabled": True, "top_n": 2},
+        "nodes": [{"name": "ChainStake", "api_url": "http://api.chainStake.com", "main_denom": "udenom",
+                   "validators": [{"validator_id": "valoper1"}]}]
+    }
+    released = threading.Event()
+
+    def fetch_delegations(validator_id, top_n):
+        released.wait(5)
+        return {"delegators": 3, "tokens": 60.0, "top": [["d1", 30.0], ["d2", 20.0]]}
+
+    with patch("orbit_metrics.api_client.APIClient") as MockAPIClient:
+        mock_client = MockAPIClient.return_value
+        mock_client.chain_id = "stake-1"
+        mock_client.fetch_validator_rewards.return_value = {"outstanding_rewards": {"udenom": 12.5}, "commission": {}}
+        mock_client.fetch_validator_delegations.side_effect = fetch_delegations
+
+        fetch_metrics(mock_config)  # Does not wait for the delegations
+        fetch_metrics(mock_config)  # Nor starts them again
+        released.set()
+        for _ in range(100):
+            if not background.running(("ChainStake", "delegations", "valoper1")):
+                break
+            time.sleep(0.01)
+        fetch_metrics(mock_config)
+
+        mock_client.fetch_validator_delegations.assert_called_once_with("valoper1", 2)
+
+    labels = {"chain": "ChainStake", "chain_id": "stake-1", "validator": "valoper1"}
+    assert REGISTRY.get_sample_value("orbit_metrics_validator_delegators", labels) == 3
+    assert REGISTRY.get_sample_value("orbit_metrics_validator_top_delegation",
+                                     dict(labels, rank="1", delegator="d1")) == 30.0
+    assert REGISTRY.get_sample_value("orbit_metrics_validator_outstanding_rewards",
+                                     dict(labels, denom="udenom")) == 12.5
@@ -0,0 +1,190 @@
+import base64
+import json
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+import pytest
+import requests
+
+grpc = pytest.importorskip('grpc')
+
+from orbit_metrics.api_client import APIClient
+from orbit_metrics.async_client import AsyncClientPool
+from orbit_metrics.endpoints import EndpointPool
+from orbit_metrics.grpc_transport import GrpcTransport
+from orbit_metrics.protobuf import encode_message, iter_fields
+from orbit_metrics.resilience import retry_budget
+
+VALIDATOR_KEY = bytes(range(32))
+
+
+def validator(address, tokens):
+    pubkey = [(1, '/cosmos.crypto.ed25519.PubKey'), (2, encode_message([(1, VALIDATOR_KEY)]))]
+    return [(1, address), (2, pubkey), (3, False), (4, 3), (5, tokens), (7, [(1, f'{address}-moniker')])]
+
+
+class StandInNode(grpc.GenericRpcHandler):
+    """gRPC server answering the cosmos-sdk queries with fixed messages, recording the requests."""
+
+    def __init__(self):
+        self.requests = []
+        self.failures = {}  # method -> status codes to answer with, in order
+        self.server = grpc.server(ThreadPoolExecutor(max_workers=4), handlers=[self])
+        self.port = self.server.add_insecure_port('127.0.0.1:0')
+
+    def service(self, handler_call_details):
+        method = handler_call_details.method
+        return grpc.unary_unary_rpc_method_handler(lambda request, context: self.respond(method, request, context))
+
+    def respond(self, method, request, context):
+        fields = {number: value for number, _, value in iter_fields(request)}
+        self.requests.append((method, fields))
+        if self.failures.get(method):
+            context.abort(self.failures[method].pop(0), 'stand-in failure')
+        if method == '/cosmos.staking.v1beta1.Query/Pool':
+            return encode_message([(1, [(1, '10968485993366'), (2, '74343129493578')])])
+        if method == '/cosmos.mint.v1beta1.Query/Params':
+            return encode_message([(1, [(1, 'uosmo'), (2, '130000000000000000'), (3, '200000000000000000'),
+                                        (4, '70000000000000000'), (5, '670000000000000000'), (6, 6311520)])])
+        if method == '/cosmos.slashing.v1beta1.Query/Params':
+            return encode_message([(1, [(1, 10000), (2, b'50000000000000000'), (3, [(1, 600)]),
+                                        (4, b'50000000000000000'), (5, b'100000000000000')])])
+        if method == '/cosmos.bank.v1beta1.Query/Balance':
+            return encode_message([(1, [(1, 'uosmo'), (2, '1500')])])
+        if method == '/cosmos.base.tendermint.v1beta1.Service/GetLatestBlock':
+            header = [(2, 'osmosis-1'), (3, 1234567), (4, [(1, 1714564800), (2, 500000000)])]
+            return encode_message([(2, [(1, header)])])
+        if method == '/cosmos.staking.v1beta1.Query/Validators':
+            if 1 not in {number for number, _, _ in iter_fields(fields[2])}:  # First page
+                return encode_message([(1, validator('osmovaloper1a', '100')), (2, [(1, b'page2'), (2, 2)])])
+            return encode_message([(1, validator('osmovaloper1b', '200')), (2, [(2, 2)])])
+        context.abort(grpc.StatusCode.UNIMPLEMENTED, f'unknown method {method}')
+
+    def __enter__(self):
+        self.server.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.stop(None)
+
+
+@pytest.fixture
+def node():
+    with StandInNode() as node:
+        yield node
+
+
+@pytest.fixture
+def api_client(node):
+    with patch.object(APIClient, 'fetch_node_info'):
+        client = APIClient('http://lcd.example.com', transport=GrpcTransport(f'127.0.0.1:{node.port}', timeout=5),
+                           http_settings={'backoff_base': 0, 'retries': 1}, chain='Osmosis')
+    yield client
+    client.close()
+
+
+def test_grpc_transport_serves_params_and_pool(api_client):
+    assert api_client.fetch_staking_pool() == {'not_bonded_tokens': '10968485993366', 'bonded_tokens': '74343129493578'}
+    mint = api_client.fetch_mint_params()
+    assert mint['inflation_max'] == '0.200000000000000000'
+    assert mint['blocks_per_year'] == '6311520'
+    slashing = api_client.fetch_slashing_params()
+    assert slashing['min_signed_per_window'] == '0.050000000000000000'
+    assert slashing['downtime_jail_duration'] == '600s'
+
+
+def test_grpc_transport_serves_latest_block_and_balances(api_client, node):
+    api_client.fetch_latest_block_data()
+    assert api_client.fetch_chain_height() == 1234567
+    assert api_client.fetch_chain_id() == 'osmosis-1'
+    assert api_client.latest_block_data['block']['header']['time'] == '2024-05-01T12:00:00.500000000Z'
+
+    assert api_client.fetch_wallet_balance('osmo1wallet', 'uosmo') == 1500.0
+    assert node.requests[-1] == ('/cosmos.bank.v1beta1.Query/Balance', {1: b'osmo1wallet', 2: b'uosmo'})
+
+
+def test_grpc_transport_follows_pagination(api_client, node):
+    validators = api_client.fetch_validators()
+
+    assert [v['operator_address'] for v in validators] == ['osmovaloper1a', 'osmovaloper1b']
+    assert validators[0]['status'] == 'BOND_STATUS_BONDED'
+    assert validators[0]['consensus_pubkey'] == {'@type': '/cosmos.crypto.ed25519.PubKey',
+                                                 'key': base64.b64encode(VALIDATOR_KEY).decode()}
+    assert validators[0]['description']['moniker'] == 'osmovaloper1a-moniker'
+    second_page = {number: value for number, _, value in iter_fields(node.requests[1][1][2])}
+    assert second_page == {1: b'page2', 3: APIClient.VALIDATORS_PAGE_LIMIT}
+
+
+def test_grpc_transport_maps_status_codes(api_client, node):
+    retry_budget.reset(1)
+    pool = '/cosmos.staking.v1beta1.Query/Pool'
+    node.failures[pool] = [grpc.StatusCode.UNAVAILABLE]
+    assert api_client.fetch_staking_pool()['bonded_tokens'] == '74343129493578'  # Retried
+    assert len(node.requests) == 2
+
+    node.failures[pool] = [grpc.StatusCode.NOT_FOUND]
+    with pytest.raises(requests.exceptions.HTTPError) as error:
+        api_client.get_json('/cosmos/staking/v1beta1/pool')
+    assert error.value.response.status_code == 404
+    assert len(node.requests) == 3  # Not retried
+
+
+def test_queries_without_grpc_method_use_rest(api_client, node):
+    with patch('requests.Session.get') as mock_get:
+        response = MagicMock(status_code=200, headers={})
+        response.content = json.dumps({'params': {'community_tax': '0.02'}}).encode()
+        mock_get.return_value = response
+
+        assert api_client.get_json('/cosmos/gov/v1beta1/params/voting') == {'params': {'community_tax': '0.02'}}
+        assert mock_get.call_args.args[0] == 'http://lcd.example.com/cosmos/gov/v1beta1/params/voting'
+    assert node.requests == []
+
+
+def test_dead_grpc_endpoint_falls_back_to_rest():
+    retry_budget.reset(0)
+    transport = GrpcTransport('127.0.0.1:1', timeout=1, endpoints=EndpointPool(['127.0.0.1:1'], breaker_threshold=2))
+    with patch.object(APIClient, 'fetch_node_info'):
+        client = APIClient('http://lcd.example.com', transport=transport, http_settings={'retries': 0},
+                           chain='Osmosis')
+    try:
+        for _ in range(2):
+            with pytest.raises(requests.exceptions.ConnectionError):
+                client.get_json('/cosmos/staking/v1beta1/pool')
+        assert not transport.endpoints.available()  # Its circuit breaker opened
+
+        with patch('requests.Session.get') as mock_get, patch.object(transport, 'get_json') as grpc_get:
+            response = MagicMock(status_code=200, headers={})
+            response.content = json.dumps({'pool': {'bonded_tokens': '1'}}).encode()
+            mock_get.return_value = response
+
+            assert client.request('/cosmos/staking/v1beta1/pool') == ('http://lcd.example.com',
+                                                                     {'pool': {'bonded_tokens': '1'}})
+            grpc_get.assert_not_called()
+    finally:
+        client.close()
+
+
+def test_latest_block_from_grpc_records_no_rest_height(api_client):
+    api_client.fetch_latest_block_data()
+    assert api_client.fetch_chain_height() == 1234567
+    assert api_client.endpoints.stats['http://lcd.example.com'].height is None
+    assert api_client.transport.endpoints.stats[api_client.transport.url].latency is not None
+
+
+def test_async_client_sends_grpc_queries_to_the_transport(node):
+    pytest.importorskip('aiohttp')
+    pool = AsyncClientPool({'max_workers': 4, 'max_per_host': 2}, {'backoff_base': 0, 'retries': 1})
+
+    async def collect():
+        client = pool.get_client(['http://lcd.example.com'], chain='Osmosis', grpc_url=f'127.0.0.1:{node.port}')
+        await client.fetch_latest_block_data()
+        return client, await client.fetch_chain_height(), await client.fetch_validators()
+
+    try:
+        client, height, validators = pool.run(collect())
+        assert height == 1234567
+        assert [v['operator_address'] for v in validators] == ['osmovaloper1a', 'osmovaloper1b']
+        assert client.endpoints.stats['http://lcd.example.com'].height is None
+        assert client.transport.endpoints.stats[client.transport.url].latency is not None
+    finally:
+        pool.close()
@@ -0,0 +1,39 @@
+import json
+import requests
+from unittest.mock import patch, MagicMock
+
+from prometheus_client import REGISTRY
+from orbit_metrics.api_client import APIClient
+from orbit_metrics.instrumentation import endpoint_kind
+
+
+def test_endpoint_kind_hides_addresses_and_heights():
+    assert endpoint_kind("/cosmos/staking/v1beta1/pool") == "/cosmos/staking/v1beta1/pool"
+    assert endpoint_kind("/cosmos/bank/v1beta1/balances/bitsong1qxw4fjged2xve8ez7nu779tm8ejw92rv0vcuqr") == \
+        "/cosmos/bank/v1beta1/balances/{}"
+    assert endpoint_kind("/cosmos/staking/v1beta1/validators/bitsongvaloper1qxw4fjged2xve8ez7nu779tm8ejw92rv6vufn2") == \
+        "/cosmos/staking/v1beta1/validators/{}"
+    assert endpoint_kind("/cosmos/base/tendermint/v1beta1/blocks/18722229") == "/cosmos/base/tendermint/v1beta1/blocks/{}"
+
+
+def test_requests_are_observed():
+    with patch.object(APIClient, "fetch_node_info"):
+        client = APIClient("http://instrumented", http_settings={"retries": 0}, chain="ChainI")
+    kind = "/cosmos/staking/v1beta1/pool"
+
+    with patch("requests.Session.get") as mock_get:
+        response = MagicMock(status_code=200, headers={})
+        response.content = json.dumps({"pool": {}}).encode()
+        mock_get.side_effect = [response, requests.exceptions.ConnectTimeout("timed out")]
+
+        assert client.fetch_staking_pool() == {}
+        assert client.fetch_staking_pool() is None
+
+    assert REGISTRY.get_sample_value("orbit_metrics_http_request_duration_seconds_count",
+                                     {"chain": "ChainI", "kind": kind, "status": "200"}) == 1
+    assert REGISTRY.get_sample_value("orbit_metrics_http_request_duration_seconds_count",
+                                     {"chain": "ChainI", "kind": kind, "status": "error"}) == 1
+    assert REGISTRY.get_sample_value("orbit_metrics_http_response_bytes_total",
+                                     {"chain": "ChainI", "kind": kind}) == 12
+    assert REGISTRY.get_sample_value("orbit_metrics_http_request_errors_total",
+                                     {"chain": "ChainI", "kind": kind, "error": "ConnectTimeout"}) == 1
@@ -0,0 +1,34 @@
+import logging
+import os
+import subprocess
+import sys
+
+import pytest
+import orbit_metrics
+from orbit_metrics.__main__ import check_config
+
+SOURCE_DIR = os.path.dirname(os.path.dirname(orbit_metrics.__file__))
+
+
+def test_check_config(tmp_path):
+    valid = tmp_path / "valid.yml"
+    valid.write_text("nodes:\n  - name: ChainA\n    api_url: http://api.chainA.com\n    main_denom: udenom\n")
+    check_config(str(valid), logging.INFO)
+
+    invalid = tmp_path / "invalid.yml"
+    invalid.write_text("nodes:\n  - name: ChainA\n")
+    for path in (invalid, tmp_path / "missing.yml"):
+        with pytest.raises(SystemExit) as exit_info:
+            check_config(str(path), logging.INFO)
+        assert exit_info.value.code == 1
+
+
+def test_check_config_does_not_import_the_http_stack(tmp_path):
+    config = tmp_path / "config.yml"
+    config.write_text("nodes:\n  - name: ChainA\n    api_url: http://api.chainA.com\n    main_denom: udenom\n")
+    script = (f"import sys; sys.argv = ['orbit_metrics', '--config', {str(config)!r}, '--check-config']; "
+              "from orbit_metrics.__main__ import main; main(); "
+              "print('imported:', *(name for name in ('requests', 'prometheus_client', 'aiohttp') if name in sys.modules))")
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True,
+                            env=dict(os.environ, PYTHONPATH=SOURCE_DIR))
+    assert result.stdout.splitlines()[-1] == "imported:"
@@ -0,0 +1,31 @@
+import logging
+from unittest.mock import patch
+
+import pytest
+from orbit_metrics import parsing
+from orbit_metrics.parsing import loads, log_payload
+
+
+@pytest.mark.parametrize("backend", ["default", "stdlib"])
+def test_loads(backend):
+    with patch.object(parsing, "orjson", parsing.orjson if backend == "default" else None):
+        assert loads(b'{"balances": [{"denom": "ubtsg", "amount": "1"}]}')["balances"][0]["denom"] == "ubtsg"
+        with pytest.raises(ValueError):
+            loads(b'<html>Bad Gateway</html>')
+
+
+def test_log_payload_is_truncated(caplog):
+    logger = logging.getLogger("orbit_metrics.test")
+    with caplog.at_level(logging.DEBUG, logger="orbit_metrics.test"):
+        log_payload(logger, "Validator set", "x" * 5000, limit=10)
+    assert caplog.messages == ["Validator set: xxxxxxxxxx... (5000 characters)"]
+
+
+def test_log_payload_is_not_formatted_without_debug():
+    class Payload:
+        def __str__(self):
+            raise AssertionError("formatted")
+
+    logger = logging.getLogger("orbit_metrics.test")
+    logger.setLevel(logging.INFO)
+    log_payload(logger, "Validator set", Payload())
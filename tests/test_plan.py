@@ -0,0 +1,64 @@
+import pytest
+from prometheus_client import CollectorRegistry, Gauge
+
+from orbit_metrics.exporter import collection_plan
+from orbit_metrics.plan import CollectionPlan
+
+
+def make_config(validators=1):
+    return {
+        "nodes": [{
+            "name": "ChainA",
+            "api_url": "http://api.chainA.com",
+            "api_urls": ["http://backup.chainA.com", "http://api.chainA.com"],
+            "main_denom": "udenom",
+            "wallets": [{"address": "addressA1", "type": "validator"}, {"address": "addressA2"}],
+            "validators": [{"validator_id": f"validatorA{index}"} for index in range(validators)],
+        }],
+        "refresh": {"balances": 30},
+        "uptime": {"enabled": False},
+    }
+
+
+def test_plan_resolves_nodes_and_settings():
+    plan = CollectionPlan(make_config())
+    node = plan.by_name["ChainA"]
+    assert node.api_urls == ("http://api.chainA.com", "http://backup.chainA.com")
+    assert node.host == "http://api.chainA.com"
+    assert [(wallet.address, wallet.type) for wallet in node.wallets] == [("addressA1", "validator"),
+                                                                          ("addressA2", "unknown")]
+    assert node.validators[0].validator_id == "validatorA0"
+    assert plan.intervals["balances"] == 30.0
+    assert plan.settings["uptime"]["enabled"] is False
+    assert plan.settings["http"]["retry_budget"] is not None
+
+
+def test_plan_binds_label_values_once_per_chain_id():
+    gauge = Gauge("test_wallet_balance", "Balance", ["chain", "chain_id", "wallet", "type"],
+                  registry=CollectorRegistry())
+    wallet = CollectionPlan(make_config()).nodes[0].wallets[1]
+    label_values = wallet.bound(gauge, "chain-a-1")
+    assert label_values == ("ChainA", "chain-a-1", "addressA2", "unknown")
+    assert wallet.bound(gauge, "chain-a-1") is label_values
+    assert wallet.bound(gauge, "chain-a-2")[1] == "chain-a-2"
+    with pytest.raises(AttributeError):
+        wallet.balance = 1  # Slots only
+
+
+def test_plan_of_a_shard_without_nodes_is_empty():
+    plan = CollectionPlan(dict(make_config(), nodes=[]))
+    assert plan.nodes == ()
+    assert plan.by_name == {}
+    assert plan.intervals["balances"] == 30.0
+
+
+def test_collection_plan_is_compiled_once_per_config():
+    config = make_config(validators=5)
+    plan = collection_plan(config)
+    assert collection_plan(config) is plan
+    node = plan.nodes[0]
+    assert [task.name for task in node.tasks[:3]] == ["wallet addressA1", "wallet addressA2", "validator set"]
+    assert node.tasks[0].apply_args == (node.wallets[0],)
+
+    plan = collection_plan(make_config(validators=1))
+    assert [task.name for task in plan.nodes[0].tasks if task.group == "validators"] == ["validator validatorA0"]
@@ -0,0 +1,79 @@
+import time
+from unittest.mock import MagicMock, patch
+from wsgiref.util import setup_testing_defaults
+
+from prometheus_client import CollectorRegistry
+from orbit_metrics.api_client import clear_clients
+from orbit_metrics.exporter import cache
+from orbit_metrics.probe import ProbeApp
+
+CONFIG = {
+    "probe": {"timeout": 5},
+    "nodes": [
+        {"name": "ProbeA", "api_url": "http://api.probeA.com", "main_denom": "udenom"},
+        {"name": "ProbeB", "api_url": "http://api.probeB.com", "main_denom": "udenom"},
+    ]
+}
+
+
+def request(app, query, **headers):
+    environ = {"PATH_INFO": "/probe", "QUERY_STRING": query}
+    environ.update(headers)
+    setup_testing_defaults(environ)
+    start_response = MagicMock()
+    body = b"".join(app(environ, start_response)).decode()
+    return start_response.call_args[0][0], body
+
+
+def probe_app(config=CONFIG):
+    reloader = MagicMock()
+    reloader.poll.return_value = config
+    return ProbeApp(reloader, registry=CollectorRegistry())
+
+
+def test_probe_collects_the_requested_groups_of_a_chain():
+    clear_clients()
+    cache.clear()
+    app = probe_app()
+
+    with patch("orbit_metrics.api_client.APIClient") as MockAPIClient:
+        mock_client = MockAPIClient.return_value
+        mock_client.chain_id = "probe-1"
+        mock_client.fetch_chain_height.return_value = 100
+        mock_client.fetch_staking_pool.return_value = {"bonded_tokens": "7", "not_bonded_tokens": "3"}
+        status, body = request(app, "target=ProbeA&module=pool")
+        request(app, "target=ProbeB&module=pool")
+
+        mock_client.fetch_mint_params.assert_not_called()
+
+    assert status == "200 OK"
+    assert "orbit_metrics_probe_success 1.0" in body
+    assert 'orbit_metrics_bonded_tokens{chain="ProbeA"} 7.0' in body
+    assert 'orbit_metrics_last_success_timestamp_seconds{chain="ProbeA",group="pool"}' in body
+    assert "ProbeB" not in body
+    assert "orbit_metrics_chain_height" not in body  # Not requested, although fetched for the labels
+
+
+def test_probe_rejects_unknown_targets_and_modules():
+    app = probe_app()
+    assert request(app, "target=Unknown")[0] == "400 Bad Request"
+    status, body = request(app, "target=ProbeA&module=pool,prices")
+    assert status == "400 Bad Request" and "prices" in body
+
+
+def test_probe_is_bounded_by_the_scrape_timeout():
+    app = probe_app()
+    with patch("orbit_metrics.probe.probe_node", side_effect=lambda *args: time.sleep(2) or True):
+        started = time.monotonic()
+        status, body = request(app, "target=ProbeA&module=pool", HTTP_X_PROMETHEUS_SCRAPE_TIMEOUT_SECONDS="0.7")
+    assert time.monotonic() - started < 1
+    assert "orbit_metrics_probe_success 0.0" in body
+
+
+def test_other_paths_serve_the_registry():
+    app = probe_app()
+    environ = {"PATH_INFO": "/metrics"}
+    setup_testing_defaults(environ)
+    start_response = MagicMock()
+    app(environ, start_response)
+    assert start_response.call_args[0][0].startswith("200")
@@ -0,0 +1,49 @@
+import pytest
+
+from orbit_metrics.protobuf import DecodeError, decode_message, encode_message, enum, iter_fields
+
+
+def test_encode_message_round_trip():
+    data = encode_message([(1, 'osmo1abc'), (2, [(1, b'\x00\x01'), (3, 500)]), (3, True), (4, None), (5, -1)])
+    fields = list(iter_fields(data))
+
+    assert fields[0] == (1, 2, b'osmo1abc')
+    assert list(iter_fields(fields[1][2])) == [(1, 2, b'\x00\x01'), (3, 0, 500)]
+    assert fields[2] == (3, 0, 1)
+    assert fields[3] == (5, 0, (1 << 64) - 1)
+
+
+def test_decode_message_converts_to_rest_values():
+    schema = {
+        1: ('rate', 'dec'),
+        2: ('height', 'integer'),
+        3: ('time', 'timestamp'),
+        4: ('duration', 'duration'),
+        5: ('status', enum({0: 'UNSPECIFIED', 3: 'BONDED'})),
+        6: ('coins', {1: ('denom', 'string'), 2: ('amount', 'string')}, 'repeated'),
+        7: ('next_key', 'bytes'),
+        8: ('jailed', 'bool'),
+        9: ('count', 'number'),
+    }
+    data = encode_message([(1, '20000000000000000'), (2, 12345), (3, [(1, 1714564800), (2, 123456789)]),
+                           (4, [(1, 600)]), (5, 3), (6, [(1, 'uatom'), (2, '7')]), (6, [(1, 'uosmo')]),
+                           (99, 'unknown field')])
+
+    assert decode_message(data, schema) == {
+        'rate': '0.020000000000000000',
+        'height': '12345',
+        'time': '2024-05-01T12:00:00.123456789Z',
+        'duration': '600s',
+        'status': 'BONDED',
+        'coins': [{'denom': 'uatom', 'amount': '7'}, {'denom': 'uosmo', 'amount': ''}],
+        'next_key': None,
+        'jailed': False,
+        'count': 0,
+    }
+
+
+def test_decode_message_rejects_mismatched_wire_types():
+    with pytest.raises(DecodeError):
+        decode_message(encode_message([(1, 5)]), {1: ('denom', 'string')})
+    with pytest.raises(DecodeError):
+        decode_message(b'\x0a\x05ab', {1: ('denom', 'string')})
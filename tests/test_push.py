@@ -0,0 +1,198 @@
+import math
+import struct
+import time
+from unittest.mock import MagicMock
+
+import requests
+from prometheus_client import Gauge
+
+from orbit_metrics import push
+from orbit_metrics.config import DEFAULTS
+from orbit_metrics.protobuf import iter_fields
+from orbit_metrics.push import Pusher, SampleFilter, remote_write_request, snappy_compress
+
+
+def snappy_decompress(data):
+    """Minimal decoder of the snappy block format, for the literals and 2-byte offset copies the encoder emits."""
+    fields = iter_fields(bytes([1 << 3]) + data)  # Reads the length preamble as a varint field
+    _, _, length = next(fields)
+    position = len(data) - len(bytes(data).lstrip(bytes(range(128, 256)))) + 1
+    output = bytearray()
+    while position < len(data):
+        tag = data[position]
+        position += 1
+        if tag & 3 == 0:
+            size = tag >> 2
+            if size >= 60:
+                size, position = int.from_bytes(data[position:position + size - 59], 'little'), position + size - 59
+            output += data[position:position + size + 1]
+            position += size + 1
+        else:
+            offset = int.from_bytes(data[position:position + 2], 'little')
+            position += 2
+            for _ in range((tag >> 2) + 1):
+                output.append(output[-offset])
+    assert len(output) == length
+    return bytes(output)
+
+
+def decode_write_request(body):
+    series = []
+    for _, _, timeseries in iter_fields(snappy_decompress(body)):
+        labels, value = {}, None
+        for number, _, field in iter_fields(timeseries):
+            values = {n: v for n, _, v in iter_fields(field)}
+            if number == 1:
+                labels[values[1].decode()] = values[2].decode()
+            else:
+                value = values[1]
+        series.append((labels, struct.unpack('<d', value)[0]))
+    return series
+
+
+def settings(**overrides):
+    result = dict(DEFAULTS['push'], enabled=True, url='http://receiver.example.com/api/v1/write', instance='region-1',
+                  backoff_base=0.01, backoff_max=0.01)
+    result.update(overrides)
+    return result
+
+
+def wait_for(condition):
+    for _ in range(200):
+        if condition():
+            return
+        time.sleep(0.01)
+    raise AssertionError('Condition not met')
+
+
+def test_snappy_compress_without_python_snappy(monkeypatch):
+    monkeypatch.setattr(push, 'snappy', None)
+    data = remote_write_request([('up', (('chain', f'chain{i % 7}'),), float(i)) for i in range(500)], 1)
+    compressed = snappy_compress(data)
+
+    assert len(compressed) < len(data) / 3
+    assert snappy_decompress(compressed) == data
+
+
+def test_sample_filter_sends_changes_and_refreshes_unchanged_samples():
+    gauge = Gauge('test_filter_value', 'Test', ['chain'], registry=None)
+    gauge.labels(chain='a').set(1)
+    gauge.labels(chain='b').set(2)
+    sample_filter = SampleFilter(full_interval=60)
+
+    assert len(sample_filter.changes(gauge.collect(), 0)[1]) == 2
+    gauge.labels(chain='a').set(5)
+    assert sample_filter.changes(gauge.collect(), 10)[1] == [('test_filter_value', (('chain', 'a'),), 5)]
+    assert sample_filter.changes(gauge.collect(), 65)[1] == [('test_filter_value', (('chain', 'b'),), 2)]
+    gauge.remove('b')
+    assert sample_filter.changes(gauge.collect(), 68)[1:] == ([], [('test_filter_value', (('chain', 'b'),))])
+
+
+def test_pusher_sends_changed_samples_with_remote_write():
+    gauge = Gauge('test_push_value', 'Test', ['chain'], registry=None)
+    gauge.labels(chain='a').set(1)
+    session = MagicMock()
+    pusher = Pusher(settings(), metrics=lambda: [gauge], session=session)
+    try:
+        assert pusher.push(now=1000) == 1
+        assert pusher.push(now=1001) == 0  # Nothing changed
+        gauge.remove('a')
+        assert pusher.push(now=1002) == 1
+        wait_for(lambda: session.request.call_count == 2)
+    finally:
+        pusher.close()
+
+    method, url = session.request.call_args_list[0].args
+    assert (method, url) == ('POST', 'http://receiver.example.com/api/v1/write')
+    assert session.request.call_args_list[0].kwargs['headers']['Content-Encoding'] == 'snappy'
+    labels = {'__name__': 'test_push_value', 'chain': 'a', 'instance': 'region-1', 'job': 'orbit_metrics'}
+    assert decode_write_request(session.request.call_args_list[0].kwargs['data']) == [(labels, 1.0)]
+    [(stale_labels, stale)] = decode_write_request(session.request.call_args_list[1].kwargs['data'])
+    assert stale_labels == labels
+    assert math.isnan(stale) and struct.pack('<d', stale) == struct.pack('<Q', 0x7ff0000000000002)
+
+
+def test_pusher_spills_batches_during_outages(tmp_path):
+    gauge = Gauge('test_spill_value', 'Test', registry=None)
+    session = MagicMock()
+    down = [True]
+
+    def request(*args, **kwargs):
+        if down[0]:
+            raise requests.exceptions.ConnectionError('receiver down')
+        return MagicMock()
+
+    session.request.side_effect = request
+    pusher = Pusher(settings(spill_path=str(tmp_path)), metrics=lambda: [gauge], session=session)
+    try:
+        gauge.set(1)
+        pusher.push(now=1000)
+        wait_for(lambda: session.request.call_count >= 1 and len(list(tmp_path.iterdir())) == 1)
+        gauge.set(2)
+        pusher.push(now=1001)
+        calls = session.request.call_count
+        wait_for(lambda: session.request.call_count > calls)  # Still retrying the spilled batch
+        assert len(list(tmp_path.iterdir())) == 1
+        down[0] = False
+        wait_for(lambda: not list(tmp_path.iterdir()))
+    finally:
+        pusher.close()
+
+    values = [decode_write_request(call.kwargs['data'])[0][1] for call in session.request.call_args_list]
+    assert values[-2:] == [1.0, 2.0]  # Sent in order
+
+
+def test_pusher_drops_rejected_batches_and_spills_on_close(tmp_path):
+    gauge = Gauge('test_rejected_value', 'Test', registry=None)
+    session = MagicMock()
+    rejected = MagicMock(status_code=400)
+    session.request.return_value.raise_for_status.side_effect = requests.exceptions.HTTPError('out of order',
+                                                                                             response=rejected)
+    pusher = Pusher(settings(spill_path=str(tmp_path)), metrics=lambda: [gauge], session=session)
+    pusher.push(now=1000)
+    wait_for(lambda: session.request.call_count == 1)
+    pusher.close()
+    assert not list(tmp_path.iterdir())  # Not retried nor spilled
+
+    pusher = Pusher(settings(spill_path=str(tmp_path), queue_size=0), metrics=lambda: [gauge], session=MagicMock())
+    pusher.close()
+    gauge.set(3)
+    pusher.push(now=1001)  # The queue is full right away, the batch is spilled
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_failed_batch_is_spilled_before_the_spilled_ones(tmp_path):
+    pusher = Pusher(settings(spill_path=str(tmp_path)), metrics=lambda: [], session=MagicMock())
+    pusher.close()
+    with pusher._condition:
+        pusher._spill('POST', b'newer')  # Spilled by a full queue while the older batch was being sent
+        pusher._spill('PUT', b'failed', first=True)
+    assert [open(path, 'rb').read() for path in pusher._spilled] == [b'failed', b'newer']
+
+    session = MagicMock()
+    session.request.side_effect = requests.exceptions.ConnectionError('receiver down')
+    restarted = Pusher(settings(spill_path=str(tmp_path)), metrics=lambda: [], session=session)
+    restarted.close()
+    assert [open(path, 'rb').read() for path in restarted._spilled] == [b'failed', b'newer']
+    assert restarted._spilled[0].endswith('.put')
+
+
+def test_pusher_posts_changed_families_to_pushgateway():
+    first = Gauge('test_gateway_first', 'First', registry=None)
+    second = Gauge('test_gateway_second', 'Second', registry=None)
+    session = MagicMock()
+    pusher = Pusher(settings(format='pushgateway', url='http://gateway:9091/'), metrics=lambda: [first, second],
+                    session=session)
+    try:
+        pusher.push(now=1000)
+        first.set(4)
+        pusher.push(now=1001)
+        wait_for(lambda: session.request.call_count == 2)
+    finally:
+        pusher.close()
+
+    method, url = session.request.call_args.args
+    assert (method, url) == ('POST', 'http://gateway:9091/metrics/job/orbit_metrics/instance/region-1')
+    body = session.request.call_args.kwargs['data'].decode()
+    assert 'test_gateway_first 4.0' in body
+    assert 'test_gateway_second' not in body
@@ -0,0 +1,83 @@
+from functools import partial
+from unittest.mock import patch
+
+import yaml
+from orbit_metrics import api_client
+from orbit_metrics.api_client import clear_clients, get_client
+from orbit_metrics.exporter import cache, collection_plan
+from orbit_metrics.reload import ConfigReloader, diff_nodes
+from orbit_metrics.sharding import HashRing, shard_config
+
+
+def node(name, **fields):
+    return dict({"name": name, "api_url": f"http://api.{name}.com", "main_denom": "udenom"}, **fields)
+
+
+def write_config(path, config):
+    path.write_text(yaml.safe_dump(config))
+
+
+def test_diff_nodes():
+    old = {"nodes": [node("a"), node("b"), node("c")]}
+    new = {"nodes": [node("a"), node("c", wallets=[{"address": "w"}]), node("d")]}
+    assert diff_nodes(old, new) == (["d"], ["b"], ["c"])
+
+
+def test_reload_keeps_state_of_unchanged_chains(tmp_path):
+    clear_clients()
+    cache.clear()
+    path = tmp_path / "config.yml"
+    config = {"nodes": [node("kept"), node("removed")]}
+    write_config(path, config)
+    reloader = ConfigReloader(str(path), config)
+
+    with patch("orbit_metrics.api_client.APIClient"):
+        kept_client = get_client(["http://api.kept.com"])
+        get_client(["http://api.removed.com"])
+    cache.set(("kept", "params", "mint"), {"mint_denom": "udenom"}, 3600)
+    cache.set(("removed", "params", "mint"), {"mint_denom": "udenom"}, 3600)
+
+    assert reloader.poll() is config  # Nothing changed yet
+
+    new_config = {"nodes": [node("kept"), node("added")]}
+    write_config(path, new_config)
+    reloader.requested.set()
+    assert reloader.poll() == new_config
+
+    assert api_client._clients == {("http://api.kept.com",): kept_client}
+    assert cache.get(("kept", "params", "mint")) is not None
+    assert cache.get(("removed", "params", "mint")) is None
+
+
+def test_invalid_config_is_not_applied(tmp_path):
+    path = tmp_path / "config.yml"
+    config = {"nodes": [node("a")]}
+    write_config(path, config)
+    reloader = ConfigReloader(str(path), config)
+
+    path.write_text("nodes: [{name: a}]")
+    reloader.requested.set()
+    assert reloader.poll() is config
+
+    path.write_text("nodes: [")
+    reloader.requested.set()
+    assert reloader.poll() is config
+
+
+def test_reload_can_leave_a_shard_without_chains(tmp_path):
+    ring = HashRing(2)
+    names = [f"chain{index}" for index in range(10)]
+    kept = next(name for name in names if ring.shard_of(name) == 0)
+    moved = next(name for name in names if ring.shard_of(name) == 1)
+    path = tmp_path / "config.yml"
+    config = {"nodes": [node(kept)]}
+    write_config(path, config)
+    prepare = partial(shard_config, shard=0, shards=2)
+    reloader = ConfigReloader(str(path), prepare(config), prepare=prepare)
+    collection_plan(reloader.config)
+
+    write_config(path, {"nodes": [node(moved)]})
+    reloader.requested.set()
+    new_config = reloader.poll()
+    assert new_config["nodes"] == []
+    assert collection_plan(new_config).nodes == ()
@@ -0,0 +1,72 @@
+from orbit_metrics.resilience import CircuitBreaker, RetryBudget, backoff_delay
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_circuit_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("http://a", failure_threshold=2, reset_timeout=30, clock=FakeClock())
+    breaker.record_failure()
+    assert breaker.allows_request()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.allows_request()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allows_request()
+
+
+def test_circuit_breaker_half_opens_after_reset_timeout():
+    clock = FakeClock()
+    breaker = CircuitBreaker("http://b", failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allows_request()
+
+    breaker.record_failure()
+    assert not breaker.allows_request()
+
+    clock.now += 30
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_circuit_breaker_lets_a_single_trial_through_while_half_open():
+    clock = FakeClock()
+    breaker = CircuitBreaker("http://c", failure_threshold=1, reset_timeout=30, clock=clock)
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allows_request()
+    assert not breaker.allows_request()  # The trial is in flight
+    breaker.record_success()
+    assert breaker.allows_request() and breaker.allows_request()
+
+    breaker.record_failure()
+    clock.now += 30
+    assert breaker.allows_request()
+    clock.now += 30  # The trial was never recorded
+    assert breaker.allows_request()
+    assert not breaker.allows_request()
+
+
+def test_retry_budget():
+    budget = RetryBudget(2)
+    assert budget.acquire()
+    assert budget.acquire()
+    assert not budget.acquire()
+    budget.reset()
+    assert budget.acquire()
+    budget.reset(0)
+    assert not budget.acquire()
+
+
+def test_backoff_delay_is_capped():
+    for attempt in range(1, 10):
+        delay = backoff_delay(attempt, 0.5, 5)
+        assert 0 <= delay <= min(5, 0.5 * 2 ** (attempt - 1))
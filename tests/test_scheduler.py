@@ -0,0 +1,82 @@
+from unittest.mock import MagicMock
+
+from orbit_metrics.scheduler import TTLCache, refresh_intervals, tick_interval
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_ttl_cache_serves_value_until_expired():
+    clock = FakeClock()
+    cache = TTLCache(clock=clock)
+    fetch = MagicMock(side_effect=[1, 2])
+
+    assert cache.get_or_fetch('key', 30, fetch) == 1
+    clock.now += 29
+    assert cache.get_or_fetch('key', 30, fetch) == 1
+    clock.now += 1
+    assert cache.get_or_fetch('key', 30, fetch) == 2
+    assert fetch.call_count == 2
+
+
+def test_ttl_cache_does_not_cache_failures():
+    cache = TTLCache()
+    fetch = MagicMock(side_effect=[None, 5])
+
+    assert cache.get_or_fetch('key', 30, fetch) is None
+    assert cache.get_or_fetch('key', 30, fetch) == 5
+
+
+def test_refresh_intervals_override_defaults():
+    config = {'refresh': {'height': 5, 'params': 7200}}
+    intervals = refresh_intervals(config)
+    assert intervals['height'] == 5
+    assert intervals['params'] == 7200
+    assert intervals['balances'] == 60
+    assert tick_interval(config) == 5
+
+
+def test_ttl_cache_keeps_expired_value_at_same_version():
+    clock = FakeClock()
+    cache = TTLCache(clock=clock)
+    fetch = MagicMock(side_effect=[1, 2])
+
+    assert cache.get_or_fetch('key', 30, fetch, version=100) == 1
+    clock.now += 60
+    assert cache.get_or_fetch('key', 30, fetch, version=100) == 1
+    assert fetch.call_count == 1
+    clock.now += 30
+    assert cache.get_or_fetch('key', 30, fetch, version=101) == 2
+
+
+def test_ttl_cache_refetches_every_cycle_when_interval_equals_tick():
+    clock = FakeClock()
+    cache = TTLCache(clock=clock)
+    fetch = MagicMock(return_value=1)
+
+    def slow_fetch():
+        clock.now += 0.5  # The fetch completes well after the cycle started
+        return fetch()
+
+    for cycle in range(6):
+        started = clock.now
+        cache.get_or_fetch('height', 2, slow_fetch, fetched_at=started)
+        clock.now = started + 2  # The loop sleeps until the next tick
+    assert fetch.call_count == 6
+
+
+def test_ttl_cache_stamps_entries_set_outside_the_cycle_with_now():
+    clock = FakeClock()
+    cache = TTLCache(clock=clock)
+    started = clock.now
+    clock.now += 5
+    cache.set('cycle', 1, 10, fetched_at=started)
+    cache.set('probe', 1, 10)  # Set by a probe while the cycle runs
+    clock.now = started + 10
+    assert cache.get('cycle') is None
+    assert cache.get('probe') == 1
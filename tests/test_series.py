@@ -0,0 +1,66 @@
+from prometheus_client import CollectorRegistry, Gauge
+from orbit_metrics.series import SeriesRegistry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_gauge():
+    registry = CollectorRegistry()
+    gauge = Gauge('test_balance', 'Balance', ['chain', 'wallet'], registry=registry)
+    return registry, gauge
+
+
+def test_series_are_evicted_after_ttl():
+    registry, gauge = make_gauge()
+    clock = FakeClock()
+    series = SeriesRegistry(clock=clock)
+    series.set(gauge, 1, chain="a", wallet="w1")
+    series.set(gauge, 2, chain="a", wallet="w2")
+
+    clock.now += 100
+    series.set(gauge, 3, chain="a", wallet="w1")
+    assert series.evict(50) == 1
+    assert series.evict(0) == 0
+
+    assert registry.get_sample_value("test_balance", {"chain": "a", "wallet": "w1"}) == 3
+    assert registry.get_sample_value("test_balance", {"chain": "a", "wallet": "w2"}) is None
+    assert len(series) == 1
+
+
+def test_set_many_and_remove_by_label():
+    registry, gauge = make_gauge()
+    series = SeriesRegistry()
+    series.set_many(gauge, [({"chain": "a", "wallet": "w1"}, 1), ({"chain": "b", "wallet": "w1"}, 2)])
+    series.set_many(gauge, [({"chain": "a", "wallet": "w1"}, 5)])
+
+    assert registry.get_sample_value("test_balance", {"chain": "a", "wallet": "w1"}) == 5
+    assert series.remove(chain="b") == 1
+    assert registry.get_sample_value("test_balance", {"chain": "b", "wallet": "w1"}) is None
+    assert registry.get_sample_value("test_balance", {"chain": "a", "wallet": "w1"}) == 5
+
+
+def test_sweep_removes_series_not_set_since():
+    registry, gauge = make_gauge()
+    clock = FakeClock()
+    series = SeriesRegistry(clock=clock)
+    series.set(gauge, 1, chain="a", wallet="w1")
+    clock.now += 1
+    series.set(gauge, 2, chain="a", wallet="w2")
+
+    assert series.sweep(clock.now) == 1
+    assert registry.get_sample_value("test_balance", {"chain": "a", "wallet": "w1"}) is None
+
+
+def test_set_values_shares_the_series_of_set():
+    registry, gauge = make_gauge()
+    series = SeriesRegistry()
+    series.set(gauge, 1, chain="a", wallet="w1")
+    series.set_values(gauge, 2, ("a", "w1"))
+    assert registry.get_sample_value("test_balance", {"chain": "a", "wallet": "w1"}) == 2
+    assert len(series) == 1
@@ -0,0 +1,83 @@
+from collections import Counter
+from unittest.mock import MagicMock, patch
+
+import requests
+from prometheus_client import CollectorRegistry, generate_latest
+from orbit_metrics.exporter import collection_plan, fetch_metrics
+from orbit_metrics.runner import run_exporter
+from orbit_metrics.sharding import HashRing, ShardAggregator, shard_config
+
+CHAINS = [f"chain-{index}" for index in range(2000)]
+
+
+def test_hash_ring_balances_chains():
+    ring = HashRing(4)
+    counts = Counter(ring.shard_of(chain) for chain in CHAINS)
+    assert sorted(counts) == [0, 1, 2, 3]
+    assert all(350 < count < 650 for count in counts.values())
+
+
+def test_adding_a_shard_moves_a_share_of_the_chains():
+    before, after = HashRing(4), HashRing(5)
+    moved = [chain for chain in CHAINS if before.shard_of(chain) != after.shard_of(chain)]
+    assert all(after.shard_of(chain) == 4 for chain in moved)  # Only to the new shard
+    assert 0.1 < len(moved) / len(CHAINS) < 0.3
+
+
+def test_shard_config_partitions_the_nodes():
+    config = {"nodes": [{"name": chain} for chain in CHAINS[:50]], "refresh": {"height": 10}}
+    shards = [shard_config(config, shard, 3) for shard in range(3)]
+    names = [node["name"] for sharded in shards for node in sharded["nodes"]]
+    assert sorted(names) == sorted(CHAINS[:50])
+    assert shards[0]["refresh"] == {"height": 10}
+    assert shard_config(config, 0, 1) is config
+
+
+def test_shard_config_keeps_the_files_of_every_shard_apart():
+    config = {"nodes": [{"name": "ChainA"}], "snapshot": {"path": "/var/lib/snapshot.json", "interval": 30},
+              "push": {"enabled": False}}
+    sharded = shard_config(config, 2, 4)
+    assert sharded["snapshot"] == {"path": "/var/lib/snapshot.json.shard2", "interval": 30}
+    assert sharded["push"] == {"enabled": False}
+    assert config["snapshot"]["path"] == "/var/lib/snapshot.json"
+
+
+def test_shard_without_chains_starts_with_an_empty_plan(tmp_path):
+    config = {"nodes": [{"name": "ChainA", "api_url": "http://api.chainA.com", "main_denom": "udenom"}]}
+    empty_shard = 1 - HashRing(2).shard_of("ChainA")
+    with patch("orbit_metrics.runner.run_poll_loop") as run_poll_loop:
+        run_exporter(str(tmp_path / "config.yml"), config, empty_shard, 2)
+    reloader = run_poll_loop.call_args[0][0]
+    assert reloader.config["nodes"] == []
+    assert collection_plan(reloader.config).nodes == ()
+    fetch_metrics(reloader.config)
+
+
+WORKER = """# HELP orbit_metrics_chain_height Current block height of the chain
+# TYPE orbit_metrics_chain_height gauge
+orbit_metrics_chain_height{{chain="{chain}",chain_id="{chain}-1"}} {height}
+# HELP orbit_metrics_cycle_duration_seconds Duration of the last collection cycle
+# TYPE orbit_metrics_cycle_duration_seconds gauge
+orbit_metrics_cycle_duration_seconds {height}
+"""
+
+
+def test_aggregator_merges_worker_metrics():
+    def get(url, timeout):
+        if "8002" in url:
+            raise requests.exceptions.ConnectionError("refused")
+        response = MagicMock()
+        response.text = WORKER.format(chain="a" if "8000" in url else "b", height=1 if "8000" in url else 2)
+        return response
+
+    registry = CollectorRegistry()
+    registry.register(ShardAggregator([f"http://127.0.0.1:{port}/metrics" for port in (8000, 8001, 8002)]))
+    with patch("orbit_metrics.sharding.requests.get", side_effect=get):
+        output = generate_latest(registry).decode()
+
+    assert output.count("# TYPE orbit_metrics_chain_height gauge") == 1
+    assert 'orbit_metrics_chain_height{chain="a",chain_id="a-1"} 1.0' in output
+    assert 'orbit_metrics_chain_height{chain="b",chain_id="b-1"} 2.0' in output
+    assert 'orbit_metrics_cycle_duration_seconds{shard="0"} 1.0' in output
+    assert 'orbit_metrics_cycle_duration_seconds{shard="1"} 2.0' in output
+    assert 'orbit_metrics_shard_up{shard="2"} 0.0' in output
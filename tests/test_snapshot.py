@@ -0,0 +1,65 @@
+from orbit_metrics.metrics import chain_height_gauge, last_success_gauge, wallet_denom_balance_gauge
+from orbit_metrics.scheduler import TTLCache
+from orbit_metrics.series import SeriesRegistry
+from orbit_metrics.snapshot import read_snapshot, write_snapshot
+
+CONFIG = {"nodes": [{"name": "SnapA"}]}
+
+
+def saved_state():
+    cache, series = TTLCache(clock=lambda: 1000.0), SeriesRegistry(clock=lambda: 1000.0)
+    cache.set(("SnapA", "node_info", None), {"moniker": "node-a", "chain_id": "a-1"}, 3600)
+    cache.set(("SnapA", "balances", ("wallet", "denoms")), {"uatom": 5.0}, 60, version=100)
+    cache.set(("SnapA", "height", None), 100, 15)
+    cache.set(("SnapB", "node_info", None), {"moniker": "node-b", "chain_id": "b-1"}, 3600)
+    series.set(chain_height_gauge, 100, chain="SnapA", chain_id="a-1", host="node-a")
+    series.set(chain_height_gauge, 200, chain="SnapB", chain_id="b-1", host="node-b")
+    series.set(wallet_denom_balance_gauge, 5.0, chain="SnapA", chain_id="a-1", wallet="wallet", type="t",
+               denom="uatom")
+    last_success_gauge.labels(chain="SnapA", group="balances").set(999)
+    return cache, series
+
+
+def test_snapshot_restores_the_state_of_configured_chains(tmp_path):
+    path = str(tmp_path / "snapshot.json")
+    write_snapshot(path, *saved_state(), written_at=1000.0)
+    last_success_gauge.labels(chain="SnapA", group="balances").set(0)
+
+    cache, series = TTLCache(clock=lambda: 1010.0), SeriesRegistry()
+    assert read_snapshot(path, CONFIG, cache, series) == 1000.0
+
+    assert cache.get(("SnapA", "node_info", None)) == {"moniker": "node-a", "chain_id": "a-1"}
+    assert cache.lookup(("SnapA", "balances", ("wallet", "denoms")), 60, version=100) == (True, {"uatom": 5.0})
+    assert cache.get(("SnapA", "height", None)) is None  # Refetched with the latest block
+    assert cache.get(("SnapB", "node_info", None)) is None  # No longer configured
+
+    assert sorted((metric._name, values, value, last_set) for metric, values, value, last_set in series.items()) == [
+        ("orbit_metrics_chain_height", ("SnapA", "a-1", "node-a"), 100, 1000.0),
+        ("orbit_metrics_wallet_denom_balance", ("SnapA", "a-1", "wallet", "t", "uatom"), 5.0, 1000.0),
+    ]
+    assert chain_height_gauge.labels("SnapA", "a-1", "node-a")._value.get() == 100
+    assert last_success_gauge.labels(chain="SnapA", group="balances")._value.get() == 999
+    assert series.sweep(1000.5) == 2  # Evicted as if the exporter had not restarted
+
+
+def test_snapshot_does_not_overwrite_newer_state(tmp_path):
+    path = str(tmp_path / "snapshot.json")
+    write_snapshot(path, *saved_state(), written_at=1000.0)
+
+    cache, series = TTLCache(clock=lambda: 1010.0), SeriesRegistry(clock=lambda: 1010.0)
+    cache.set(("SnapA", "node_info", None), {"moniker": "new", "chain_id": "a-1"}, 3600)
+    series.set(chain_height_gauge, 101, chain="SnapA", chain_id="a-1", host="node-a")
+    read_snapshot(path, CONFIG, cache, series)
+
+    assert cache.get(("SnapA", "node_info", None))["moniker"] == "new"
+    assert chain_height_gauge.labels("SnapA", "a-1", "node-a")._value.get() == 101
+
+
+def test_unusable_snapshots_are_ignored(tmp_path):
+    assert read_snapshot(str(tmp_path / "missing.json"), CONFIG, TTLCache(), SeriesRegistry()) is None
+    corrupt = tmp_path / "corrupt.json"
+    corrupt.write_bytes(b'{"version": 1, "cache": [')
+    assert read_snapshot(str(corrupt), CONFIG, TTLCache(), SeriesRegistry()) is None
+    old = tmp_path / "old.json"
+    old.write_bytes(b'{"version": 0}')
+    assert read_snapshot(str(old), CONFIG, TTLCache(), SeriesRegistry()) is None
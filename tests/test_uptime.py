@@ -0,0 +1,54 @@
+import base64
+
+from orbit_metrics.uptime import SigningWindow, UptimeTracker, bech32_encode, commit_signers, consensus_address, \
+    valcons_address
+
+PUBKEY = {"@type": "/cosmos.crypto.ed25519.PubKey", "key": base64.b64encode(b"k" * 32).decode()}
+
+
+def test_bech32_encode():
+    assert bech32_encode("a", b"") == "a12uel5l"
+    assert valcons_address("cosmosvaloper1abc", bytes(range(20))).startswith("cosmosvalcons1qqqsyqcyq5rqwzqfpg9scrgwpugpzysn")
+
+
+def test_consensus_address_of_non_ed25519_keys_is_unknown():
+    assert len(consensus_address(PUBKEY)) == 20
+    assert consensus_address({"@type": "/cosmos.crypto.secp256k1.PubKey", "key": PUBKEY["key"]}) is None
+
+
+def test_signing_window_overwrites_oldest_heights():
+    window = SigningWindow(4)
+    for height, signed in [(1, False), (2, True), (3, True), (4, False)]:
+        window.record(height, signed)
+    assert (window.observed, window.missed) == (4, 2)
+
+    window.record(5, True)  # Replaces height 1
+    assert (window.observed, window.missed) == (4, 1)
+    assert window.missed_ratio == 0.25
+    assert len(window.observed_bits) == 1
+
+
+def commit(height, signers):
+    return {"block": {"last_commit": {"height": str(height), "signatures": [
+        {"block_id_flag": "BLOCK_ID_FLAG_COMMIT", "validator_address": base64.b64encode(address).decode()}
+        for address in signers] + [{"block_id_flag": "BLOCK_ID_FLAG_ABSENT", "validator_address": ""}]}}}
+
+
+def test_tracker_records_commits_incrementally():
+    tracker = UptimeTracker()
+    tracker.track("valoper1a", PUBKEY)
+    address = consensus_address(PUBKEY)
+    tracker.resize(100)
+    assert tracker.missing_blocks(10, 20) == []  # Starts from the latest block
+
+    tracker.record_commit(*commit_signers(commit(9, [address])))
+    assert tracker.missing_blocks(15, 20) == [11, 12, 13, 14]
+    assert tracker.missing_blocks(100, 20) == list(range(80, 100))
+
+    tracker.record_commit(*commit_signers(commit(10, [])))
+    tracker.record_commit(*commit_signers(commit(10, [address])))  # Already recorded
+    assert tracker.missed_ratios() == {"valoper1a": 0.5}
+
+    tracker.resize(50)
+    assert tracker.missed_ratios() == {}
+    assert tracker.last_height is None